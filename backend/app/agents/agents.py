@@ -2,175 +2,243 @@
 LangGraph Agent implementations using HuggingFace Transformers.
 All AI runs locally - no API keys required.
 """
-from typing import Dict, Any, List
-from langgraph.graph import StateGraph, END
+import functools
+import time
+from collections import Counter
+from typing import Dict, Any
+from langchain_core.runnables import RunnableConfig
+from app.core.config import settings
 from app.core.graph import AgentState
+from app.core.metrics import ANALYSIS_STAGE_DURATION, stage_timer
 from app.services.ai_service import get_ai_service
+from app.services.analysis_service import (
+    AnalysisJob,
+    ingest_documents,
+    persist_personnel,
+    finalize_entity,
+)
+from app.services.scraper import SCRAPE_SOURCES, run_source
 import logging
 
 logger = logging.getLogger(__name__)
 
 
-def scout_agent(state: AgentState) -> AgentState:
+def timed(name: str):
+    """Record the wrapped node's wall-clock time under state["timings"][name]."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(state: AgentState, config: RunnableConfig) -> Dict[str, Any]:
+            start = time.perf_counter()
+            update = await fn(state, config)
+            elapsed = time.perf_counter() - start
+            ANALYSIS_STAGE_DURATION.labels(stage=name, source="").observe(elapsed)
+            update["timings"] = {**update.get("timings", {}), name: round(elapsed, 4)}
+            logger.info(f"[{state.get('entity_name', '')}] {name} took {elapsed:.2f}s")
+            return update
+        return wrapper
+    return decorator
+
+
+def analysis_job(config: RunnableConfig) -> AnalysisJob:
+    """The run's AnalysisJob (database session and progress writes)."""
+    return config["configurable"]["job"]
+
+
+def make_scout_agent(source: str):
     """
-    Data Acquisition Agent (Scout).
-    Responsible for gathering raw data about entities.
-    
-    This agent coordinates the scraping of:
-    - Patents from Google Patents
-    - Papers from arXiv, Semantic Scholar, DBLP, CrossRef
-    - Personnel information from publications
+    Build the Data Acquisition Agent (Scout) for one source.
+
+    Each scout:
+    - Scrapes its source (Google Patents, arXiv, Semantic Scholar, DBLP or CrossRef)
+      within the source's time budget and the run's scrape deadline
+    - Tags, embeds and stores its documents in chunks of ANALYSIS_CHUNK_SIZE,
+      without waiting for other scouts
+    - Hands the analyst counters rather than the documents themselves
     """
-    entity_name = state.get("entity_name", "")
-    messages = state.get("messages", [])
-    
-    messages.append({
-        "role": "scout",
-        "content": f"Starting data acquisition for: {entity_name}",
-        "status": "in_progress"
-    })
-    
-    # The actual scraping is done in the analysis service
-    # This agent just coordinates and tracks state
-    
-    return {
-        **state,
-        "messages": messages,
-        "current_step": "scout_complete",
-    }
+    _, kind = SCRAPE_SOURCES[source]
 
+    @timed(f"scout_{source}")
+    async def scout_agent(state: AgentState, config: RunnableConfig) -> Dict[str, Any]:
+        entity_name = state.get("entity_name", "")
+        # In a batch analysis, the batch schedules scrapes and pools embeddings
+        batch = config["configurable"].get("batch")
+        deadline = config["configurable"].get("scrape_deadline")
 
-def analyst_agent(state: AgentState) -> AgentState:
+        with stage_timer("scrape", source):
+            if batch is not None:
+                documents, status = await batch.run_source(source, entity_name, deadline)
+            else:
+                documents, status = await run_source(source, entity_name, deadline)
+        scraped = len(documents)
+        summary = await ingest_documents(
+            analysis_job(config), get_ai_service(), source, kind, documents,
+            embed=batch.embed if batch is not None else None,
+        )
+
+        return {
+            "document_counts": {kind: summary["documents"]},
+            "linked_counts": {kind: summary["linked"]},
+            "technology_counts": {kind: summary["technologies"]},
+            "authors": summary["authors"],
+            "source_status": {source: status},
+            "messages": [{
+                "role": "scout",
+                "content": f"{source}: {scraped} {kind} ({summary['new']} new, {status['status']})",
+                "status": "complete",
+            }],
+        }
+
+    scout_agent.__name__ = f"scout_{source}"
+    return scout_agent
+
+
+@timed("analyst")
+async def analyst_agent(state: AgentState, config: RunnableConfig) -> Dict[str, Any]:
     """
     IP & Document Analysis Agent (Analyst).
     Responsible for analyzing and extracting insights from documents.
-    
+
     This agent:
-    - Generates embeddings for semantic search
-    - Extracts technology domains
+    - Aggregates technology domains across all documents
     - Identifies key researchers and their expertise
-    - Builds citation networks
     """
-    entity_name = state.get("entity_name", "")
-    messages = state.get("messages", [])
-    patents = state.get("patents", [])
-    papers = state.get("papers", [])
-    
-    ai_service = get_ai_service()
-    
-    messages.append({
+    document_counts = state.get("document_counts", {})
+    technology_counts = state.get("technology_counts", {})
+    patent_total = document_counts.get("patents", 0)
+    paper_total = document_counts.get("papers", 0)
+
+    messages = [{
         "role": "analyst",
-        "content": f"Analyzing {len(patents)} patents and {len(papers)} papers",
+        "content": f"Analyzing {patent_total} patents and {paper_total} papers",
         "status": "in_progress"
-    })
-    
-    # Extract technologies from all content
-    all_text = " ".join([
-        p.get("abstract", "") or p.get("title", "")
-        for p in patents + papers
-    ])
-    technologies = ai_service.extract_technologies(all_text)
-    
-    # Build tech stack
+    }]
+
+    # Patents/papers per technology, counted by the scouts
+    patent_counts = Counter(technology_counts.get("patents", {}))
+    paper_counts = Counter(technology_counts.get("papers", {}))
+
+    # Build tech stack, most frequent first
+    total_counts = patent_counts + paper_counts
+    technologies = [tech for tech, _ in total_counts.most_common()]
+    total_docs = patent_total + paper_total
+
     tech_stack = {}
     for tech in technologies:
         tech_stack[tech] = {
             "name": tech,
-            "patent_count": 0,
-            "paper_count": 0,
-            "intensity": 0.0,
+            "patent_count": patent_counts[tech],
+            "paper_count": paper_counts[tech],
+            "intensity": total_counts[tech] / total_docs if total_docs else 0.0,
         }
-    
-    # Count patents/papers per technology
-    for patent in patents:
-        patent_tech = patent.get("technologies", [])
-        for tech in patent_tech:
-            if tech in tech_stack:
-                tech_stack[tech]["patent_count"] += 1
-    
-    for paper in papers:
-        paper_tech = paper.get("technologies", [])
-        for tech in paper_tech:
-            if tech in tech_stack:
-                tech_stack[tech]["paper_count"] += 1
-    
-    # Calculate intensity
-    total_docs = len(patents) + len(papers)
-    if total_docs > 0:
-        for tech in tech_stack.values():
-            tech["intensity"] = (tech["patent_count"] + tech["paper_count"]) / total_docs
-    
+
+    # Personnel, with expertise from the technologies of their papers
+    personnel = [
+        {
+            "name": name,
+            "role": "Researcher",
+            "publication_count": counts["publications"],
+            "expertise": [t for t, _ in Counter(counts["technologies"]).most_common(3)],
+        }
+        for name, counts in state.get("authors", {}).items()
+    ]
+
     messages.append({
         "role": "analyst",
-        "content": f"Identified {len(technologies)} technology domains",
+        "content": f"Identified {len(technologies)} technology domains and {len(personnel)} researchers",
         "status": "complete"
     })
-    
+
     return {
-        **state,
         "messages": messages,
         "tech_stack": tech_stack,
         "technologies": technologies,
+        "personnel": personnel,
         "current_step": "analyst_complete",
     }
 
 
-def reporter_agent(state: AgentState) -> AgentState:
+@timed("persist_personnel")
+async def persist_personnel_agent(state: AgentState, config: RunnableConfig) -> Dict[str, Any]:
+    """Save new personnel for the entity."""
+    job = analysis_job(config)
+    job.set_progress(90)
+    personnel = state.get("personnel", [])
+    saved_ids = []
+    for start in range(0, len(personnel), settings.ANALYSIS_CHUNK_SIZE):
+        chunk = personnel[start:start + settings.ANALYSIS_CHUNK_SIZE]
+        saved_ids += await job.write(persist_personnel, state["entity_id"], chunk)
+    return {"persisted_ids": {"personnel": saved_ids}, "current_step": "personnel_persisted"}
+
+
+@timed("reporter")
+async def reporter_agent(state: AgentState, config: RunnableConfig) -> Dict[str, Any]:
     """
     Synthesis & Reporting Agent (Reporter).
     Responsible for generating final reports and insights.
-    
+
     This agent:
-    - Synthesizes findings into coherent reports
-    - Generates gap analysis comparisons
+    - Synthesizes findings into coherent reports, including per-source status
+    - Finalizes entity counts, focus areas and the stored report
     - Produces actionable recommendations
     """
     entity_name = state.get("entity_name", "")
-    messages = state.get("messages", [])
     tech_stack = state.get("tech_stack", {})
-    patents = state.get("patents", [])
-    papers = state.get("papers", [])
-    
-    messages.append({
+    document_counts = state.get("document_counts", {})
+    linked_counts = state.get("linked_counts", {})
+    persisted_ids = state.get("persisted_ids", {})
+
+    messages = [{
         "role": "reporter",
         "content": "Generating analysis report",
         "status": "in_progress"
-    })
-    
+    }]
+
     # Generate report summary
     report = {
         "entity_name": entity_name,
         "summary": f"Analysis of {entity_name}",
-        "patent_count": len(patents),
-        "paper_count": len(papers),
+        "patent_count": document_counts.get("patents", 0),
+        "paper_count": document_counts.get("papers", 0),
+        "new_patents": linked_counts.get("patents", 0),
+        "new_papers": linked_counts.get("papers", 0),
+        "new_personnel": len(persisted_ids.get("personnel", [])),
         "top_technologies": sorted(
             tech_stack.values(),
             key=lambda x: x.get("intensity", 0),
             reverse=True
         )[:5],
+        "sources": state.get("source_status", {}),
+        "timings": state.get("timings", {}),
         "recommendations": [],
     }
-    
+
     # Generate basic recommendations based on tech intensity
     if report["top_technologies"]:
         top_tech = report["top_technologies"][0]["name"]
         report["recommendations"].append(
             f"Primary focus area is {top_tech} - consider targeted collaboration"
         )
-    
+
     if report["patent_count"] > 10:
         report["recommendations"].append(
             f"High patent activity ({report['patent_count']} patents) indicates strong IP portfolio"
         )
-    
+
+    failed_sources = [name for name, st in report["sources"].items() if st.get("status") != "ok"]
+    if failed_sources:
+        report["recommendations"].append(
+            f"Partial results: {', '.join(failed_sources)} did not complete - re-run later for full coverage"
+        )
+
+    await analysis_job(config).write(finalize_entity, state["entity_id"], state.get("technologies", []), report)
+
     messages.append({
         "role": "reporter",
         "content": f"Report generated with {len(report['recommendations'])} recommendations",
         "status": "complete"
     })
-    
+
     return {
-        **state,
         "messages": messages,
         "report": report,
         "current_step": "complete",
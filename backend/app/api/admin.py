@@ -0,0 +1,51 @@
+"""
+Admin API endpoints.
+Lists and downloads analysis profiles (see app.services.profiling).
+"""
+import secrets
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import FileResponse
+
+from app.core.config import settings
+from app.services.profiling import ARTIFACTS, artifact_path, get_profile, list_profiles
+
+
+def require_admin(x_admin_token: Optional[str] = Header(default=None)):
+    """Check X-Admin-Token; admin routes are refused unless ADMIN_TOKEN is configured."""
+    if not settings.ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled (ADMIN_TOKEN is not set)")
+    if not secrets.compare_digest(x_admin_token or "", settings.ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+
+router = APIRouter(dependencies=[Depends(require_admin)])
+
+
+@router.get("/profiles")
+async def get_profiles():
+    """Stored analysis profiles, newest first."""
+    return {"profiles": list_profiles()}
+
+
+@router.get("/profiles/{profile_id}")
+async def get_profile_meta(profile_id: str):
+    """Metadata of one profile, including its artifact names."""
+    meta = get_profile(profile_id)
+    if meta is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return meta
+
+
+@router.get("/profiles/{profile_id}/{artifact}")
+async def download_profile_artifact(profile_id: str, artifact: str):
+    """
+    Download a profile artifact: profile.pstats (load with pstats or
+    snakeviz), profile.txt, stacks.txt (folded stacks for flame graphs),
+    timeline.json (Chrome trace for Perfetto) or meta.json.
+    """
+    path = artifact_path(profile_id, artifact)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Artifact not found")
+    return FileResponse(path, media_type=ARTIFACTS[artifact], filename=f"{profile_id}-{artifact}")
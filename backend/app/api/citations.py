@@ -0,0 +1,73 @@
+"""
+Citation graph API endpoints.
+Served from the in-memory citation index (see app.services.citation_graph).
+"""
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+
+from app.core.database import get_read_db
+from app.services.citation_graph import describe_documents, get_citation_index
+
+router = APIRouter()
+
+
+def _node(doc_id: str, info: dict) -> dict:
+    details = info.get(doc_id, {"name": doc_id, "type": "external"})
+    return {"id": doc_id, **details}
+
+
+@router.get("/stats")
+async def get_citation_stats(db: Session = Depends(get_read_db)):
+    """Size of the citation graph."""
+    index = get_citation_index(db)
+    return {"nodes": index.node_count, "edges": index.edge_count}
+
+
+@router.get("/neighbors")
+async def get_neighbors(doc_id: str, db: Session = Depends(get_read_db)):
+    """Documents a document cites, and documents citing it."""
+    index = get_citation_index(db)
+    result = index.neighbors(doc_id)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Document not in citation graph")
+
+    info = describe_documents(db, result["references"] + result["cited_by"] + [doc_id])
+    return {
+        "document": _node(doc_id, info),
+        "references": [_node(i, info) for i in result["references"]],
+        "cited_by": [_node(i, info) for i in result["cited_by"]],
+    }
+
+
+@router.get("/khop")
+async def get_k_hop(
+    doc_id: str,
+    k: int = 2,
+    direction: str = "both",
+    limit: int = 500,
+    db: Session = Depends(get_read_db),
+):
+    """Citation neighbourhood up to k hops, as nodes and links for graph views."""
+    if direction not in ("out", "in", "both"):
+        raise HTTPException(status_code=400, detail="direction must be out, in or both")
+
+    index = get_citation_index(db)
+    result = index.k_hop(doc_id, k=min(max(k, 1), 4), direction=direction, limit=min(max(limit, 1), 5000))
+    if result is None:
+        raise HTTPException(status_code=404, detail="Document not in citation graph")
+
+    info = describe_documents(db, [n["id"] for n in result["nodes"]])
+    return {
+        "nodes": [{**_node(n["id"], info), "hop": n["hop"]} for n in result["nodes"]],
+        "links": [{**link, "type": "cites"} for link in result["links"]],
+    }
+
+
+@router.get("/pagerank")
+async def get_pagerank(limit: int = 50, db: Session = Depends(get_read_db)):
+    """Most influential ingested documents by PageRank."""
+    index = get_citation_index(db)
+    ranked = index.top_pagerank(limit=min(max(limit, 1), 500))
+
+    info = describe_documents(db, [doc_id for doc_id, _ in ranked])
+    return [{**_node(doc_id, info), "score": score} for doc_id, score in ranked]
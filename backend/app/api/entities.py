@@ -1,22 +1,102 @@
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
+from fastapi import APIRouter, Depends, Header, HTTPException, BackgroundTasks, Request, Response
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import func, update
+from datetime import date
 from typing import List, Optional
-import uuid
 
-from app.core.database import get_db
-from app.models.models import Entity, EntityStatus, EntityType
+from app.api.admin import require_admin
+from app.core.config import settings
+from app.core.database import get_db, get_read_db, read_from_primary
+from app.core.pagination import InvalidCursor, keyset_page
+from app.core.responses import ORJSONResponse, RequestStreamingResponse, response_columns, row_dicts
+from app.core.write_queue import after_commit, run_write
+from app.models.models import Entity, EntityPaper, EntityPatent, EntityStatus, EntityType, Patent, Paper, Personnel
 from app.models.schemas import (
+    BatchAnalysisRequest,
+    BatchAnalysisResponse,
     EntityCreate,
     EntityUpdate,
     EntityResponse,
     EntityListResponse,
     DashboardStats,
+    GapAnalysisResponse,
+    PaperPage,
+    PatentPage,
+    PersonnelClusterResponse,
+    PersonnelPage,
+    SimilarEntitiesResponse,
+    TimelineResponse,
 )
-from app.services.analysis_service import trigger_entity_analysis
+from app.services import entity_similarity, heatmap
+from app.services.analysis_service import claimable_for_analysis, trigger_entity_analysis
+from app.services.batch_analysis import get_batch, start_batch
+from app.services.bulk_import import IMPORT_FORMATS, detect_format, import_entities
+from app.services.documents import of_entity, unlink_entity
+from app.services.gap_analysis import count_critical_gaps, get_gap_analysis
+from app.services.personnel_network import get_personnel_clusters
+from app.services.timeline import entity_timeline
 
 router = APIRouter()
 
+# Columns of EntityResponse, selected and encoded without building models
+ENTITY_COLUMNS = response_columns(Entity, EntityResponse)
+
+
+def _entity_row(db: Session, entity_id: str) -> dict:
+    """An entity as an EntityResponse-shaped dict; 404 when missing."""
+    row = db.query(*ENTITY_COLUMNS).filter(Entity.id == entity_id).first()
+    if not row:
+        raise HTTPException(status_code=404, detail="Entity not found")
+    return row._asdict()
+
+
+def _insert_entity(db: Session, entity: EntityCreate) -> str:
+    db_entity = Entity(
+        name=entity.name,
+        type=entity.type,
+        website=entity.website,
+        description=entity.description,
+        focus_areas=entity.focus_areas,
+        status=EntityStatus.PENDING,
+        analysis_queued=True,
+    )
+    db.add(db_entity)
+    db.flush()
+    return db_entity.id
+
+
+def _update_entity(db: Session, entity_id: str, values: dict) -> bool:
+    """Set fields of an entity; False if it does not exist."""
+    entity = db.query(Entity).filter(Entity.id == entity_id).first()
+    if not entity:
+        return False
+    for field, value in values.items():
+        setattr(entity, field, value)
+    return True
+
+
+def _reset_for_analysis(db: Session, entity_id: str) -> Optional[bool]:
+    """Mark an entity pending re-analysis; False while it is being analysed, None if missing."""
+    result = db.execute(
+        update(Entity)
+        .where(Entity.id == entity_id, claimable_for_analysis())
+        .values(status=EntityStatus.PENDING, analysis_progress=0, analysis_queued=True)
+    )
+    if result.rowcount:
+        return True
+    return False if db.query(Entity.id).filter(Entity.id == entity_id).first() else None
+
+
+def _delete_entity(db: Session, entity_id: str) -> bool:
+    entity = db.query(Entity).filter(Entity.id == entity_id).first()
+    if not entity:
+        return False
+    unlink_entity(db, entity_id)
+    db.delete(entity)
+    after_commit(db, lambda: heatmap.invalidate(entity_id))
+    after_commit(db, lambda: entity_similarity.remove_entity(entity_id))
+    return True
+
 
 @router.get("/", response_model=EntityListResponse)
 async def list_entities(
@@ -25,10 +105,10 @@ async def list_entities(
     type: Optional[str] = None,
     status: Optional[str] = None,
     search: Optional[str] = None,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
 ):
     """List all tracked entities with filtering and pagination."""
-    query = db.query(Entity)
+    query = db.query(*ENTITY_COLUMNS)
     
     if type and type != "all":
         query = query.filter(Entity.type == type)
@@ -40,26 +120,12 @@ async def list_entities(
     total = query.count()
     items = query.order_by(Entity.updated_at.desc()).offset((page - 1) * per_page).limit(per_page).all()
     
-    return EntityListResponse(
-        items=[EntityResponse(
-            id=str(e.id),
-            name=e.name,
-            type=e.type,
-            status=e.status,
-            website=e.website,
-            description=e.description,
-            focus_areas=e.focus_areas,
-            analysis_progress=e.analysis_progress or 0,
-            patent_count=e.patent_count or 0,
-            paper_count=e.paper_count or 0,
-            personnel_count=e.personnel_count or 0,
-            created_at=e.created_at,
-            updated_at=e.updated_at,
-        ) for e in items],
-        total=total,
-        page=page,
-        per_page=per_page,
-    )
+    return ORJSONResponse({
+        "items": row_dicts(items),
+        "total": total,
+        "page": page,
+        "per_page": per_page,
+    })
 
 
 @router.post("/", response_model=EntityResponse)
@@ -69,84 +135,99 @@ async def create_entity(
     db: Session = Depends(get_db),
 ):
     """Create a new entity and trigger analysis."""
-    # Create entity
-    db_entity = Entity(
-        name=entity.name,
-        type=entity.type,
-        website=entity.website,
-        description=entity.description,
-        focus_areas=entity.focus_areas,
-        status=EntityStatus.PENDING,
-    )
-    db.add(db_entity)
-    db.commit()
-    db.refresh(db_entity)
+    entity_id = await run_write(_insert_entity, entity)
     
     # Trigger analysis in background
-    background_tasks.add_task(trigger_entity_analysis, str(db_entity.id))
-    
-    return EntityResponse(
-        id=str(db_entity.id),
-        name=db_entity.name,
-        type=db_entity.type,
-        status=db_entity.status,
-        website=db_entity.website,
-        description=db_entity.description,
-        focus_areas=db_entity.focus_areas,
-        analysis_progress=0,
-        patent_count=0,
-        paper_count=0,
-        personnel_count=0,
-        created_at=db_entity.created_at,
-        updated_at=db_entity.updated_at,
+    background_tasks.add_task(trigger_entity_analysis, entity_id)
+    
+    response = ORJSONResponse(_entity_row(db, entity_id))
+    read_from_primary(response)
+    return response
+
+
+@router.post("/bulk")
+async def bulk_import_entities(request: Request, format: Optional[str] = None, analyze: bool = True):
+    """
+    Import entities from a streamed CSV (header row required; focus_areas
+    separated by ";") or JSONL request body.
+    
+    The format comes from `format` or the Content-Type. Entities with the same
+    name and website as an existing one are skipped, and analyses for the
+    new ones are queued a few at a time. Results stream back as JSON lines,
+    one per record, followed by a summary line.
+    """
+    fmt = format or detect_format(request.headers.get("content-type", ""))
+    if fmt not in IMPORT_FORMATS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Set format to one of: {', '.join(IMPORT_FORMATS)} (or send text/csv or application/x-ndjson)",
+        )
+    
+    response = RequestStreamingResponse(
+        import_entities(request.stream(), fmt, analyze),
+        media_type="application/x-ndjson",
     )
+    read_from_primary(response)
+    return response
 
 
 @router.get("/stats", response_model=DashboardStats)
-async def get_dashboard_stats(db: Session = Depends(get_db)):
+async def get_dashboard_stats(db: Session = Depends(get_read_db)):
     """Get dashboard statistics."""
     total_entities = db.query(Entity).count()
     entities_analyzing = db.query(Entity).filter(Entity.status == EntityStatus.ANALYZING).count()
     
-    # Aggregate counts from entities
-    result = db.query(
-        func.sum(Entity.patent_count).label("patents"),
-        func.sum(Entity.paper_count).label("papers"),
-        func.sum(Entity.personnel_count).label("personnel"),
-    ).first()
+    # Documents shared by several entities count once
+    total_patents = db.query(func.count(func.distinct(EntityPatent.patent_id))).scalar()
+    total_papers = db.query(func.count(func.distinct(EntityPaper.paper_id))).scalar()
+    total_personnel = db.query(func.sum(Entity.personnel_count)).scalar()
     
     return DashboardStats(
         total_entities=total_entities,
-        total_patents=result.patents or 0,
-        total_papers=result.papers or 0,
-        total_personnel=result.personnel or 0,
-        critical_alerts=3,  # TODO: Calculate from gap analysis
+        total_patents=total_patents or 0,
+        total_papers=total_papers or 0,
+        total_personnel=total_personnel or 0,
+        critical_alerts=count_critical_gaps(db),
         entities_analyzing=entities_analyzing,
     )
 
 
+@router.post("/batch-analyses", response_model=BatchAnalysisResponse, status_code=202)
+async def start_batch_analysis(request: BatchAnalysisRequest, db: Session = Depends(get_db)):
+    """
+    Analyse several entities as one batch (see app.services.batch_analysis):
+    their scrapes share the sources' rate limits and their new documents are
+    embedded together. Entities already being analysed are left alone and
+    reported as already_running. Poll /entities/batch-analyses/{batch_id}
+    for progress.
+    """
+    entity_ids = list(dict.fromkeys(request.entity_ids))
+    if len(entity_ids) > settings.BATCH_ANALYSIS_MAX_ENTITIES:
+        raise HTTPException(
+            status_code=400, detail=f"At most {settings.BATCH_ANALYSIS_MAX_ENTITIES} entities per batch",
+        )
+    found = {entity_id for (entity_id,) in db.query(Entity.id).filter(Entity.id.in_(entity_ids))}
+    missing = [entity_id for entity_id in entity_ids if entity_id not in found]
+    if missing:
+        raise HTTPException(status_code=404, detail={"message": "Entities not found", "entity_ids": missing})
+    
+    batch = start_batch(entity_ids)
+    return batch.status(db)
+
+
+@router.get("/batch-analyses/{batch_id}", response_model=BatchAnalysisResponse)
+async def get_batch_analysis(batch_id: str, db: Session = Depends(get_read_db)):
+    """Progress of a batch analysis started by this server process."""
+    batch = get_batch(batch_id)
+    if batch is None:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    return batch.status(db)
+
+
 @router.get("/{entity_id}", response_model=EntityResponse)
-async def get_entity(entity_id: str, db: Session = Depends(get_db)):
+async def get_entity(entity_id: str, db: Session = Depends(get_read_db)):
     """Get a single entity by ID."""
-    entity = db.query(Entity).filter(Entity.id == uuid.UUID(entity_id)).first()
-    if not entity:
-        raise HTTPException(status_code=404, detail="Entity not found")
-    
-    return EntityResponse(
-        id=str(entity.id),
-        name=entity.name,
-        type=entity.type,
-        status=entity.status,
-        website=entity.website,
-        description=entity.description,
-        focus_areas=entity.focus_areas,
-        analysis_progress=entity.analysis_progress or 0,
-        patent_count=entity.patent_count or 0,
-        paper_count=entity.paper_count or 0,
-        personnel_count=entity.personnel_count or 0,
-        created_at=entity.created_at,
-        updated_at=entity.updated_at,
-    )
+    return ORJSONResponse(_entity_row(db, entity_id))
 
 
 @router.patch("/{entity_id}", response_model=EntityResponse)
@@ -156,63 +237,219 @@ async def update_entity(
     db: Session = Depends(get_db),
 ):
     """Update an entity."""
-    entity = db.query(Entity).filter(Entity.id == uuid.UUID(entity_id)).first()
+    if not await run_write(_update_entity, entity_id, entity_update.model_dump(exclude_unset=True)):
+        raise HTTPException(status_code=404, detail="Entity not found")
+    
+    response = ORJSONResponse(_entity_row(db, entity_id))
+    read_from_primary(response)
+    return response
+
+
+@router.delete("/{entity_id}")
+async def delete_entity(entity_id: str, response: Response):
+    """Delete an entity and all associated data."""
+    if not await run_write(_delete_entity, entity_id):
+        raise HTTPException(status_code=404, detail="Entity not found")
+    
+    read_from_primary(response)
+    return {"message": "Entity deleted successfully"}
+
+
+@router.get("/{entity_id}/gap-analysis", response_model=GapAnalysisResponse)
+async def get_entity_gap_analysis(entity_id: str, db: Session = Depends(get_read_db)):
+    """Compare an entity's per-domain activity with DRDO capabilities."""
+    entity = db.query(Entity).filter(Entity.id == entity_id).first()
     if not entity:
         raise HTTPException(status_code=404, detail="Entity not found")
     
-    update_data = entity_update.model_dump(exclude_unset=True)
-    for field, value in update_data.items():
-        setattr(entity, field, value)
+    return get_gap_analysis(db, entity)
+
+
+@router.get("/{entity_id}/report")
+async def get_entity_report(entity_id: str, db: Session = Depends(get_read_db)):
+    """Get the latest analysis report, including per-source scrape status."""
+    entity = db.query(Entity).filter(Entity.id == entity_id).first()
+    if not entity:
+        raise HTTPException(status_code=404, detail="Entity not found")
+    
+    return {
+        "entity_id": entity.id,
+        "status": entity.status,
+        "report": entity.analysis_report or {},
+    }
+
+
+def _entity_page(
+    db: Session,
+    entity_id: str,
+    model,
+    filter_,
+    columns: list,
+    sorts: dict,
+    sort: str,
+    order: str,
+    cursor: Optional[str],
+    limit: int,
+) -> ORJSONResponse:
+    """
+    Keyset-paginated rows of an entity's documents or personnel.
+    Only `columns` are selected (never embeddings), and rows are encoded
+    straight to JSON without building Pydantic models.
+    """
+    if sort not in sorts:
+        raise HTTPException(status_code=400, detail=f"sort must be one of: {', '.join(sorts)}")
+    if order not in ("asc", "desc"):
+        raise HTTPException(status_code=400, detail="order must be asc or desc")
+    if not db.query(Entity.id).filter(Entity.id == entity_id).first():
+        raise HTTPException(status_code=404, detail="Entity not found")
     
-    db.commit()
-    db.refresh(entity)
+    query = db.query(*columns).filter(filter_)
+    try:
+        rows, next_cursor = keyset_page(
+            query, sorts[sort], model.id, order == "desc", cursor, min(max(limit, 1), 200)
+        )
+    except InvalidCursor:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
     
-    return EntityResponse(
-        id=str(entity.id),
-        name=entity.name,
-        type=entity.type,
-        status=entity.status,
-        website=entity.website,
-        description=entity.description,
-        focus_areas=entity.focus_areas,
-        analysis_progress=entity.analysis_progress or 0,
-        patent_count=entity.patent_count or 0,
-        paper_count=entity.paper_count or 0,
-        personnel_count=entity.personnel_count or 0,
-        created_at=entity.created_at,
-        updated_at=entity.updated_at,
+    return ORJSONResponse({"items": row_dicts(rows), "next_cursor": next_cursor})
+
+
+@router.get("/{entity_id}/patents", response_model=PatentPage)
+async def list_entity_patents(
+    entity_id: str,
+    sort: str = "date",
+    order: str = "desc",
+    cursor: Optional[str] = None,
+    limit: int = 50,
+    include_abstract: bool = False,
+    db: Session = Depends(get_read_db),
+):
+    """An entity's patents, newest first by default. Pass `next_cursor` back as `cursor` for the next page."""
+    columns = [
+        Patent.id, Patent.patent_number, Patent.title, Patent.filing_date, Patent.grant_date,
+        Patent.status, Patent.inventors, Patent.technologies, Patent.source_url,
+    ]
+    if include_abstract:
+        columns.append(Patent.abstract)
+    return _entity_page(
+        db, entity_id, Patent, of_entity("patents", entity_id), columns, {"date": Patent.filing_date},
+        sort, order, cursor, limit,
     )
 
 
-@router.delete("/{entity_id}")
-async def delete_entity(entity_id: str, db: Session = Depends(get_db)):
-    """Delete an entity and all associated data."""
-    entity = db.query(Entity).filter(Entity.id == uuid.UUID(entity_id)).first()
+@router.get("/{entity_id}/papers", response_model=PaperPage)
+async def list_entity_papers(
+    entity_id: str,
+    sort: str = "date",
+    order: str = "desc",
+    cursor: Optional[str] = None,
+    limit: int = 50,
+    include_abstract: bool = False,
+    db: Session = Depends(get_read_db),
+):
+    """An entity's papers, sorted by `date` or `citations`. Pass `next_cursor` back as `cursor` for the next page."""
+    columns = [
+        Paper.id, Paper.title, Paper.authors, Paper.publication_date, Paper.venue,
+        Paper.doi, Paper.technologies, Paper.citation_count,
+    ]
+    if include_abstract:
+        columns.append(Paper.abstract)
+    sorts = {"date": Paper.publication_date, "citations": Paper.citation_count}
+    return _entity_page(db, entity_id, Paper, of_entity("papers", entity_id), columns, sorts, sort, order, cursor, limit)
+
+
+@router.get("/{entity_id}/personnel", response_model=PersonnelPage)
+async def list_entity_personnel(
+    entity_id: str,
+    sort: str = "publications",
+    order: str = "desc",
+    cursor: Optional[str] = None,
+    limit: int = 50,
+    db: Session = Depends(get_read_db),
+):
+    """An entity's researchers, sorted by `publications` or `name`."""
+    columns = [
+        Personnel.id, Personnel.name, Personnel.role, Personnel.expertise,
+        Personnel.publication_count, Personnel.patent_count, Personnel.h_index,
+    ]
+    sorts = {"publications": Personnel.publication_count, "name": Personnel.name}
+    return _entity_page(
+        db, entity_id, Personnel, Personnel.entity_id == entity_id, columns, sorts, sort, order, cursor, limit,
+    )
+
+
+@router.get("/{entity_id}/personnel/clusters", response_model=PersonnelClusterResponse)
+async def get_entity_personnel_clusters(entity_id: str, db: Session = Depends(get_read_db)):
+    """Group an entity's researchers into co-authorship clusters."""
+    entity = db.query(Entity).filter(Entity.id == entity_id).first()
     if not entity:
         raise HTTPException(status_code=404, detail="Entity not found")
     
-    db.delete(entity)
-    db.commit()
+    return get_personnel_clusters(db, entity.id)
+
+
+@router.get("/{entity_id}/similar", response_model=SimilarEntitiesResponse)
+async def get_similar_entities(entity_id: str, limit: int = 10, db: Session = Depends(get_read_db)):
+    """Entities whose documents are most alike, flagging likely duplicates."""
+    if not 1 <= limit <= 100:
+        raise HTTPException(status_code=400, detail="limit must be between 1 and 100")
     
-    return {"message": "Entity deleted successfully"}
+    entity = db.query(Entity).filter(Entity.id == entity_id).first()
+    if not entity:
+        raise HTTPException(status_code=404, detail="Entity not found")
+    
+    return entity_similarity.similar_entities(db, entity.id, limit)
+
+
+@router.get("/{entity_id}/timeline", response_model=TimelineResponse)
+async def get_entity_timeline(
+    entity_id: str,
+    bucket_months: int = 12,
+    technology: Optional[str] = None,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    db: Session = Depends(get_read_db),
+):
+    """Patent, paper and citation counts over time, in buckets of `bucket_months`."""
+    if not 1 <= bucket_months <= 120:
+        raise HTTPException(status_code=400, detail="bucket_months must be between 1 and 120")
+    
+    entity = db.query(Entity).filter(Entity.id == entity_id).first()
+    if not entity:
+        raise HTTPException(status_code=404, detail="Entity not found")
+    
+    return TimelineResponse(
+        entity_id=entity.id,
+        technology=technology,
+        bucket_months=bucket_months,
+        series=entity_timeline(db, entity.id, bucket_months, technology, start, end),
+    )
 
 
 @router.post("/{entity_id}/reanalyze")
 async def reanalyze_entity(
     entity_id: str,
     background_tasks: BackgroundTasks,
-    db: Session = Depends(get_db),
+    response: Response,
+    profile: bool = False,
+    x_admin_token: Optional[str] = Header(default=None),
 ):
-    """Trigger re-analysis of an entity."""
-    entity = db.query(Entity).filter(Entity.id == uuid.UUID(entity_id)).first()
-    if not entity:
-        raise HTTPException(status_code=404, detail="Entity not found")
+    """
+    Trigger re-analysis of an entity (409 while one is running).
+    With `profile`, the run is profiled (admin only, as X-Admin-Token);
+    artifacts are listed at /admin/profiles.
+    """
+    if profile:
+        require_admin(x_admin_token)
     
-    # Reset status and trigger analysis
-    entity.status = EntityStatus.PENDING
-    entity.analysis_progress = 0
-    db.commit()
+    # Reset status and trigger analysis, unless an analysis is running
+    reset = await run_write(_reset_for_analysis, entity_id)
+    if reset is None:
+        raise HTTPException(status_code=404, detail="Entity not found")
+    if not reset:
+        raise HTTPException(status_code=409, detail="Analysis already in progress")
     
-    background_tasks.add_task(trigger_entity_analysis, entity_id)
+    read_from_primary(response)
+    background_tasks.add_task(trigger_entity_analysis, entity_id, profile=profile)
     
-    return {"message": "Re-analysis triggered", "entity_id": entity_id}
+    return {"message": "Re-analysis triggered", "entity_id": entity_id, "profile": profile}
@@ -0,0 +1,45 @@
+"""
+Bulk export API endpoints.
+Streams whole tables (or one entity's rows) as JSONL or Parquet downloads.
+"""
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
+
+from app.core.database import read_session
+from app.services.export import EXPORT_FORMATS, EXPORT_MODELS, iter_export
+
+router = APIRouter()
+
+MEDIA_TYPES = {
+    "jsonl": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+@router.get("/{kind}")
+async def export_rows(
+    request: Request,
+    kind: str,
+    format: str = "jsonl",
+    entity_id: Optional[str] = None,
+    include_embeddings: bool = False,
+):
+    """
+    Download entities, patents, papers or personnel as JSONL or Parquet.
+    `entity_id` limits the export to one entity; `include_embeddings` adds
+    float32 embeddings to patents and papers. The body is sent with chunked
+    transfer encoding as rows are read.
+    """
+    if kind not in EXPORT_MODELS:
+        raise HTTPException(status_code=404, detail=f"Export must be one of: {', '.join(EXPORT_MODELS)}")
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of: {', '.join(EXPORT_FORMATS)}")
+    
+    filename = f"{kind}-{entity_id}.{format}" if entity_id else f"{kind}.{format}"
+    return StreamingResponse(
+        iter_export(kind, format, entity_id, include_embeddings, lambda: read_session(request)),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
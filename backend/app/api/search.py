@@ -0,0 +1,57 @@
+"""
+Document search API endpoints.
+Keyword (BM25) and hybrid keyword + embedding search over patents and papers.
+"""
+from datetime import datetime
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+
+from app.core.database import get_read_db
+from app.models.schemas import SearchResponse, SearchResult
+from app.services.search import SEARCH_KINDS, SearchUnavailable, hybrid_search, keyword_search
+
+router = APIRouter()
+
+
+@router.get("/", response_model=SearchResponse)
+async def search_documents(
+    q: str,
+    mode: str = "keyword",
+    kind: Optional[str] = None,
+    entity_id: Optional[str] = None,
+    technology: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    limit: int = 20,
+    db: Session = Depends(get_read_db),
+):
+    """
+    Search patent and paper titles and abstracts.
+    `mode` is keyword or hybrid; `kind` restricts to patent or paper;
+    `start`/`end` filter on filing or publication date.
+    """
+    if mode not in ("keyword", "hybrid"):
+        raise HTTPException(status_code=400, detail="mode must be keyword or hybrid")
+    if kind is not None and kind not in SEARCH_KINDS:
+        raise HTTPException(status_code=400, detail="kind must be patent or paper")
+    if not q.strip():
+        raise HTTPException(status_code=400, detail="Query must not be empty")
+    
+    kinds = [kind] if kind else list(SEARCH_KINDS)
+    limit = min(max(limit, 1), 100)
+    
+    try:
+        if mode == "hybrid":
+            results = await hybrid_search(db, q, kinds, entity_id, technology, start, end, limit)
+        else:
+            results = keyword_search(db, q, kinds, entity_id, technology, start, end, limit)
+    except SearchUnavailable:
+        raise HTTPException(status_code=503, detail="Full-text search is not available on this database")
+    
+    return SearchResponse(
+        query=q,
+        mode=mode,
+        results=[SearchResult(**r) for r in results],
+    )
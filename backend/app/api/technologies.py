@@ -1,31 +1,28 @@
 """
 Technology analysis API endpoints.
 """
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
 from sqlalchemy.orm import Session
-from typing import List
+from datetime import date
+from typing import List, Optional
 
-from app.core.database import get_db
+from app.core.database import get_db, get_read_db
+from app.core.responses import ORJSONResponse, response_columns, row_dicts
 from app.models.models import Technology
+from app.models.schemas import GapRankingResponse, TechnologyResponse, TechnologyTrendResponse
 from app.services.ai_service import get_ai_service
+from app.services.gap_analysis import rank_entities
+from app.services.heatmap import HEATMAP_MODES, get_heatmap_json
+from app.services.timeline import technology_trends
 
 router = APIRouter()
 
 
-@router.get("/")
-async def get_technologies(db: Session = Depends(get_db)):
+@router.get("/", response_model=List[TechnologyResponse])
+async def get_technologies(db: Session = Depends(get_read_db)):
     """List all technology domains."""
-    technologies = db.query(Technology).all()
-    return [
-        {
-            "id": str(t.id),
-            "name": t.name,
-            "category": t.category,
-            "description": t.description,
-            "drdo_capability_score": t.drdo_capability_score,
-        }
-        for t in technologies
-    ]
+    rows = db.query(*response_columns(Technology, TechnologyResponse)).all()
+    return ORJSONResponse(row_dicts(rows))
 
 
 @router.get("/domains")
@@ -52,6 +49,49 @@ async def get_technology_domains():
     }
 
 
+@router.get("/rankings", response_model=GapRankingResponse)
+async def get_domain_rankings(domain: str, limit: int = 20, db: Session = Depends(get_read_db)):
+    """Rank tracked entities by their lead over DRDO in a technology domain."""
+    return rank_entities(db, domain, min(max(limit, 1), 200))
+
+
+@router.get("/heatmap")
+async def get_technology_heatmap(mode: str = "count", db: Session = Depends(get_db)):
+    """
+    Entity x technology document matrix for all entities.
+    `mode` is count, row (share of each entity's documents), column (share of
+    each technology's documents) or tfidf. Read from the primary: the cached
+    matrix is only invalidated when a write commits, so it must not be
+    rebuilt from a lagging replica.
+    """
+    if mode not in HEATMAP_MODES:
+        raise HTTPException(status_code=400, detail=f"mode must be one of: {', '.join(HEATMAP_MODES)}")
+    
+    return Response(content=get_heatmap_json(db, mode), media_type="application/json")
+
+
+@router.get("/trends", response_model=TechnologyTrendResponse)
+async def get_technology_trends(
+    technologies: str,
+    bucket_months: int = 12,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    db: Session = Depends(get_read_db),
+):
+    """Document counts over time for comma-separated technologies, across all entities."""
+    if not 1 <= bucket_months <= 120:
+        raise HTTPException(status_code=400, detail="bucket_months must be between 1 and 120")
+    
+    names = [t.strip() for t in technologies.split(",") if t.strip()]
+    if not names or len(names) > 50:
+        raise HTTPException(status_code=400, detail="Provide between 1 and 50 technologies")
+    
+    return TechnologyTrendResponse(
+        bucket_months=bucket_months,
+        trends=technology_trends(db, names, bucket_months, start, end),
+    )
+
+
 @router.post("/extract")
 async def extract_technologies(text: str):
     """Extract technology domains from text."""
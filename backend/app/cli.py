@@ -0,0 +1,79 @@
+"""
+Tech Scout AI command line tools.
+
+Usage (from backend/):
+    python -m app.cli export papers --format parquet --embeddings -o papers.parquet
+    python -m app.cli export entities > entities.jsonl
+    python -m app.cli cluster-entities
+"""
+import argparse
+import contextlib
+import json
+import sys
+
+from app.core.database import SessionLocal, init_db
+from app.core.write_queue import run_write_sync
+from app.models.models import Entity
+from app.services import entity_similarity
+from app.services.export import EXPORT_FORMATS, EXPORT_MODELS, iter_export
+
+
+def export_command(args) -> int:
+    """Stream an export to a file (or stdout)."""
+    # Keep stdout for the export itself
+    with contextlib.redirect_stdout(sys.stderr):
+        init_db()
+    output = open(args.output, "wb") if args.output else sys.stdout.buffer
+    try:
+        for chunk in iter_export(args.kind, args.format, args.entity_id, args.embeddings):
+            output.write(chunk)
+    finally:
+        if args.output:
+            output.close()
+        else:
+            output.flush()
+    return 0
+
+
+def cluster_entities_command(args) -> int:
+    """Cluster all entities by document centroid, optionally backfilling centroids first."""
+    init_db()
+    db = SessionLocal()
+    try:
+        if args.rebuild_centroids:
+            entity_ids = [entity_id for (entity_id,) in db.query(Entity.id).all()]
+            db.rollback()
+            for entity_id in entity_ids:
+                run_write_sync(entity_similarity.rebuild_centroid, entity_id)
+        print(json.dumps(entity_similarity.cluster_entities(db, args.clusters)))
+    finally:
+        db.close()
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.cli", description="Tech Scout AI command line tools")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export = commands.add_parser("export", help="export a table as JSONL or Parquet")
+    export.add_argument("kind", choices=list(EXPORT_MODELS))
+    export.add_argument("--format", choices=EXPORT_FORMATS, default="jsonl")
+    export.add_argument("--entity-id", help="only this entity's rows")
+    export.add_argument("--embeddings", action="store_true", help="include patent/paper embeddings")
+    export.add_argument("-o", "--output", help="output file (default: stdout)")
+    export.set_defaults(handler=export_command)
+
+    cluster = commands.add_parser("cluster-entities", help="cluster entities by their documents' embeddings")
+    cluster.add_argument("--clusters", type=int, help="number of clusters (default: ENTITY_CLUSTERS)")
+    cluster.add_argument(
+        "--rebuild-centroids", action="store_true",
+        help="recompute every centroid from stored documents first (for data ingested before centroids)",
+    )
+    cluster.set_defaults(handler=cluster_entities_command)
+
+    args = parser.parse_args(argv)
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,7 +2,7 @@
 Application settings - no API keys required!
 """
 from pydantic_settings import BaseSettings, SettingsConfigDict
-from typing import Optional
+from typing import Dict, Optional
 
 
 class Settings(BaseSettings):
@@ -14,6 +14,36 @@ class Settings(BaseSettings):
     # Database (SQLite for dev, PostgreSQL for production)
     DATABASE_URL: str = "sqlite:///./techscout.db"
     
+    # PostgreSQL connection pool
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT_SECONDS: float = 30.0  # wait for a free connection before failing
+    DB_POOL_RECYCLE_SECONDS: int = 1800  # replace connections older than this
+    DB_POOL_PRE_PING: bool = True
+    DB_STATEMENT_CACHE_SIZE: int = 500  # compiled SQL statements cached per engine
+    # Behind PgBouncer in transaction mode: no client-side pool (PgBouncer
+    # pools) and no server-side prepared statements
+    DB_PGBOUNCER: bool = False
+    
+    # Read replica for read-only API routes (see app.core.database.get_read_db)
+    DATABASE_READ_URL: Optional[str] = None
+    DB_REPLICA_MAX_LAG_SECONDS: float = 5.0  # reads go to the primary while the replica lags more
+    DB_REPLICA_LAG_CHECK_SECONDS: float = 2.0  # how often replica lag is measured
+    # After a write, the client's reads go to the primary for this long; keep
+    # it above max lag plus the check interval
+    DB_READ_YOUR_WRITES_SECONDS: float = 10.0
+    
+    # SQLite (DATABASE_URL=sqlite:///path)
+    SQLITE_WAL: bool = True  # readers never block the writer or each other
+    SQLITE_SYNCHRONOUS: str = "NORMAL"  # in WAL mode, may lose the last commits on power loss but never corrupts
+    SQLITE_MMAP_SIZE_MB: int = 256
+    SQLITE_CACHE_SIZE_MB: int = 64  # page cache per connection
+    SQLITE_BUSY_TIMEOUT_SECONDS: float = 30.0
+    # Route writes through one writer thread (see app.core.write_queue)
+    SQLITE_SINGLE_WRITER: bool = True
+    SQLITE_WRITE_BATCH_SIZE: int = 64  # queued writes committed in one transaction
+    SQLITE_WRITE_BATCH_WAIT_MS: float = 0.0  # wait this long for more writes before committing
+    
     # AI Models (local, no API keys needed)
     GRANITE_MODEL: str = "ibm-granite/granite-3.0-2b-instruct"
     EMBEDDING_MODEL: str = "BAAI/bge-small-en-v1.5"
@@ -21,6 +51,92 @@ class Settings(BaseSettings):
     # Optional: For faster embedding with GPU
     USE_GPU: bool = False
     
+    # Embedding worker pool (0 = embed in-process)
+    EMBEDDING_WORKERS: int = 0
+    EMBEDDING_THREADS_PER_WORKER: int = 1
+    EMBEDDING_BATCH_SIZE: int = 64
+    EMBEDDING_DIM: int = 384
+    # "fastembed", or "stub" for deterministic hash vectors (offline runs and benchmarks)
+    EMBEDDING_BACKEND: str = "fastembed"
+    
+    # Analysis runs: one at a time per entity. A run that has written no
+    # progress for this long is presumed dead and may be replaced
+    ANALYSIS_CLAIM_TIMEOUT_SECONDS: float = 900.0
+    # Documents tagged, embedded and committed together; bounds a run's memory
+    ANALYSIS_CHUNK_SIZE: int = 500
+    
+    # Analysis checkpoints (resume a failed run from its last completed stage)
+    ANALYSIS_CHECKPOINTS: bool = True
+    CHECKPOINT_DB_PATH: str = "./checkpoints.db"
+    CHECKPOINT_MAX_AGE_HOURS: int = 24
+    
+    # Scraping budgets (seconds); sources still running at the deadline are dropped
+    SCRAPE_DEADLINE_SECONDS: float = 45.0
+    SCRAPE_SOURCE_BUDGETS: Dict[str, float] = {
+        "patents": 25.0,
+        "arxiv": 20.0,
+        "semantic_scholar": 20.0,
+        "dblp": 15.0,
+        "crossref": 20.0,
+    }
+    # Send a duplicate JSON API request if the first is this slow (0 = off)
+    SCRAPE_HEDGE_AFTER_SECONDS: float = 0.0
+    CIRCUIT_BREAKER_THRESHOLD: int = 3
+    CIRCUIT_BREAKER_COOLDOWN_SECONDS: float = 300.0
+    SCRAPE_RATE_LIMIT_SECONDS: float = 1.0  # minimum gap between requests to the same host
+    
+    # Source endpoints (override to use a mirror or the benchmark stub server)
+    GOOGLE_PATENTS_URL: str = "https://patents.google.com"
+    ARXIV_API_URL: str = "http://export.arxiv.org/api/query"
+    SEMANTIC_SCHOLAR_API_URL: str = "https://api.semanticscholar.org/graph/v1"
+    DBLP_API_URL: str = "https://dblp.org/search/publ/api"
+    CROSSREF_API_URL: str = "https://api.crossref.org/works"
+    
+    # Gap analysis scoring
+    GAP_RECENCY_HALF_LIFE_DAYS: float = 730.0
+    GAP_SCORE_SCALE: float = 10.0  # decayed mass at which a domain scores ~63/100
+    GAP_CRITICAL_THRESHOLD: float = 20.0  # entity leads DRDO by at least this much
+    GAP_COLLABORATION_BAND: float = 20.0  # scores within this band of each other
+    
+    # Citation graph
+    CITATION_MAX_PER_PAPER: int = 200
+    
+    # Document search
+    SEARCH_TITLE_WEIGHT: float = 5.0  # BM25 weight of title matches relative to abstract
+    SEARCH_HYBRID_CANDIDATES: int = 200  # results taken from each retriever before fusion
+    SEARCH_RRF_K: int = 60  # reciprocal rank fusion constant
+    
+    # Related entities (centroids of document embeddings)
+    ENTITY_NEAR_DUPLICATE_SIMILARITY: float = 0.95  # centroid cosine at which entities are flagged as near-duplicates
+    ENTITY_CLUSTERS: int = 0  # clusters made by the clustering job (0 = about sqrt(entities / 2))
+    ENTITY_CLUSTER_ITERATIONS: int = 25
+    
+    # Bulk entity import
+    BULK_IMPORT_BATCH_SIZE: int = 500  # rows validated, deduplicated and inserted per commit
+    BULK_ANALYSIS_CONCURRENCY: int = 4  # imported entities analysed at the same time
+    BULK_RESUME_PENDING: bool = True  # on startup, queue requested analyses no run had claimed (never analyze=false imports)
+    
+    # Batch analysis (many entities as one job; see app.services.batch_analysis)
+    BATCH_ANALYSIS_MAX_ENTITIES: int = 1000
+    BATCH_ANALYSIS_CONCURRENCY: int = 16  # entities of a batch analysed at the same time
+    BATCH_SOURCE_CONCURRENCY: int = 2  # entities scraping the same source at once; budgets start when admitted
+    BATCH_EMBEDDING_BATCH_SIZE: int = 1024  # documents from all of a batch's entities embedded together
+    BATCH_EMBEDDING_WAIT_MS: float = 200.0  # wait this long for a fuller embedding batch
+    BATCH_ANALYSIS_HISTORY: int = 50  # finished batches kept for status requests
+    
+    # Bulk export
+    EXPORT_BATCH_SIZE: int = 2000  # rows per cursor fetch and Parquet row group
+    
+    # Analysis profiling (opt-in per job; see app.services.profiling)
+    PROFILE_SAMPLE_RATE: float = 0.0  # fraction of analyses profiled without being asked
+    PROFILE_DIR: str = "./profiles"
+    PROFILE_MAX_ARTIFACTS: int = 50  # oldest profiles are deleted beyond this
+    PROFILE_STACK_INTERVAL_MS: float = 5.0  # stack sampling period
+    
+    # Admin endpoints and profiled reanalyses require this value in the
+    # X-Admin-Token header; they are disabled while it is unset
+    ADMIN_TOKEN: Optional[str] = None
+    
     model_config = SettingsConfigDict(
         env_file=".env",
         case_sensitive=True,
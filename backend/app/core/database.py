@@ -1,34 +1,99 @@
 """
 Database configuration and session management.
-Uses SQLAlchemy with PostgreSQL + pgvector.
+Uses SQLAlchemy with PostgreSQL + pgvector, or SQLite in WAL mode.
+
+Read-only routes take their session from get_read_db, which uses the read
+replica (DATABASE_READ_URL) while it is reachable and caught up, and the
+primary otherwise, or when the client wrote something moments ago.
 """
+import logging
+import math
 import os
-from sqlalchemy import create_engine
+import threading
+import time
+from typing import Optional
+
+from fastapi import Request, Response
+from sqlalchemy import create_engine, event, inspect, text
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import NullPool
 from app.core.config import settings
+from app.core.metrics import DB_READS_ROUTED, DB_REPLICA_LAG, register_pool_metrics
+
+logger = logging.getLogger(__name__)
 
 # Database URL from settings
 DATABASE_URL = settings.DATABASE_URL
 
-# Create engine
-# For development, use a SQLite fallback if PostgreSQL is not available
-if DATABASE_URL.startswith("postgresql"):
-    engine = create_engine(
-        DATABASE_URL,
-        pool_pre_ping=True,
-        pool_size=5,
-        max_overflow=10,
-    )
-else:
-    # SQLite fallback for development
-    engine = create_engine(
-        "sqlite:///./techscout.db",
-        connect_args={"check_same_thread": False},
+
+def postgres_engine_options(url: str) -> dict:
+    """create_engine() options for PostgreSQL from the pool settings."""
+    options = {
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+        "query_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+    }
+    if settings.DB_PGBOUNCER:
+        # PgBouncer owns the pool; psycopg 3 must not prepare statements
+        # because consecutive transactions may run on different servers
+        options["poolclass"] = NullPool
+        if url.startswith("postgresql+psycopg:"):
+            options["connect_args"] = {"prepare_threshold": None}
+    else:
+        options.update(
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT_SECONDS,
+            pool_recycle=settings.DB_POOL_RECYCLE_SECONDS,
+            pool_use_lifo=True,
+        )
+    return options
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Per-connection SQLite tuning for concurrent readers and one writer."""
+    cursor = dbapi_connection.cursor()
+    if settings.SQLITE_WAL:
+        cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute(f"PRAGMA synchronous={settings.SQLITE_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA mmap_size={settings.SQLITE_MMAP_SIZE_MB * 1024 * 1024}")
+    # Negative sizes are in KiB
+    cursor.execute(f"PRAGMA cache_size=-{settings.SQLITE_CACHE_SIZE_MB * 1024}")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.close()
+
+
+def sqlite_engine(url: str):
+    """Engine for a SQLite URL with the SQLITE_* pragmas applied."""
+    sqlite = create_engine(
+        url,
+        connect_args={"check_same_thread": False, "timeout": settings.SQLITE_BUSY_TIMEOUT_SECONDS},
+        query_cache_size=settings.DB_STATEMENT_CACHE_SIZE,
     )
+    event.listen(sqlite, "connect", _set_sqlite_pragmas)
+    return sqlite
+
+
+def make_engine(url: str):
+    """Engine for a database URL, with the settings for its dialect."""
+    if url.startswith("postgresql"):
+        return create_engine(url, **postgres_engine_options(url))
+    if url.startswith("sqlite"):
+        return sqlite_engine(url)
+    return create_engine(url, pool_pre_ping=True)
+
+
+# Create engine
+engine = make_engine(DATABASE_URL)
+
+register_pool_metrics(engine)
 
 # Session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Read replica (optional)
+read_engine = make_engine(settings.DATABASE_READ_URL) if settings.DATABASE_READ_URL else None
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine) if read_engine else None
+
 # Base class for models
 Base = declarative_base()
 
@@ -42,10 +107,172 @@ def get_db():
         db.close()
 
 
+# Seconds the replica's replayed state is behind the primary. When it has
+# replayed all WAL it received it is current, whatever the age of the last
+# replayed transaction (which keeps growing while the primary is idle).
+REPLICA_LAG_SQL = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+    END
+""")
+
+
+class ReplicaMonitor:
+    """Read replica lag, measured at most every DB_REPLICA_LAG_CHECK_SECONDS."""
+
+    def __init__(self, replica_engine):
+        self.engine = replica_engine
+        self._lock = threading.Lock()
+        self._checked = float("-inf")
+        self._lag: Optional[float] = None  # None until measured, or when unreachable
+
+    def _measure(self) -> Optional[float]:
+        try:
+            with self.engine.connect() as conn:
+                if self.engine.dialect.name != "postgresql":
+                    return 0.0
+                lag = conn.execute(REPLICA_LAG_SQL).scalar()
+            return float(lag or 0.0)
+        except Exception as e:
+            logger.warning(f"Read replica unavailable: {e}")
+            return None
+
+    def lag(self) -> Optional[float]:
+        """Last measured lag in seconds; None when the replica is unreachable."""
+        # One request measures; concurrent ones use the previous value
+        due = time.monotonic() - self._checked >= settings.DB_REPLICA_LAG_CHECK_SECONDS
+        if due and self._lock.acquire(blocking=False):
+            try:
+                self._lag = self._measure()
+                DB_REPLICA_LAG.set(-1 if self._lag is None else self._lag)
+            finally:
+                self._checked = time.monotonic()
+                self._lock.release()
+        return self._lag
+
+
+replica = ReplicaMonitor(read_engine) if read_engine else None
+
+# Set after a write; while valid, the client's reads go to the primary
+READ_PRIMARY_COOKIE = "techscout_read_primary"
+
+
+def read_from_primary(response: Response):
+    """Send the client's reads to the primary for DB_READ_YOUR_WRITES_SECONDS (call after a write)."""
+    if read_engine is None:
+        return
+    seconds = settings.DB_READ_YOUR_WRITES_SECONDS
+    response.set_cookie(
+        READ_PRIMARY_COOKIE, f"{time.time() + seconds:.0f}",
+        max_age=math.ceil(seconds), httponly=True, samesite="lax",
+    )
+
+
+def _wrote_recently(request: Request) -> bool:
+    try:
+        return float(request.cookies.get(READ_PRIMARY_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+def read_session(request: Request):
+    """A new session for a read-only request, routed as get_read_db; the caller closes it."""
+    if ReadSessionLocal is None:
+        return SessionLocal()
+    if _wrote_recently(request):
+        reason = "read_your_writes"
+    else:
+        lag = replica.lag()
+        if lag is not None and lag <= settings.DB_REPLICA_MAX_LAG_SECONDS:
+            DB_READS_ROUTED.labels(target="replica", reason="ok").inc()
+            return ReadSessionLocal()
+        reason = "unavailable" if lag is None else "lag"
+    DB_READS_ROUTED.labels(target="primary", reason=reason).inc()
+    return SessionLocal()
+
+
+def get_read_db(request: Request):
+    """
+    Dependency to get a session for read-only routes: on the read replica
+    when configured and within DB_REPLICA_MAX_LAG_SECONDS, else the primary.
+    """
+    db = read_session(request)
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def _add_missing_columns(bind, table):
+    """ALTER TABLE ... ADD COLUMN for model columns a table created by an earlier version lacks."""
+    existing = {column["name"] for column in inspect(bind).get_columns(table.name)}
+    for column in table.columns:
+        if column.name in existing:
+            continue
+        with bind.begin() as conn:
+            conn.exec_driver_sql(
+                f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(dialect=bind.dialect)}"
+            )
+        logger.info(f"Added column {table.name}.{column.name}")
+
+
+def upgrade_schema(bind):
+    """
+    Bring tables created by earlier versions up to date; create_all never
+    alters a table that already exists. Does nothing on current databases.
+    """
+    from app.models.models import Citation, Entity
+    
+    _add_missing_columns(bind, Entity.__table__)
+    _widen_citation_ids(bind, Citation.__table__)
+
+
+def _widen_citation_ids(bind, table):
+    """
+    Citation ends were document IDs (String(36)) and are now also external
+    keys ("doi:..."); widen the columns and index them. SQLite ignores
+    VARCHAR lengths, so only the indexes are needed there.
+    """
+    if not inspect(bind).has_table(table.name):
+        return
+    if bind.dialect.name == "postgresql":
+        lengths = {
+            column["name"]: getattr(column["type"], "length", None)
+            for column in inspect(bind).get_columns(table.name)
+        }
+        for name in ("source_id", "target_id"):
+            length = table.c[name].type.length
+            if lengths.get(name) is not None and lengths[name] < length:
+                with bind.begin() as conn:
+                    conn.exec_driver_sql(f"ALTER TABLE {table.name} ALTER COLUMN {name} TYPE VARCHAR({length})")
+                logger.info(f"Widened {table.name}.{name} to VARCHAR({length})")
+    for index in table.indexes:
+        if {column.name for column in index.columns} & {"source_id", "target_id"}:
+            index.create(bind=bind, checkfirst=True)
+
+
 def init_db():
     """Initialize database tables."""
-    from app.models.models import Entity, Patent, Paper, Personnel, Technology, Citation, DRDOCapability
+    from app.models.models import (
+        Entity, Patent, Paper, Personnel, Technology, Citation, DRDOCapability, EntityDomainScore,
+        EntityMonthlyRollup, EntityPatent, EntityPaper, EntityCentroid,
+    )
+    
+    from app.services.documents import upgrade_document_store
+    from app.services.gap_analysis import backfill_domain_scores
+    from app.services.timeline import backfill_rollups
+    from app.services.search import setup_search_index
     
-    # Create all tables
+    # Create all tables, plus indexes added to tables that already existed
     Base.metadata.create_all(bind=engine)
+    upgrade_schema(engine)
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+    upgrade_document_store(engine)
+    backfill_domain_scores()
+    backfill_rollups()
+    setup_search_index(engine)
     print("Database tables created successfully")
@@ -1,8 +1,28 @@
 """
 LangGraph State and Workflow definitions.
 """
-from typing import TypedDict, List, Dict, Any, Optional
-from langgraph.graph import StateGraph, END
+import operator
+from contextlib import asynccontextmanager
+from typing import Annotated, TypedDict, List, Dict, Any, Optional
+from langgraph.graph import StateGraph, START, END
+
+from app.core.config import settings
+
+
+def merge_counts(existing: Optional[Dict], new: Optional[Dict]) -> Dict:
+    """Reducer: add counters (nested dicts of ints) written by parallel scouts."""
+    merged = dict(existing or {})
+    for key, value in (new or {}).items():
+        if isinstance(value, dict):
+            merged[key] = merge_counts(merged.get(key), value)
+        else:
+            merged[key] = merged.get(key, 0) + value
+    return merged
+
+
+def merge_dicts(existing: Optional[Dict], new: Optional[Dict]) -> Dict:
+    """Reducer: shallow-merge dicts written by different nodes."""
+    return {**(existing or {}), **(new or {})}
 
 
 class AgentState(TypedDict):
@@ -10,45 +30,82 @@ class AgentState(TypedDict):
     # Input
     entity_name: str
     entity_id: str
-    
-    # Data collected
-    patents: List[Dict[str, Any]]
-    papers: List[Dict[str, Any]]
+    website: Optional[str]
+
+    # Counters from the scouts, which store documents as they scrape them
+    # (merged as each scout completes): documents and newly linked
+    # documents per kind, technology counts per kind, and per author
+    # {"publications": n, "technologies": {technology: n}}
+    document_counts: Annotated[Dict[str, int], merge_counts]
+    linked_counts: Annotated[Dict[str, int], merge_counts]
+    technology_counts: Annotated[Dict[str, Dict[str, int]], merge_counts]
+    authors: Annotated[Dict[str, Dict[str, Any]], merge_counts]
     personnel: List[Dict[str, Any]]
-    
+
     # Analysis results
     tech_stack: Dict[str, Any]
     technologies: List[str]
-    
+
+    # Per-source scrape status (ok / timeout / error / skipped)
+    source_status: Annotated[Dict[str, Dict[str, Any]], merge_dicts]
+
+    # IDs written to the database, per document kind
+    persisted_ids: Annotated[Dict[str, List[str]], merge_dicts]
+
+    # Per-node wall-clock timings in seconds
+    timings: Annotated[Dict[str, float], merge_dicts]
+
     # Output
     report: Dict[str, Any]
-    messages: List[Dict[str, str]]
+    messages: Annotated[List[Dict[str, str]], operator.add]
     current_step: str
 
 
-def create_analysis_graph() -> StateGraph:
+def create_analysis_graph(checkpointer=None) -> StateGraph:
     """
     Create the LangGraph workflow for entity analysis.
-    
-    Flow: scout -> analyst -> reporter -> END
+
+    Flow:
+        START -> scout_<source> (one per source, in parallel)
+              -> analyst -> persist_personnel -> reporter -> END
+
+    Each scout tags, embeds and stores its documents in fixed-size chunks
+    as soon as its source returns, so embedding overlaps with the slower
+    sources still scraping and documents never accumulate in the state.
+    With a checkpointer, every completed node is saved so a failed run
+    resumes from the last completed stage.
     """
-    from app.agents.agents import scout_agent, analyst_agent, reporter_agent
-    
+    from app.agents.agents import (
+        make_scout_agent,
+        analyst_agent,
+        persist_personnel_agent,
+        reporter_agent,
+    )
+    from app.services.scraper import SCRAPE_SOURCES
+
     # Create the graph
     workflow = StateGraph(AgentState)
-    
+
+    # Fan out: one scout node per source
+    scout_nodes = []
+    for source in SCRAPE_SOURCES:
+        node = f"scout_{source}"
+        workflow.add_node(node, make_scout_agent(source))
+        workflow.add_edge(START, node)
+        scout_nodes.append(node)
+
     # Add nodes
-    workflow.add_node("scout", scout_agent)
     workflow.add_node("analyst", analyst_agent)
+    workflow.add_node("persist_personnel", persist_personnel_agent)
     workflow.add_node("reporter", reporter_agent)
-    
-    # Define edges
-    workflow.set_entry_point("scout")
-    workflow.add_edge("scout", "analyst")
-    workflow.add_edge("analyst", "reporter")
+
+    # Define edges (analyst joins all scouts)
+    workflow.add_edge(scout_nodes, "analyst")
+    workflow.add_edge("analyst", "persist_personnel")
+    workflow.add_edge("persist_personnel", "reporter")
     workflow.add_edge("reporter", END)
-    
-    return workflow.compile()
+
+    return workflow.compile(checkpointer=checkpointer)
 
 
 # Compiled graph for import
@@ -61,3 +118,21 @@ def get_analysis_graph():
     if analysis_graph is None:
         analysis_graph = create_analysis_graph()
     return analysis_graph
+
+
+def analysis_thread_id(entity_id: str) -> str:
+    """Checkpoint thread ID for an entity's analysis run."""
+    return f"analysis-{entity_id}"
+
+
+@asynccontextmanager
+async def open_checkpointer():
+    """Open the SQLite checkpointer, or yield None when checkpoints are disabled."""
+    if not settings.ANALYSIS_CHECKPOINTS:
+        yield None
+        return
+
+    from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+    async with AsyncSqliteSaver.from_conn_string(settings.CHECKPOINT_DB_PATH) as saver:
+        yield saver
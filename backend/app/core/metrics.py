@@ -0,0 +1,229 @@
+"""
+Prometheus metrics.
+Request latency per route, database queries per request, analysis stage
+timings, embedding/LLM throughput and scraper stats, exposed at /metrics.
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import List, Optional
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# ============== HTTP ==============
+
+HTTP_REQUEST_DURATION = Histogram(
+    "techscout_http_request_duration_seconds",
+    "HTTP request latency by route template",
+    ["method", "route", "status"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+DB_QUERIES_PER_REQUEST = Histogram(
+    "techscout_db_queries_per_request",
+    "SQL statements executed while serving a request",
+    ["method", "route"],
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100, 250),
+)
+
+# ============== Database ==============
+
+DB_QUERIES = Counter("techscout_db_queries_total", "SQL statements executed")
+DB_POOL_IN_USE = Gauge("techscout_db_pool_connections_in_use", "Pooled connections checked out")
+DB_POOL_IDLE = Gauge("techscout_db_pool_connections_idle", "Pooled connections waiting to be checked out")
+DB_POOL_CAPACITY = Gauge("techscout_db_pool_capacity", "Most connections the pool will open (size plus overflow)")
+DB_POOL_CHECKOUTS = Counter("techscout_db_pool_checkouts_total", "Connections checked out of the pool")
+DB_POOL_SATURATED = Counter(
+    "techscout_db_pool_saturated_total",
+    "Checkouts that left no free connection; further checkouts wait for one",
+)
+DB_READS_ROUTED = Counter(
+    "techscout_db_reads_routed_total",
+    "Read-only requests by the database serving them and why",
+    ["target", "reason"],
+)
+DB_REPLICA_LAG = Gauge("techscout_db_replica_lag_seconds", "Last measured read replica lag (-1 when unreachable)")
+DB_WRITE_QUEUE_DEPTH = Gauge("techscout_db_write_queue_depth", "Writes waiting for the SQLite writer")
+DB_WRITE_BATCH_SIZE = Histogram(
+    "techscout_db_write_batch_size",
+    "Writes committed together by the SQLite writer",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128),
+)
+DB_WRITE_WAIT = Histogram(
+    "techscout_db_write_wait_seconds",
+    "Time from queueing a write to its commit",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+
+# ============== Analysis pipeline ==============
+
+ANALYSIS_DURATION = Histogram(
+    "techscout_analysis_duration_seconds",
+    "End-to-end entity analysis time",
+    ["outcome"],
+    buckets=(1, 5, 10, 20, 30, 45, 60, 90, 120, 300, 600),
+)
+ANALYSIS_STAGE_DURATION = Histogram(
+    "techscout_analysis_stage_duration_seconds",
+    "Analysis stage time (scrape, dedup, embed and persist per source; graph nodes)",
+    ["stage", "source"],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 45.0),
+)
+SCRAPED_DOCUMENTS = Counter(
+    "techscout_scraped_documents_total",
+    "Documents returned by sources, by whether they were already stored",
+    ["source", "state"],
+)
+SINGLE_FLIGHT_SHARED = Counter(
+    "techscout_single_flight_shared_total",
+    "Calls that joined identical in-flight work (fetches, embeddings) instead of repeating it",
+    ["kind"],
+)
+
+# ============== AI ==============
+
+EMBEDDED_TEXTS = Counter("techscout_embedded_texts_total", "Texts embedded", ["backend"])
+EMBEDDING_DURATION = Histogram(
+    "techscout_embedding_batch_duration_seconds",
+    "Time to embed one batch",
+    ["backend"],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+)
+LLM_GENERATED_TOKENS = Counter("techscout_llm_generated_tokens_total", "Tokens generated by the LLM")
+LLM_GENERATION_DURATION = Histogram(
+    "techscout_llm_generation_duration_seconds",
+    "Time per LLM generation",
+    buckets=(0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0),
+)
+
+# ============== Scraper ==============
+
+SCRAPER_REQUESTS = Counter(
+    "techscout_scraper_requests_total",
+    "Outgoing scraper requests by domain and outcome (ok, http_error, error)",
+    ["domain", "outcome"],
+)
+SCRAPER_RATE_LIMITED = Counter(
+    "techscout_scraper_rate_limited_total",
+    "Scraper requests delayed by the per-domain rate limit",
+    ["domain"],
+)
+SCRAPER_RATE_LIMIT_WAIT = Counter(
+    "techscout_scraper_rate_limit_wait_seconds_total",
+    "Time spent waiting on the per-domain rate limit",
+    ["domain"],
+)
+SCRAPER_CIRCUIT_OPEN = Gauge(
+    "techscout_scraper_circuit_open",
+    "1 while a source's circuit breaker is open",
+    ["source"],
+)
+
+
+# ============== Query counting ==============
+
+# Per-request statement counter; a one-element list so threadpool copies of
+# the context still update the request's count
+_query_count: ContextVar[Optional[List[int]]] = ContextVar("query_count", default=None)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    DB_QUERIES.inc()
+    count = _query_count.get()
+    if count is not None:
+        count[0] += 1
+
+
+def register_pool_metrics(engine: Engine):
+    """Report an engine's pool usage (QueuePool only; other pools report checkouts)."""
+    pool = engine.pool
+    capacity = None
+    if hasattr(pool, "checkedout"):
+        DB_POOL_IN_USE.set_function(pool.checkedout)
+        DB_POOL_IDLE.set_function(pool.checkedin)
+        # A negative max_overflow means the pool never runs out
+        max_overflow = getattr(pool, "_max_overflow", -1)
+        if max_overflow >= 0:
+            capacity = pool.size() + max_overflow
+            DB_POOL_CAPACITY.set(capacity)
+
+    @event.listens_for(pool, "checkout")
+    def _checkout(dbapi_connection, connection_record, connection_proxy):
+        DB_POOL_CHECKOUTS.inc()
+        if capacity is not None and pool.checkedout() >= capacity:
+            DB_POOL_SATURATED.inc()
+
+
+@contextmanager
+def stage_timer(stage: str, source: str = ""):
+    """Observe the block's wall-clock time as an analysis stage."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        ANALYSIS_STAGE_DURATION.labels(stage=stage, source=source).observe(time.perf_counter() - start)
+
+
+def _route_template(scope) -> str:
+    """
+    Path template of the matched route (e.g. /api/v1/entities/{entity_id}).
+    FastAPI versions that match an included router's routes in place leave
+    the include prefix out of route.path; it is then taken from the leading
+    segments of the request path (prefixes have no parameters).
+    """
+    route = scope.get("route")
+    if route is None:
+        return "unmatched"
+    template = route.path
+    missing = scope["path"].count("/") - template.count("/")
+    if missing > 0:
+        template = "/".join(scope["path"].split("/")[:missing + 1]) + template
+    return template
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording latency and query count per route template
+    (e.g. /api/v1/entities/{entity_id}), so path parameters do not create
+    new series. Requests matching no route are grouped as "unmatched".
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = [500]
+        count = [0]
+        start = time.perf_counter()
+        # (seconds, queries) when the last body chunk is sent; background
+        # tasks run after that within the same call and are not counted
+        finished = []
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body") and not finished:
+                finished.append((time.perf_counter() - start, count[0]))
+
+        token = _query_count.set(count)
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            _query_count.reset(token)
+            elapsed, queries = finished[0] if finished else (time.perf_counter() - start, count[0])
+            route = _route_template(scope)
+            method = scope["method"]
+            HTTP_REQUEST_DURATION.labels(method=method, route=route, status=str(status[0])).observe(elapsed)
+            DB_QUERIES_PER_REQUEST.labels(method=method, route=route).observe(queries)
+
+
+def render_metrics() -> tuple:
+    """Current metrics in Prometheus text format, with their content type."""
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -0,0 +1,79 @@
+"""
+Keyset (cursor) pagination.
+Pages are ordered by a sort column plus the primary key, and the cursor
+holds the last row's values, so each page is an index range seek instead
+of an OFFSET scan over every earlier row. NULL sort values come last in
+both directions.
+"""
+import base64
+from datetime import datetime
+from typing import Any, List, Optional, Tuple
+
+import orjson
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Query
+
+
+class InvalidCursor(ValueError):
+    """The cursor could not be decoded."""
+
+
+def encode_cursor(value: Any, row_id: str) -> str:
+    """Opaque cursor for the row after which the next page starts."""
+    if isinstance(value, datetime):
+        value = {"dt": value.isoformat()}
+    return base64.urlsafe_b64encode(orjson.dumps([value, row_id])).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[Any, str]:
+    try:
+        value, row_id = orjson.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if isinstance(value, dict):
+            value = datetime.fromisoformat(value["dt"])
+        return value, str(row_id)
+    except Exception as e:
+        raise InvalidCursor(str(e)) from e
+
+
+def keyset_page(
+    query: Query,
+    sort_column,
+    id_column,
+    descending: bool = True,
+    cursor: Optional[str] = None,
+    limit: int = 50,
+) -> Tuple[List[Any], Optional[str]]:
+    """
+    One page of `query` ordered by (sort_column, id_column).
+    Rows must expose the sort and ID values under the columns' names.
+    Returns the rows and the cursor for the next page (None on the last page).
+
+    Rows with a sort value are read with a row-value range seek; rows with
+    a NULL sort value follow them in a second seek on the ID alone.
+    """
+    value, last_id = decode_cursor(cursor) if cursor else (None, None)
+
+    rows = []
+    if cursor is None or value is not None:
+        valued = query.filter(sort_column.isnot(None))
+        if cursor is not None:
+            key, bound = tuple_(sort_column, id_column), tuple_(value, last_id)
+            valued = valued.filter(key < bound if descending else key > bound)
+        if descending:
+            valued = valued.order_by(sort_column.desc(), id_column.desc())
+        else:
+            valued = valued.order_by(sort_column.asc(), id_column.asc())
+        rows = valued.limit(limit + 1).all()
+
+    if len(rows) <= limit:
+        nulls = query.filter(sort_column.is_(None))
+        if cursor is not None and value is None:
+            nulls = nulls.filter(id_column < last_id if descending else id_column > last_id)
+        nulls = nulls.order_by(id_column.desc() if descending else id_column.asc())
+        rows += nulls.limit(limit + 1 - len(rows)).all()
+
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor(getattr(last, sort_column.key), getattr(last, id_column.key))
@@ -0,0 +1,56 @@
+"""
+Fast JSON responses.
+Endpoints returning large pages select exactly their response schema's
+columns, turn rows into plain dicts and encode them with orjson. Rows are
+never built into Pydantic models and re-validated by FastAPI.
+"""
+from typing import Any, Dict, Iterable, List, Type
+
+import orjson
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel
+from pydantic_core import PydanticUndefined
+from sqlalchemy import func
+
+
+class ORJSONResponse(JSONResponse):
+    """JSON response encoded with orjson (datetimes, UUIDs and numpy arrays supported)."""
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+
+
+class RequestStreamingResponse(StreamingResponse):
+    """
+    Streaming response sent while the request body is still being read.
+    StreamingResponse watches for client disconnects by consuming receive(),
+    which would swallow the body chunks the endpoint is still reading.
+    """
+
+    async def __call__(self, scope, receive, send) -> None:
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+
+def response_columns(model, schema: Type[BaseModel], **overrides) -> list:
+    """
+    Columns of `model` for each field of `schema`, labelled with the field
+    name. NULLs are replaced with the field's default (e.g. counts of 0),
+    so rows match the schema without validation. `overrides` supplies
+    expressions for fields whose column has a different name.
+    """
+    columns = []
+    for name, field in schema.model_fields.items():
+        column = overrides.get(name, getattr(model, name, None))
+        if column is None:
+            raise ValueError(f"{model.__name__} has no column for {schema.__name__}.{name}")
+        if field.default is not PydanticUndefined and field.default is not None:
+            column = func.coalesce(column, field.default)
+        columns.append(column.label(name))
+    return columns
+
+
+def row_dicts(rows: Iterable[Any]) -> List[Dict[str, Any]]:
+    """Result rows as JSON-ready dicts keyed by column label."""
+    return [row._asdict() for row in rows]
@@ -0,0 +1,44 @@
+"""
+Single-flight coordination for identical concurrent work.
+
+When several analyses run at once (two entities with the same name, bulk
+imports), they request the same URLs and embed the same texts. Calls made
+through a SingleFlight with the same key while one is in flight share that
+call's result instead of repeating it. Nothing is cached: once the call
+completes, the next one runs again.
+"""
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable, TypeVar
+
+from app.core.metrics import SINGLE_FLIGHT_SHARED
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """Coalesce concurrent calls by key within the event loop."""
+
+    def __init__(self, kind: str):
+        self.kind = kind
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+
+    def _forget(self, key: Hashable, task: asyncio.Future):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # Nobody may be awaiting a call whose callers were all cancelled
+        if not task.cancelled():
+            task.exception()
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        """
+        Run fn() unless a call with `key` is in flight, and return its result.
+        A cancelled caller does not cancel the call for the others.
+        """
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            SINGLE_FLIGHT_SHARED.labels(kind=self.kind).inc()
+        return await asyncio.shield(task)
@@ -0,0 +1,195 @@
+"""
+Database writes, serialised through a single writer on SQLite.
+
+SQLite allows one writer at a time; with several sessions writing at once
+(concurrent analyses, bulk imports, API updates) some fail with "database
+is locked". With SQLITE_SINGLE_WRITER, writes are instead queued to one
+writer thread, which commits whatever has queued up (up to
+SQLITE_WRITE_BATCH_SIZE writes) in a single transaction, each write in its
+own savepoint so a failing write does not undo the others. Readers keep
+their own connections and run concurrently (WAL mode).
+
+A write is a function taking a session; it must not commit, and should
+return plain values rather than ORM objects (the session is closed once
+the batch is committed):
+
+    def rename(db, entity_id, name):
+        db.query(Entity).filter(Entity.id == entity_id).update({"name": name})
+
+    await run_write(rename, entity_id, "New name")
+
+Work that must only happen once the write is committed (cache
+invalidation, in-memory indexes) is registered with after_commit(db, fn)
+and runs in the caller's thread after the commit. On PostgreSQL, or with
+the writer disabled, run_write runs the function in the given (or a new)
+session and commits.
+"""
+import asyncio
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.core import database
+from app.core.config import settings
+from app.core.metrics import DB_WRITE_BATCH_SIZE, DB_WRITE_QUEUE_DEPTH, DB_WRITE_WAIT
+
+logger = logging.getLogger(__name__)
+
+_AFTER_COMMIT = "after_commit"
+
+
+def after_commit(db: Session, fn: Callable[[], Any]):
+    """Run `fn` once the current write has been committed."""
+    db.info.setdefault(_AFTER_COMMIT, []).append(fn)
+
+
+def _take_hooks(db: Session, start: int = 0) -> List[Callable[[], Any]]:
+    hooks = db.info.get(_AFTER_COMMIT, [])
+    taken = hooks[start:]
+    del hooks[start:]
+    return taken
+
+
+def _run_hooks(hooks: List[Callable[[], Any]]):
+    for hook in hooks:
+        try:
+            hook()
+        except Exception as e:
+            logger.error(f"After-commit hook failed: {e}")
+
+
+class WriteQueue:
+    """One thread that applies queued writes in batched transactions."""
+
+    def __init__(self):
+        self._queue: "queue.Queue[Optional[tuple]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        DB_WRITE_QUEUE_DEPTH.set_function(self._queue.qsize)
+
+    def submit(self, fn: Callable[..., Any], *args) -> Future:
+        """Queue fn(session, *args); the future resolves to (result, after-commit hooks)."""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="sqlite-writer", daemon=True)
+                self._thread.start()
+        future: Future = Future()
+        self._queue.put((future, fn, args, time.perf_counter()))
+        return future
+
+    def stop(self):
+        """Commit what is queued, then stop the writer thread."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None and thread.is_alive():
+            self._queue.put(None)
+            thread.join()
+
+    def _next_batch(self) -> Tuple[List[tuple], bool]:
+        """Block for one write, then take what else is queued. Returns (batch, stopping)."""
+        first = self._queue.get()
+        if first is None:
+            return [], True
+        batch = [first]
+        deadline = time.monotonic() + settings.SQLITE_WRITE_BATCH_WAIT_MS / 1000
+        while len(batch) < settings.SQLITE_WRITE_BATCH_SIZE:
+            try:
+                timeout = deadline - time.monotonic()
+                item = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch, stopping = self._next_batch()
+            if batch:
+                self._commit(batch)
+
+    def _commit(self, batch: List[tuple]):
+        DB_WRITE_BATCH_SIZE.observe(len(batch))
+        db = database.SessionLocal()
+        done = []
+        try:
+            for future, fn, args, queued in batch:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                mark = len(db.info.get(_AFTER_COMMIT, []))
+                try:
+                    with db.begin_nested():
+                        result = fn(db, *args)
+                except Exception as e:
+                    _take_hooks(db, mark)
+                    future.set_exception(e)
+                    continue
+                done.append((future, result, _take_hooks(db, mark), queued))
+            db.commit()
+        except Exception as e:
+            logger.error(f"Write batch of {len(batch)} failed: {e}")
+            db.rollback()
+            for future, _, _, _ in done:
+                future.set_exception(e)
+            return
+        finally:
+            db.close()
+
+        now = time.perf_counter()
+        for future, result, hooks, queued in done:
+            DB_WRITE_WAIT.observe(now - queued)
+            future.set_result((result, hooks))
+
+
+write_queue = WriteQueue()
+
+
+def single_writer() -> bool:
+    """True when writes go through the writer thread."""
+    return settings.SQLITE_SINGLE_WRITER and database.engine.dialect.name == "sqlite"
+
+
+def _write_in_session(db: Optional[Session], fn: Callable[..., Any], args) -> Tuple[Any, list]:
+    session = db if db is not None else database.SessionLocal()
+    mark = len(session.info.get(_AFTER_COMMIT, []))
+    try:
+        result = fn(session, *args)
+        session.commit()
+        return result, _take_hooks(session, mark)
+    except Exception:
+        session.rollback()
+        _take_hooks(session, mark)
+        raise
+    finally:
+        if db is None:
+            session.close()
+
+
+async def run_write(fn: Callable[..., Any], *args, db: Optional[Session] = None) -> Any:
+    """
+    Apply fn(session, *args) as a committed write and return its result.
+    `db` is the session to use when writes are not queued (default: a new one).
+    """
+    if single_writer():
+        result, hooks = await asyncio.wrap_future(write_queue.submit(fn, *args))
+    else:
+        result, hooks = _write_in_session(db, fn, args)
+    _run_hooks(hooks)
+    return result
+
+
+def run_write_sync(fn: Callable[..., Any], *args, db: Optional[Session] = None) -> Any:
+    """run_write for synchronous callers (not on the event loop: it blocks until committed)."""
+    if single_writer():
+        result, hooks = write_queue.submit(fn, *args).result()
+    else:
+        result, hooks = _write_in_session(db, fn, args)
+    _run_hooks(hooks)
+    return result
@@ -2,14 +2,15 @@
 Tech Scout AI - FastAPI Application
 Production-ready backend with no external API dependencies.
 """
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 import logging
 
 from app.core.config import settings
 from app.core.database import init_db
-from app.api import entities, technologies
+from app.core.metrics import MetricsMiddleware, render_metrics
+from app.api import entities, technologies, citations, search, exports, admin
 
 # Configure logging
 logging.basicConfig(
@@ -30,6 +31,13 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         logger.warning(f"Database initialization skipped: {e}")
     
+    if settings.BULK_RESUME_PENDING:
+        from app.services.analysis_queue import resume_pending
+        try:
+            resume_pending()
+        except Exception as e:
+            logger.warning(f"Could not queue pending analyses: {e}")
+    
     # Pre-load AI models in background (optional)
     # from app.services.ai_service import get_ai_service
     # get_ai_service()  # This will lazy-load on first use instead
@@ -38,6 +46,12 @@ async def lifespan(app: FastAPI):
     
     # Shutdown
     logger.info("Shutting down Tech Scout AI...")
+    from app.core.write_queue import write_queue
+    from app.services.embedding_pool import shutdown_embedding_pool
+    from app.services.scraper import scraper
+    shutdown_embedding_pool()
+    await scraper.close()
+    write_queue.stop()
 
 
 app = FastAPI(
@@ -56,6 +70,7 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(MetricsMiddleware)
 
 # Include API routers
 app.include_router(
@@ -68,6 +83,26 @@ app.include_router(
     prefix=f"{settings.API_V1_STR}/technologies",
     tags=["technologies"]
 )
+app.include_router(
+    citations.router,
+    prefix=f"{settings.API_V1_STR}/citations",
+    tags=["citations"]
+)
+app.include_router(
+    search.router,
+    prefix=f"{settings.API_V1_STR}/search",
+    tags=["search"]
+)
+app.include_router(
+    exports.router,
+    prefix=f"{settings.API_V1_STR}/exports",
+    tags=["exports"]
+)
+app.include_router(
+    admin.router,
+    prefix=f"{settings.API_V1_STR}/admin",
+    tags=["admin"]
+)
 
 
 @app.get("/")
@@ -85,6 +120,9 @@ async def root():
             "Personnel identification",
             "Technology mapping",
             "Gap analysis",
+            "Citation network",
+            "Document search",
+            "Bulk export",
         ]
     }
 
@@ -99,6 +137,13 @@ async def health_check():
     }
 
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus metrics."""
+    content, media_type = render_metrics()
+    return Response(content=content, media_type=media_type)
+
+
 @app.get(f"{settings.API_V1_STR}/status")
 async def api_status():
     """API status with configuration info."""
@@ -5,7 +5,7 @@ Works with both SQLite (dev) and PostgreSQL with pgvector (prod).
 import uuid
 from datetime import datetime
 from typing import List, Optional
-from sqlalchemy import Column, String, Text, DateTime, Integer, Float, ForeignKey, JSON
+from sqlalchemy import Boolean, Column, String, Text, DateTime, Integer, Float, ForeignKey, JSON, Index, UniqueConstraint
 from sqlalchemy.dialects.postgresql import UUID as PG_UUID
 from sqlalchemy.orm import relationship
 import enum
@@ -46,27 +46,39 @@ class Entity(Base):
     
     # Analysis progress (0-100)
     analysis_progress = Column(Integer, default=0)
+    # An analysis was requested and no run has claimed it yet (resumed on startup)
+    analysis_queued = Column(Boolean, default=False)
     
     # Counts (denormalized for performance)
     patent_count = Column(Integer, default=0)
     paper_count = Column(Integer, default=0)
     personnel_count = Column(Integer, default=0)
     
+    # Latest analysis report (per-source status, timings, recommendations)
+    analysis_report = Column(JSON)
+    
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
-    # Relationships
-    patents = relationship("Patent", back_populates="entity", cascade="all, delete-orphan")
-    papers = relationship("Paper", back_populates="entity", cascade="all, delete-orphan")
+    # Relationships (documents are shared between entities through the link tables)
+    patents = relationship("Patent", secondary="entity_patents", viewonly=True)
+    papers = relationship("Paper", secondary="entity_papers", viewonly=True)
+    patent_links = relationship("EntityPatent", cascade="all, delete-orphan")
+    paper_links = relationship("EntityPaper", cascade="all, delete-orphan")
     personnel = relationship("Personnel", back_populates="entity", cascade="all, delete-orphan")
+    domain_scores = relationship("EntityDomainScore", back_populates="entity", cascade="all, delete-orphan")
+    monthly_rollups = relationship("EntityMonthlyRollup", back_populates="entity", cascade="all, delete-orphan")
+    centroid = relationship("EntityCentroid", back_populates="entity", uselist=False, cascade="all, delete-orphan")
 
 
 class Patent(Base):
-    """Patent document."""
+    """Patent document, stored once and linked to entities through entity_patents."""
     __tablename__ = "patents"
+    __table_args__ = (
+        Index("ix_patents_filing_date", "filing_date", "id"),
+    )
 
     id = Column(String(36), primary_key=True, default=generate_uuid)
-    entity_id = Column(String(36), ForeignKey("entities.id"), nullable=False)
     
     patent_number = Column(String(100), unique=True, index=True)
     title = Column(Text, nullable=False)
@@ -87,17 +99,17 @@ class Patent(Base):
     scraped_at = Column(DateTime, default=datetime.utcnow)
     
     created_at = Column(DateTime, default=datetime.utcnow)
-    
-    # Relationships
-    entity = relationship("Entity", back_populates="patents")
 
 
 class Paper(Base):
-    """Research paper/publication."""
+    """Research paper/publication, stored once and linked to entities through entity_papers."""
     __tablename__ = "papers"
+    __table_args__ = (
+        Index("ix_papers_publication_date", "publication_date", "id"),
+        Index("ix_papers_citation_count", "citation_count", "id"),
+    )
 
     id = Column(String(36), primary_key=True, default=generate_uuid)
-    entity_id = Column(String(36), ForeignKey("entities.id"), nullable=False)
     
     title = Column(Text, nullable=False)
     abstract = Column(Text)
@@ -117,14 +129,38 @@ class Paper(Base):
     scraped_at = Column(DateTime, default=datetime.utcnow)
     
     created_at = Column(DateTime, default=datetime.utcnow)
-    
-    # Relationships
-    entity = relationship("Entity", back_populates="papers")
+
+
+class EntityPatent(Base):
+    """An entity's link to a patent in the shared document store."""
+    __tablename__ = "entity_patents"
+    __table_args__ = (
+        Index("ix_entity_patents_patent_id", "patent_id"),
+    )
+
+    entity_id = Column(String(36), ForeignKey("entities.id", ondelete="CASCADE"), primary_key=True)
+    patent_id = Column(String(36), ForeignKey("patents.id", ondelete="CASCADE"), primary_key=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class EntityPaper(Base):
+    """An entity's link to a paper in the shared document store."""
+    __tablename__ = "entity_papers"
+    __table_args__ = (
+        Index("ix_entity_papers_paper_id", "paper_id"),
+    )
+
+    entity_id = Column(String(36), ForeignKey("entities.id", ondelete="CASCADE"), primary_key=True)
+    paper_id = Column(String(36), ForeignKey("papers.id", ondelete="CASCADE"), primary_key=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
 
 
 class Personnel(Base):
     """Key researcher/scientist."""
     __tablename__ = "personnel"
+    __table_args__ = (
+        Index("ix_personnel_entity_publication_count", "entity_id", "publication_count", "id"),
+    )
 
     id = Column(String(36), primary_key=True, default=generate_uuid)
     entity_id = Column(String(36), ForeignKey("entities.id"), nullable=False)
@@ -163,16 +199,20 @@ class Technology(Base):
 
 
 class Citation(Base):
-    """Citation relationship between documents."""
+    """
+    Citation relationship between documents (source cites target).
+    IDs are internal document IDs, or external keys ("doi:...", "s2:...")
+    for documents that have not been ingested.
+    """
     __tablename__ = "citations"
 
     id = Column(String(36), primary_key=True, default=generate_uuid)
     
-    source_id = Column(String(36), nullable=False)
-    source_type = Column(String(20))  # patent or paper
+    source_id = Column(String(255), nullable=False, index=True)
+    source_type = Column(String(20))  # patent, paper or external
     
-    target_id = Column(String(36), nullable=False)
-    target_type = Column(String(20))  # patent or paper
+    target_id = Column(String(255), nullable=False, index=True)
+    target_type = Column(String(20))  # patent, paper or external
     
     created_at = Column(DateTime, default=datetime.utcnow)
 
@@ -186,3 +226,81 @@ class DRDOCapability(Base):
     capability_score = Column(Float, default=0.0)  # 0-100
     description = Column(Text)
     last_assessed = Column(DateTime, default=datetime.utcnow)
+
+
+class EntityDomainScore(Base):
+    """
+    Per-entity, per-technology-domain activity, maintained incrementally at
+    ingest so gap analysis never rescans documents.
+    """
+    __tablename__ = "entity_domain_scores"
+    __table_args__ = (
+        UniqueConstraint("entity_id", "domain", name="uq_entity_domain_scores_entity_domain"),
+        Index("ix_entity_domain_scores_domain_recency", "domain", "recency_mass"),
+    )
+
+    id = Column(String(36), primary_key=True, default=generate_uuid)
+    entity_id = Column(String(36), ForeignKey("entities.id"), nullable=False, index=True)
+    domain = Column(String(255), nullable=False)
+    
+    patent_count = Column(Integer, default=0)
+    paper_count = Column(Integer, default=0)
+    
+    # Sum of per-document citation weights (1 + ln(1 + citations))
+    citation_weight = Column(Float, default=0.0)
+    # Citation weights scaled by 2^((date - epoch) / half-life); decayed to "now" at read time
+    recency_mass = Column(Float, default=0.0)
+    
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    # Relationships
+    entity = relationship("Entity", back_populates="domain_scores")
+
+
+class EntityMonthlyRollup(Base):
+    """
+    Document counts per entity, technology and calendar month, maintained at
+    ingest so timelines are served without scanning patents or papers.
+    Technology "*" holds per-document totals (documents count once there,
+    however many technologies they are tagged with).
+    """
+    __tablename__ = "entity_monthly_rollups"
+    __table_args__ = (
+        UniqueConstraint("entity_id", "technology", "month", name="uq_entity_monthly_rollups_key"),
+        Index("ix_entity_monthly_rollups_technology_month", "technology", "month"),
+    )
+
+    id = Column(String(36), primary_key=True, default=generate_uuid)
+    entity_id = Column(String(36), ForeignKey("entities.id"), nullable=False, index=True)
+    technology = Column(String(255), nullable=False)
+    # Months since year 0 (year * 12 + month - 1)
+    month = Column(Integer, nullable=False)
+    
+    patent_count = Column(Integer, default=0)
+    paper_count = Column(Integer, default=0)
+    citation_count = Column(Integer, default=0)
+    
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    # Relationships
+    entity = relationship("Entity", back_populates="monthly_rollups")
+
+
+class EntityCentroid(Base):
+    """
+    Mean of an entity's unit-normalised document embeddings, updated as a
+    running mean when documents are linked, for related-entity search.
+    """
+    __tablename__ = "entity_centroids"
+
+    entity_id = Column(String(36), ForeignKey("entities.id", ondelete="CASCADE"), primary_key=True)
+    embedding = Column(JSON, nullable=False)
+    document_count = Column(Integer, nullable=False, default=0)  # documents with embeddings in the mean
+    
+    # Cluster from the last clustering run (see app.services.entity_similarity)
+    cluster = Column(Integer, index=True)
+    
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    # Relationships
+    entity = relationship("Entity", back_populates="centroid")
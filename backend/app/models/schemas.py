@@ -1,5 +1,5 @@
-from datetime import datetime
-from typing import List, Optional
+from datetime import date, datetime
+from typing import Dict, List, Optional
 from pydantic import BaseModel, Field
 from enum import Enum
 import uuid
@@ -87,6 +87,12 @@ class PatentResponse(BaseModel):
         from_attributes = True
 
 
+class PatentPage(BaseModel):
+    """One page of an entity's patents."""
+    items: List[PatentResponse]
+    next_cursor: Optional[str] = None
+
+
 # ============== Paper Schemas ==============
 
 class PaperResponse(BaseModel):
@@ -105,6 +111,12 @@ class PaperResponse(BaseModel):
         from_attributes = True
 
 
+class PaperPage(BaseModel):
+    """One page of an entity's papers."""
+    items: List[PaperResponse]
+    next_cursor: Optional[str] = None
+
+
 # ============== Personnel Schemas ==============
 
 class PersonnelResponse(BaseModel):
@@ -121,6 +133,47 @@ class PersonnelResponse(BaseModel):
         from_attributes = True
 
 
+class PersonnelPage(BaseModel):
+    """One page of an entity's personnel."""
+    items: List[PersonnelResponse]
+    next_cursor: Optional[str] = None
+
+
+class PersonnelCluster(BaseModel):
+    """A group of researchers who publish together."""
+    cluster_id: int
+    size: int
+    top_expertise: List[str]
+    cohesion: Optional[float] = None  # Mean cosine similarity of members' expertise to the cluster centroid
+    members: List[PersonnelResponse]
+
+
+class PersonnelClusterResponse(BaseModel):
+    """Co-authorship clusters for an entity's personnel."""
+    entity_id: str
+    total_personnel: int
+    clusters: List[PersonnelCluster]
+
+
+class SimilarEntity(BaseModel):
+    """An entity whose documents resemble another entity's."""
+    id: str
+    name: str
+    type: str
+    similarity: float  # Cosine similarity of the two entities' document centroids
+    near_duplicate: bool
+    cluster: Optional[int] = None
+    document_count: int
+
+
+class SimilarEntitiesResponse(BaseModel):
+    """Entities closest to an entity by document centroid (none until it has embedded documents)."""
+    entity_id: str
+    cluster: Optional[int] = None
+    document_count: int = 0
+    results: List[SimilarEntity]
+
+
 # ============== Analysis Schemas ==============
 
 class AnalysisRequest(BaseModel):
@@ -136,6 +189,34 @@ class AnalysisResponse(BaseModel):
     message: str
 
 
+class BatchAnalysisRequest(BaseModel):
+    """Entities to analyse as one batch."""
+    entity_ids: List[str] = Field(..., min_length=1)
+
+
+class BatchEntityStatus(BaseModel):
+    """One entity of a batch: queued, running, or its outcome (complete, error, not_found, already_running)."""
+    entity_id: str
+    state: str
+    progress: int
+
+
+class BatchAnalysisResponse(BaseModel):
+    """Progress of a batch analysis."""
+    batch_id: str
+    status: str  # running or complete
+    total: int
+    counts: Dict[str, int]  # entities per state
+    progress: int
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+    elapsed_seconds: float
+    entities_per_hour: float
+    embedded_documents: int
+    embedding_batches: int
+    entities: List[BatchEntityStatus]
+
+
 # ============== Gap Analysis Schemas ==============
 
 class GapAnalysisItem(BaseModel):
@@ -144,6 +225,8 @@ class GapAnalysisItem(BaseModel):
     entity_score: float
     drdo_score: float
     gap: float  # entity_score - drdo_score (positive = entity leads)
+    patent_count: int = 0
+    paper_count: int = 0
 
 
 class GapAnalysisResponse(BaseModel):
@@ -155,6 +238,81 @@ class GapAnalysisResponse(BaseModel):
     collaboration_opportunities: int  # Number of domains with similar scores
 
 
+class GapRankingItem(BaseModel):
+    """One entity's standing in a technology domain."""
+    entity_id: str
+    entity_name: str
+    entity_score: float
+    drdo_score: float
+    gap: float
+    patent_count: int = 0
+    paper_count: int = 0
+
+
+class GapRankingResponse(BaseModel):
+    """Entities ranked by their lead over DRDO in a domain."""
+    domain: str
+    drdo_score: float
+    items: List[GapRankingItem]
+
+
+# ============== Technology Schemas ==============
+
+class TechnologyResponse(BaseModel):
+    """Schema for technology domain response."""
+    id: str
+    name: str
+    category: Optional[str] = None
+    description: Optional[str] = None
+    drdo_capability_score: float = 0.0
+
+
+# ============== Timeline Schemas ==============
+
+class TimelinePoint(BaseModel):
+    """Document counts for one time bucket."""
+    period_start: date
+    period_end: date  # Exclusive
+    patent_count: int = 0
+    paper_count: int = 0
+    citation_count: int = 0
+
+
+class TimelineResponse(BaseModel):
+    """Time series of an entity's documents."""
+    entity_id: str
+    technology: Optional[str] = None  # None = all documents
+    bucket_months: int
+    series: List[TimelinePoint]
+
+
+class TechnologyTrendResponse(BaseModel):
+    """Time series per technology across all entities."""
+    bucket_months: int
+    trends: Dict[str, List[TimelinePoint]]
+
+
+# ============== Search Schemas ==============
+
+class SearchResult(BaseModel):
+    """A matching patent or paper; title and snippet may contain <mark> highlights."""
+    id: str
+    kind: str  # patent or paper
+    entity_ids: List[str] = []  # entities linked to the document
+    title: str
+    snippet: Optional[str] = None
+    date: Optional[datetime] = None
+    technologies: List[str] = []
+    score: float
+
+
+class SearchResponse(BaseModel):
+    """Ranked search results."""
+    query: str
+    mode: str
+    results: List[SearchResult]
+
+
 # ============== Dashboard Stats ==============
 
 class DashboardStats(BaseModel):
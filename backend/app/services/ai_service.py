@@ -5,10 +5,17 @@ Runs locally without any API keys required.
 import torch
 from transformers import AutoModelForCausalLM, AutoTokenizer, pipeline
 from fastembed import TextEmbedding
-from typing import List, Optional
+from typing import Dict, List, Optional
 import asyncio
 from functools import lru_cache
 import logging
+import time
+
+from app.core.metrics import (
+    EMBEDDED_TEXTS, EMBEDDING_DURATION, LLM_GENERATED_TOKENS, LLM_GENERATION_DURATION, SINGLE_FLIGHT_SHARED,
+)
+from app.core.config import settings
+from app.services.embedding_pool import create_text_embedding, get_embedding_pool
 
 logger = logging.getLogger(__name__)
 
@@ -42,14 +49,19 @@ class AIService:
         self._llm_pipeline = None
         self._tokenizer = None
         
+        # Text -> embedding in progress, shared by concurrent jobs
+        self._embedding_in_flight: Dict[str, asyncio.Future] = {}
+        
         AIService._initialized = True
     
     @property
     def embedding_model(self) -> TextEmbedding:
         """Lazy load embedding model."""
         if self._embedding_model is None:
-            logger.info(f"Loading embedding model: {EMBEDDING_MODEL}")
-            self._embedding_model = TextEmbedding(model_name=EMBEDDING_MODEL)
+            logger.info(f"Loading embedding model: {settings.EMBEDDING_MODEL} ({settings.EMBEDDING_BACKEND})")
+            self._embedding_model = create_text_embedding(
+                settings.EMBEDDING_BACKEND, settings.EMBEDDING_MODEL, settings.EMBEDDING_DIM,
+            )
         return self._embedding_model
     
     @property
@@ -92,12 +104,73 @@ class AIService:
     def generate_embeddings_batch(self, texts: List[str]) -> List[List[float]]:
         """Generate embeddings for multiple texts."""
         try:
-            embeddings = list(self.embedding_model.embed(texts))
-            return [emb.tolist() for emb in embeddings]
+            pool = get_embedding_pool()
+            backend = "pool" if pool is not None else "local"
+            start = time.perf_counter()
+            if pool is not None:
+                embeddings = pool.embed_sync(texts).tolist()
+            else:
+                embeddings = [emb.tolist() for emb in self.embedding_model.embed(texts)]
+            EMBEDDING_DURATION.labels(backend=backend).observe(time.perf_counter() - start)
+            EMBEDDED_TEXTS.labels(backend=backend).inc(len(texts))
+            return embeddings
         except Exception as e:
             logger.error(f"Error generating batch embeddings: {e}")
             return [[] for _ in texts]
     
+    async def aembed_batch(self, texts: List[str]) -> List[List[float]]:
+        """
+        Generate embeddings without blocking the event loop.
+        Uses the worker pool when enabled, otherwise a thread.
+        
+        Each distinct text is embedded once: repeats within the batch, and
+        texts another job is already embedding, share that embedding.
+        """
+        if not texts:
+            return []
+        loop = asyncio.get_running_loop()
+        shared = {}
+        mine = {}
+        for text in dict.fromkeys(texts):
+            future = self._embedding_in_flight.get(text)
+            if future is not None:
+                shared[text] = future
+            else:
+                mine[text] = self._embedding_in_flight[text] = loop.create_future()
+        if shared:
+            SINGLE_FLIGHT_SHARED.labels(kind="embedding").inc(len(shared))
+        
+        try:
+            if mine:
+                for future, embedding in zip(mine.values(), await self._aembed(list(mine))):
+                    future.set_result(embedding)
+        finally:
+            # On failure or cancellation, jobs waiting on these get empty
+            # embeddings, as when embedding fails
+            for text, future in mine.items():
+                if not future.done():
+                    future.set_result([])
+                del self._embedding_in_flight[text]
+        
+        embeddings = {text: future.result() for text, future in mine.items()}
+        for text, future in shared.items():
+            embeddings[text] = await asyncio.shield(future)
+        return [embeddings[text] for text in texts]
+    
+    async def _aembed(self, texts: List[str]) -> List[List[float]]:
+        pool = get_embedding_pool()
+        if pool is None:
+            return await asyncio.to_thread(self.generate_embeddings_batch, texts)
+        try:
+            start = time.perf_counter()
+            embeddings = await pool.embed(texts)
+            EMBEDDING_DURATION.labels(backend="pool").observe(time.perf_counter() - start)
+            EMBEDDED_TEXTS.labels(backend="pool").inc(len(texts))
+            return embeddings.tolist()
+        except Exception as e:
+            logger.error(f"Error generating pooled embeddings: {e}")
+            return [[] for _ in texts]
+    
     def generate_text(self, prompt: str, max_tokens: int = 512) -> str:
         """Generate text using the LLM."""
         if self.llm_pipeline is None:
@@ -105,12 +178,16 @@ class AIService:
             return ""
         
         try:
+            start = time.perf_counter()
             result = self.llm_pipeline(
                 prompt,
                 max_new_tokens=max_tokens,
                 return_full_text=False,
             )
-            return result[0]["generated_text"].strip()
+            text = result[0]["generated_text"]
+            LLM_GENERATION_DURATION.observe(time.perf_counter() - start)
+            LLM_GENERATED_TOKENS.inc(len(self._tokenizer.encode(text, add_special_tokens=False)))
+            return text.strip()
         except Exception as e:
             logger.error(f"Error generating text: {e}")
             return ""
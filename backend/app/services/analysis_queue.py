@@ -0,0 +1,85 @@
+"""
+Analysis queue.
+Runs queued entity analyses on a fixed number of worker tasks, so bulk
+imports do not start hundreds of pipelines (and scrapes) at once.
+
+The queue itself is in memory; entities whose requested analysis no run
+had claimed before a restart are queued again on startup (resume_pending).
+"""
+import asyncio
+import logging
+from typing import Iterable, List, Optional
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.models import Entity
+from app.services.analysis_service import claimable_for_analysis, trigger_entity_analysis
+
+logger = logging.getLogger(__name__)
+
+
+class AnalysisQueue:
+    """FIFO of entity IDs analysed by at most `concurrency` pipelines at a time."""
+
+    def __init__(self, concurrency: int):
+        self.concurrency = max(1, concurrency)
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def pending(self) -> int:
+        """Analyses waiting for a worker."""
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def _ensure_workers(self):
+        """Start workers on the running loop (again if the loop has changed)."""
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self._workers:
+            return
+        self._loop = loop
+        self._queue = asyncio.Queue()
+        self._workers = [loop.create_task(self._work()) for _ in range(self.concurrency)]
+
+    def enqueue(self, entity_ids: Iterable[str]):
+        """Queue analyses; must be called from the event loop."""
+        self._ensure_workers()
+        for entity_id in entity_ids:
+            self._queue.put_nowait(entity_id)
+
+    async def _work(self):
+        queue = self._queue
+        while True:
+            entity_id = await queue.get()
+            try:
+                await trigger_entity_analysis(entity_id)
+            except Exception as e:
+                logger.error(f"Queued analysis failed for entity {entity_id}: {e}")
+            finally:
+                queue.task_done()
+
+
+# Global queue (workers start on first use)
+analysis_queue = AnalysisQueue(settings.BULK_ANALYSIS_CONCURRENCY)
+
+
+def resume_pending() -> int:
+    """
+    Queue analyses that were requested (Entity.analysis_queued) but not
+    claimed by a run, such as imports whose queued analyses were lost with a
+    restart. Entities imported with analyze=false are never queued. Call
+    from the event loop at startup; returns the number queued.
+    """
+    db = SessionLocal()
+    try:
+        entity_ids = [
+            entity_id for (entity_id,) in db.query(Entity.id).filter(
+                Entity.analysis_queued.is_(True), claimable_for_analysis(),
+            ).order_by(Entity.created_at)
+        ]
+    finally:
+        db.close()
+    if entity_ids:
+        analysis_queue.enqueue(entity_ids)
+        logger.info(f"Queued {len(entity_ids)} requested analyses")
+    return len(entity_ids)
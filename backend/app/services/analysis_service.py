@@ -3,220 +3,555 @@ Analysis service that orchestrates the complete entity analysis pipeline.
 Uses HuggingFace models locally - no API keys required.
 """
 import asyncio
+import functools
 import logging
-from typing import Optional
+import time
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
 import uuid
-from datetime import datetime
+from datetime import datetime, timedelta
 
+from sqlalchemy import or_, update
+from sqlalchemy.exc import IntegrityError
+
+from app.core.config import settings
 from app.core.database import SessionLocal
+from app.core.write_queue import after_commit, run_write
+from app.core.metrics import ANALYSIS_DURATION, SCRAPED_DOCUMENTS, stage_timer
 from app.models.models import Entity, Patent, Paper, Personnel, EntityStatus
-from app.services.scraper import scrape_entity_data
 from app.services.ai_service import get_ai_service
+from app.services.profiling import run_profiled, should_profile
+from app.services import citation_graph, entity_similarity, gap_analysis, heatmap, personnel_network, search, timeline
+from app.services.documents import DOCUMENT_KINDS, count_documents, link_documents, stored_document_ids
+from app.services.scraper import SCRAPE_SOURCES, document_key, scrape_deadline
+from app.core.graph import (
+    analysis_thread_id,
+    create_analysis_graph,
+    get_analysis_graph,
+    open_checkpointer,
+)
 
 logger = logging.getLogger(__name__)
 
 
-async def update_entity_progress(entity_id: str, progress: int, status: Optional[EntityStatus] = None):
-    """Update entity analysis progress in database."""
-    db = SessionLocal()
-    try:
-        entity = db.query(Entity).filter(Entity.id == uuid.UUID(entity_id)).first()
-        if entity:
-            entity.analysis_progress = progress
-            if status:
-                entity.status = status
-            entity.updated_at = datetime.utcnow()
-            db.commit()
-            logger.info(f"Entity {entity_id} progress: {progress}%")
-    except Exception as e:
-        logger.error(f"Error updating progress: {e}")
-    finally:
-        db.close()
-
-
-async def trigger_entity_analysis(entity_id: str):
+class AnalysisJob:
     """
-    Main analysis pipeline for an entity.
+    Database access for one analysis run, shared by the graph nodes
+    through config["configurable"]["job"].
     
-    Pipeline steps:
-    1. Scrape data from multiple sources (0-50%)
-    2. Process and deduplicate patents (50-65%)
-    3. Process and deduplicate papers (65-80%)
-    4. Extract and save personnel (80-90%)
-    5. Generate embeddings and finalize (90-100%)
+    Reads use the job's session through `read()`, which ends the
+    transaction before the node awaits anything, so a run never holds a
+    connection while other jobs wait for one. Writes go through `write()`
+    (see app.core.write_queue). Progress updates are held until the job's
+    next write, so they are committed with the stage's results.
     """
-    logger.info(f"Starting analysis pipeline for entity: {entity_id}")
     
-    db = SessionLocal()
-    ai_service = get_ai_service()
+    def __init__(self, entity_id: str):
+        self.entity_id = entity_id
+        self.db = SessionLocal()
+        self._pending: Dict[str, Any] = {}
+        # Set once this run holds the entity's analysis claim
+        self.claimed = False
+        # Keys of documents already ingested by this run's scouts
+        self._seen_documents: Set[str] = set()
+        # Last progress set, and the share of each source's documents stored
+        self.progress = 0
+        self._source_progress: Dict[str, float] = {}
     
-    try:
-        # Get entity
-        entity = db.query(Entity).filter(Entity.id == uuid.UUID(entity_id)).first()
-        if not entity:
-            logger.error(f"Entity not found: {entity_id}")
-            return
-        
-        entity_name = entity.name
+    def first_seen(self, document: Dict[str, Any]) -> bool:
+        """True the first time this run sees a document (by patent number or title)."""
+        key = document_key(document)
+        if not key or key in self._seen_documents:
+            return False
+        self._seen_documents.add(key)
+        return True
+    
+    @contextmanager
+    def read(self):
+        """Use the session for reads; the transaction ends on exit."""
+        try:
+            yield self.db
+        finally:
+            self.db.rollback()
+    
+    async def write(self, fn: Optional[Callable[..., Any]] = None, *args) -> Any:
+        """
+        Apply fn(session, *args) together with pending progress. If the write
+        fails, the pending progress is dropped with the work it described.
         
-        # Update status to analyzing
-        entity.status = EntityStatus.ANALYZING
-        entity.analysis_progress = 0
-        db.commit()
+        Once the run holds the claim, every write also refreshes the entity's
+        updated_at, which keeps the claim from looking stale (see
+        claimable_for_analysis) while the run is busy between progress updates.
+        """
+        pending, self._pending = self._pending, {}
+        entity_id = self.entity_id
+        heartbeat = self.claimed
         
-        # ===== Step 1: Scrape data (0-50%) =====
-        await update_entity_progress(entity_id, 5, EntityStatus.ANALYZING)
-        logger.info(f"Starting scrape for: {entity_name}")
+        def apply(db):
+            result = fn(db, *args) if fn is not None else None
+            if pending or heartbeat:
+                db.execute(update(Entity).where(Entity.id == entity_id).values(updated_at=datetime.utcnow(), **pending))
+            return result
         
+        return await run_write(apply, db=self.db)
+    
+    def set_progress(self, progress: Optional[int] = None, status: Optional[EntityStatus] = None):
+        """Record progress and/or status, written with the next write."""
+        if progress is not None:
+            self.progress = progress
+            self._pending["analysis_progress"] = progress
+            logger.info(f"Entity {self.entity_id} progress: {progress}%")
+        if status is not None:
+            self._pending["status"] = status
+    
+    def release(self):
+        """Give up the claim with the next write: the entity is PENDING and queued for analysis again."""
+        self._pending["status"] = EntityStatus.PENDING
+        self._pending["analysis_queued"] = True
+    
+    def set_source_progress(self, source: str, fraction: float):
+        """
+        Record that `fraction` of a source's documents are stored. Progress
+        rises from 5% to 85% as the sources' documents are stored (never
+        below progress already reached, e.g. by the run being resumed).
+        """
+        self._source_progress[source] = fraction
+        progress = 5 + int(80 * sum(self._source_progress.values()) / len(SCRAPE_SOURCES))
+        if progress > self.progress:
+            self.set_progress(progress)
+    
+    async def flush(self):
+        """Write pending progress now."""
+        if not self._pending:
+            return
         try:
-            scraped_data = await scrape_entity_data(entity_name, entity.website)
+            await self.write()
         except Exception as e:
-            logger.error(f"Scraping failed: {e}")
-            scraped_data = {"patents": [], "papers": [], "personnel": [], "technologies": []}
-        
-        await update_entity_progress(entity_id, 50)
-        
-        # ===== Step 2: Process patents (50-65%) =====
-        patent_count = 0
-        for patent_data in scraped_data.get("patents", []):
+            logger.error(f"Error updating progress: {e}")
+    
+    async def close(self):
+        await self.flush()
+        self.db.close()
+
+
+def claimable_for_analysis():
+    """Filter: entities with no analysis running (or one that stopped reporting progress)."""
+    stale = datetime.utcnow() - timedelta(seconds=settings.ANALYSIS_CLAIM_TIMEOUT_SECONDS)
+    return or_(
+        Entity.status != EntityStatus.ANALYZING,
+        Entity.updated_at.is_(None),
+        Entity.updated_at < stale,
+    )
+
+
+def claim_analysis(db, entity_id: str) -> bool:
+    """Mark an entity as analysing unless another run is; True if this run may go ahead."""
+    result = db.execute(
+        update(Entity)
+        .where(Entity.id == entity_id, claimable_for_analysis())
+        .values(status=EntityStatus.ANALYZING, analysis_queued=False, updated_at=datetime.utcnow())
+    )
+    return result.rowcount == 1
+
+
+async def embed_documents(ai_service, documents: List[Dict[str, Any]]) -> List[Optional[List[float]]]:
+    """Embed title + abstract of each document in a single batch."""
+    texts = [f"{d.get('title', '')} {d.get('abstract', '') or ''}".strip() for d in documents]
+    to_embed = [t for t in texts if t]
+    vectors = iter(await ai_service.aembed_batch(to_embed))
+    return [(next(vectors) or None) if t else None for t in texts]
+
+
+def filter_new_documents(db, kind: str, documents: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Drop documents already stored (patents by number, papers by DOI), whichever entity they belong to."""
+    key_field = DOCUMENT_KINDS[kind].key_field
+    stored = stored_document_ids(db, kind, documents)
+    return [d for d in documents if not d.get(key_field) or d.get(key_field) not in stored]
+
+
+def record_ingested_documents(db, entity_id: str, kind: str, doc_ids: List[str], documents: List[Dict[str, Any]]):
+    """Update derived tables for documents newly linked to the entity, in the caller's transaction."""
+    if not documents:
+        return
+    gap_analysis.record_documents(db, entity_id, kind, documents)
+    timeline.record_documents(db, entity_id, kind, documents)
+    centroid = entity_similarity.record_documents(db, entity_id, kind, doc_ids, documents)
+    if centroid is not None:
+        after_commit(db, lambda: entity_similarity.index_centroid(entity_id, centroid))
+
+
+def _store_and_link(
+    db, entity_id: str, kind: str, documents: List[Dict[str, Any]], build: Callable[[Dict[str, Any]], Any],
+) -> Tuple[List[str], List[Dict[str, Any]], List[Tuple[str, Dict[str, Any]]]]:
+    """
+    Store the documents not stored yet (by any entity) and link the entity
+    to all of them. Returns the IDs newly linked to the entity, their
+    documents, and (ID, document) for each document newly stored.
+    """
+    key_field = DOCUMENT_KINDS[kind].key_field
+    stored = stored_document_ids(db, kind, documents)
+    candidates: Dict[str, Dict[str, Any]] = {}
+    created = []
+    added = []
+    for data in documents:
+        key = data.get(key_field)
+        doc_id = stored.get(key) if key else None
+        if doc_id is None:
+            document = build(data)
             try:
-                # Check if patent already exists
-                patent_number = patent_data.get("patent_number", "")
-                if patent_number:
-                    existing = db.query(Patent).filter(
-                        Patent.patent_number == patent_number
-                    ).first()
-                    if existing:
-                        continue
-                
-                # Generate embedding for patent
-                text = f"{patent_data.get('title', '')} {patent_data.get('abstract', '')}"
-                embedding = ai_service.generate_embedding(text) if text.strip() else None
-                
-                patent = Patent(
-                    entity_id=entity.id,
-                    patent_number=patent_number or f"GEN-{uuid.uuid4().hex[:8]}",
-                    title=patent_data.get("title", "Unknown"),
-                    abstract=patent_data.get("abstract"),
-                    filing_date=patent_data.get("filing_date"),
-                    status=patent_data.get("status", "unknown"),
-                    inventors=patent_data.get("inventors", []),
-                    technologies=scraped_data.get("technologies", [])[:5],
-                    embedding=embedding if embedding else None,
-                    source_url=patent_data.get("source_url"),
-                )
-                db.add(patent)
-                patent_count += 1
-                
+                with db.begin_nested():
+                    db.add(document)
+            except IntegrityError:
+                # Stored by a concurrent analysis since the lookup
+                doc_id = stored_document_ids(db, kind, [data]).get(key)
+                if doc_id is None:
+                    continue
             except Exception as e:
-                logger.error(f"Error saving patent: {e}")
+                logger.error(f"Error saving {kind}: {e}")
                 continue
-        
-        db.commit()
-        await update_entity_progress(entity_id, 65)
-        logger.info(f"Saved {patent_count} patents")
-        
-        # ===== Step 3: Process papers (65-80%) =====
-        paper_count = 0
-        for paper_data in scraped_data.get("papers", []):
-            try:
-                # Check if paper already exists by DOI or title
-                doi = paper_data.get("doi")
-                title = paper_data.get("title", "")
-                
-                if doi:
-                    existing = db.query(Paper).filter(Paper.doi == doi).first()
-                    if existing:
-                        continue
-                
-                # Generate embedding for paper
-                text = f"{title} {paper_data.get('abstract', '')}"
-                embedding = ai_service.generate_embedding(text) if text.strip() else None
-                
-                paper = Paper(
-                    entity_id=entity.id,
-                    title=title or "Unknown Paper",
-                    abstract=paper_data.get("abstract"),
-                    authors=paper_data.get("authors", []),
-                    publication_date=paper_data.get("publication_date"),
-                    venue=paper_data.get("venue"),
-                    doi=doi,
-                    technologies=scraped_data.get("technologies", [])[:5],
-                    citation_count=paper_data.get("citation_count", 0),
-                    embedding=embedding if embedding else None,
-                    source_url=paper_data.get("source_url"),
+            else:
+                doc_id = document.id
+                created.append((doc_id, data))
+                added.append(document)
+            if key:
+                stored[key] = doc_id
+        candidates.setdefault(doc_id, data)
+    
+    # Flushed by their savepoints; the session need not keep them until commit
+    for document in added:
+        db.expunge(document)
+    linked_ids = link_documents(db, entity_id, kind, list(candidates))
+    return linked_ids, [candidates[doc_id] for doc_id in linked_ids], created
+
+
+def persist_patents(db, entity_id: str, patents: List[Dict[str, Any]]) -> List[str]:
+    """Store new patents and link the entity to its patents, in the caller's write. Returns the IDs newly linked."""
+    linked_ids, linked_documents, created = _store_and_link(db, entity_id, "patents", patents, lambda data: Patent(
+        patent_number=data.get("patent_number") or f"GEN-{uuid.uuid4().hex[:8]}",
+        title=data.get("title", "Unknown"),
+        abstract=data.get("abstract"),
+        filing_date=data.get("filing_date"),
+        status=data.get("status", "unknown"),
+        inventors=data.get("inventors", []),
+        technologies=data.get("technologies", []),
+        embedding=data.get("embedding") or None,
+        source_url=data.get("source_url"),
+    ))
+    created_ids = [doc_id for doc_id, _ in created]
+    created_documents = [data for _, data in created]
+    
+    record_ingested_documents(db, entity_id, "patents", linked_ids, linked_documents)
+    after_commit(db, lambda: heatmap.invalidate(entity_id))
+    after_commit(db, lambda: search.index_embeddings("patent", created_ids, created_documents))
+    logger.info(f"Linked {len(linked_ids)} patents ({len(created)} newly stored)")
+    return linked_ids
+
+
+def persist_papers(db, entity_id: str, papers: List[Dict[str, Any]]) -> List[str]:
+    """Store new papers and link the entity to its papers, in the caller's write. Returns the IDs newly linked."""
+    linked_ids, linked_documents, created = _store_and_link(db, entity_id, "papers", papers, lambda data: Paper(
+        title=data.get("title") or "Unknown Paper",
+        abstract=data.get("abstract"),
+        authors=data.get("authors", []),
+        publication_date=data.get("publication_date"),
+        venue=data.get("venue"),
+        doi=data.get("doi"),
+        technologies=data.get("technologies", []),
+        citation_count=data.get("citation_count", 0),
+        embedding=data.get("embedding") or None,
+        source_url=data.get("source_url"),
+    ))
+    created_ids = [doc_id for doc_id, _ in created]
+    created_documents = [data for _, data in created]
+    
+    record_ingested_documents(db, entity_id, "papers", linked_ids, linked_documents)
+    edges, aliases = citation_graph.record_citations(db, created)
+    after_commit(db, lambda: heatmap.invalidate(entity_id))
+    after_commit(db, lambda: citation_graph.publish_citations(edges, aliases))
+    after_commit(db, lambda: personnel_network.record_papers(entity_id, created_documents))
+    after_commit(db, lambda: search.index_embeddings("paper", created_ids, created_documents))
+    logger.info(f"Linked {len(linked_ids)} papers ({len(created)} newly stored)")
+    return linked_ids
+
+
+def persist_personnel(db, entity_id: str, personnel: List[Dict[str, Any]]) -> List[str]:
+    """Save new personnel for an entity and refresh publication counts, in the caller's write."""
+    saved_ids = []
+    added = []
+    names = list({(p.get("name") or "").strip() for p in personnel} - {""})
+    known = {
+        person.name: person
+        for person in db.query(Personnel).filter(Personnel.entity_id == entity_id, Personnel.name.in_(names))
+    }
+    for person_data in personnel:
+        try:
+            name = person_data.get("name", "").strip()
+            if not name:
+                continue
+            
+            existing = known.get(name)
+            
+            if not existing:
+                person = Personnel(
+                    entity_id=entity_id,
+                    name=name,
+                    role=person_data.get("role", "Researcher"),
+                    expertise=person_data.get("expertise", []),
+                    publication_count=person_data.get("publication_count", 0),
                 )
-                db.add(paper)
-                paper_count += 1
-                
-            except Exception as e:
-                logger.error(f"Error saving paper: {e}")
+                with db.begin_nested():
+                    db.add(person)
+                saved_ids.append(person.id)
+                added.append(person)
+                known[name] = person
+            else:
+                # Update publication count if higher
+                new_count = person_data.get("publication_count", 0)
+                if new_count > (existing.publication_count or 0):
+                    existing.publication_count = new_count
+            
+        except Exception as e:
+            logger.error(f"Error saving personnel: {e}")
+            continue
+    
+    for person in added:
+        db.expunge(person)
+    after_commit(db, lambda: personnel_network.invalidate_entity(entity_id))
+    logger.info(f"Saved {len(saved_ids)} personnel")
+    return saved_ids
+
+
+def _count_authors(authors: Dict[str, Dict[str, Any]], papers: List[Dict[str, Any]]):
+    """Add papers to per-author publication and technology counts."""
+    for paper in papers:
+        for author in paper.get("authors") or []:
+            if not author:
                 continue
+            counts = authors.setdefault(author, {"publications": 0, "technologies": {}})
+            counts["publications"] += 1
+            for tech in paper.get("technologies", []):
+                counts["technologies"][tech] = counts["technologies"].get(tech, 0) + 1
+
+
+async def ingest_documents(
+    job: AnalysisJob, ai_service, source: str, kind: str, documents: List[Dict[str, Any]],
+    embed: Optional[Callable[[List[Dict[str, Any]]], Awaitable[List[Optional[List[float]]]]]] = None,
+) -> Dict[str, Any]:
+    """
+    Tag, embed, store and link a source's documents in chunks of
+    ANALYSIS_CHUNK_SIZE, committing each chunk before taking the next, so a
+    run's memory depends on the chunk size rather than on the entity's
+    size. Consumes `documents`. Documents another source already returned
+    in this run are skipped. Each chunk's write carries the run's progress
+    (see AnalysisJob.set_source_progress). New documents are embedded with `embed`
+    (embed_documents by default; batch analyses pool them across entities).
+    
+    Returns counters for the analyst: documents and newly linked documents,
+    documents per technology, and per-author publication and technology
+    counts (papers only).
+    """
+    persist = persist_patents if kind == "patents" else persist_papers
+    embed = embed or functools.partial(embed_documents, ai_service)
+    summary = {"documents": 0, "new": 0, "linked": 0, "technologies": {}, "authors": {}}
+    size = settings.ANALYSIS_CHUNK_SIZE
+    total, done = len(documents), 0
+    while documents:
+        chunk = [doc for doc in documents[:size] if job.first_seen(doc)]
+        done += len(documents[:size])
+        del documents[:size]
+        for doc in chunk:
+            doc["technologies"] = ai_service.extract_technologies(
+                f"{doc.get('title', '')} {doc.get('abstract', '') or ''}"
+            )
         
-        db.commit()
-        await update_entity_progress(entity_id, 80)
-        logger.info(f"Saved {paper_count} papers")
+        with stage_timer("dedup", source), job.read() as db:
+            new_documents = filter_new_documents(db, kind, chunk)
+        SCRAPED_DOCUMENTS.labels(source=source, state="new").inc(len(new_documents))
+        SCRAPED_DOCUMENTS.labels(source=source, state="stored").inc(len(chunk) - len(new_documents))
         
-        # ===== Step 4: Process personnel (80-90%) =====
-        personnel_count = 0
-        for person_data in scraped_data.get("personnel", []):
-            try:
-                name = person_data.get("name", "").strip()
-                if not name:
-                    continue
-                
-                # Check if person already exists for this entity
-                existing = db.query(Personnel).filter(
-                    Personnel.entity_id == entity.id,
-                    Personnel.name == name
-                ).first()
-                
-                if not existing:
-                    person = Personnel(
-                        entity_id=entity.id,
-                        name=name,
-                        role=person_data.get("role", "Researcher"),
-                        expertise=scraped_data.get("technologies", [])[:3],
-                        publication_count=person_data.get("publication_count", 0),
-                    )
-                    db.add(person)
-                    personnel_count += 1
-                else:
-                    # Update publication count if higher
-                    new_count = person_data.get("publication_count", 0)
-                    if new_count > existing.publication_count:
-                        existing.publication_count = new_count
-                
-            except Exception as e:
-                logger.error(f"Error saving personnel: {e}")
-                continue
+        with stage_timer("embed", source):
+            embeddings = await embed(new_documents)
+        for doc, embedding in zip(new_documents, embeddings):
+            doc["embedding"] = embedding
         
-        db.commit()
-        await update_entity_progress(entity_id, 90)
-        logger.info(f"Saved {personnel_count} personnel")
+        job.set_source_progress(source, done / total)
+        with stage_timer("persist", source):
+            linked_ids = await job.write(persist, job.entity_id, chunk)
         
-        # ===== Step 5: Finalize (90-100%) =====
-        entity.patent_count = patent_count
-        entity.paper_count = paper_count
-        entity.personnel_count = personnel_count
-        entity.focus_areas = scraped_data.get("technologies", [])
-        entity.status = EntityStatus.COMPLETE
-        entity.analysis_progress = 100
-        entity.updated_at = datetime.utcnow()
-        db.commit()
+        summary["documents"] += len(chunk)
+        summary["new"] += len(new_documents)
+        summary["linked"] += len(linked_ids)
+        for doc in chunk:
+            for tech in doc["technologies"]:
+                summary["technologies"][tech] = summary["technologies"].get(tech, 0) + 1
+        if kind == "papers":
+            _count_authors(summary["authors"], chunk)
+    job.set_source_progress(source, 1.0)
+    return summary
+
+
+def finalize_entity(db, entity_id: str, technologies: List[str], report: Optional[Dict[str, Any]] = None):
+    """Refresh denormalized counts, store the report and mark the entity complete."""
+    entity = db.query(Entity).filter(Entity.id == entity_id).first()
+    if not entity:
+        return
+    
+    entity.patent_count = count_documents(db, "patents", entity_id)
+    entity.paper_count = count_documents(db, "papers", entity_id)
+    entity.personnel_count = db.query(Personnel).filter(Personnel.entity_id == entity_id).count()
+    entity.focus_areas = technologies
+    if report is not None:
+        entity.analysis_report = report
+    entity.status = EntityStatus.COMPLETE
+    entity.analysis_progress = 100
+    entity.updated_at = datetime.utcnow()
+
+
+async def _resumable_snapshot(graph, config) -> bool:
+    """True if a checkpoint exists for this thread that is recent enough to resume."""
+    snapshot = await graph.aget_state(config)
+    if not snapshot.next:
+        return False
+    
+    if "document_counts" not in snapshot.values:
+        logger.info("Discarding checkpoint from an earlier version of the pipeline")
+        await graph.checkpointer.adelete_thread(config["configurable"]["thread_id"])
+        return False
+    
+    created_at = datetime.fromisoformat(snapshot.created_at).replace(tzinfo=None) if snapshot.created_at else None
+    if created_at and datetime.utcnow() - created_at > timedelta(hours=settings.CHECKPOINT_MAX_AGE_HOURS):
+        logger.info(f"Discarding stale checkpoint from {snapshot.created_at}")
+        await graph.checkpointer.adelete_thread(config["configurable"]["thread_id"])
+        return False
+    
+    logger.info(f"Resuming analysis before stage(s): {', '.join(snapshot.next)}")
+    return True
+
+
+async def trigger_entity_analysis(entity_id: str, profile: bool = False, batch=None) -> str:
+    """
+    Main analysis pipeline for an entity.
+    
+    Runs the LangGraph workflow (see app.core.graph):
+    1. Scout every source in parallel, storing documents in chunks as
+       each returns (5%, rising to 85% as documents are stored)
+    2. Analyze technologies and personnel
+    3. Persist personnel (90%)
+    4. Finalize counts and build the report (100%)
+    
+    Each completed stage is checkpointed; if a previous run failed, this
+    run resumes from its last completed stage instead of starting over.
+    
+    With `profile` (or when picked by PROFILE_SAMPLE_RATE) the run is
+    profiled; see app.services.profiling. Runs in a batch pass their
+    AnalysisBatch, which schedules their scrapes and embeddings (see
+    app.services.batch_analysis).
+    
+    Returns the outcome: complete, error, not_found or already_running.
+    """
+    if should_profile(profile):
+        return await run_profiled("analysis", entity_id, lambda: _run_entity_analysis(entity_id, batch))
+    return await _run_entity_analysis(entity_id, batch)
+
+
+async def _run_entity_analysis(entity_id: str, batch=None) -> str:
+    """Run the analysis graph for an entity, recording and returning the outcome."""
+    logger.info(f"Starting analysis pipeline for entity: {entity_id}")
+    
+    job = AnalysisJob(entity_id)
+    start = time.perf_counter()
+    outcome = "error"
+    
+    try:
+        # Get entity
+        with job.read() as db:
+            entity = db.query(Entity.name, Entity.website).filter(Entity.id == entity_id).first()
+        if not entity:
+            logger.error(f"Entity not found: {entity_id}")
+            outcome = "not_found"
+            return outcome
+        
+        # At most one run per entity: a second trigger (double reanalyze,
+        # bulk import) leaves the running analysis alone
+        job.claimed = await job.write(claim_analysis, entity_id)
+        if not job.claimed:
+            logger.info(f"Analysis already running for entity {entity_id}; skipping")
+            outcome = "already_running"
+            return outcome
+        
+        entity_name = entity.name
+        website = entity.website
+        
+        async with open_checkpointer() as checkpointer:
+            if checkpointer is not None:
+                graph = create_analysis_graph(checkpointer=checkpointer)
+            else:
+                graph = get_analysis_graph()
+            
+            thread_id = analysis_thread_id(entity_id)
+            # One SCRAPE_DEADLINE_SECONDS for all of this run's scouts (a
+            # resumed run gets a new one: the deadline is not checkpointed)
+            config = {"configurable": {
+                "thread_id": thread_id,
+                "job": job,
+                "batch": batch,
+                "scrape_deadline": scrape_deadline(),
+            }}
+            resuming = checkpointer is not None and await _resumable_snapshot(graph, config)
+            
+            # Keep progress when resuming
+            if resuming:
+                with job.read() as db:
+                    job.progress = db.query(Entity.analysis_progress).filter(Entity.id == entity_id).scalar() or 0
+            else:
+                job.set_progress(5)
+                await job.flush()
+            
+            graph_input = None if resuming else {
+                "entity_id": entity_id,
+                "entity_name": entity_name,
+                "website": website,
+                "document_counts": {},
+                "linked_counts": {},
+                "technology_counts": {},
+                "authors": {},
+                "source_status": {},
+                "persisted_ids": {},
+                "timings": {},
+                "messages": [],
+            }
+            final_state = await graph.ainvoke(graph_input, config, durability="sync")
+            
+            # Finished runs start from scratch next time
+            if checkpointer is not None:
+                await checkpointer.adelete_thread(thread_id)
         
-        logger.info(f"Analysis complete for {entity_name}: {patent_count} patents, {paper_count} papers, {personnel_count} personnel")
+        report = final_state.get("report", {})
+        timings = ", ".join(f"{k}={v:.2f}s" for k, v in final_state.get("timings", {}).items())
+        logger.info(
+            f"Analysis complete for {entity_name}: {report.get('patent_count', 0)} patents, "
+            f"{report.get('paper_count', 0)} papers ({timings})"
+        )
+        outcome = "complete"
         
+    except asyncio.CancelledError:
+        # Cancelled (shutdown, or its batch was cancelled): release the claim
+        # and queue the entity again, so the checkpoint is resumed by the
+        # next trigger or on startup (see analysis_queue.resume_pending)
+        logger.warning(f"Analysis cancelled for entity {entity_id}")
+        outcome = "cancelled"
+        job.db.rollback()
+        if job.claimed:
+            job.release()
+        raise
     except Exception as e:
         logger.error(f"Analysis failed for entity {entity_id}: {e}")
-        # Update entity status to error
-        try:
-            entity = db.query(Entity).filter(Entity.id == uuid.UUID(entity_id)).first()
-            if entity:
-                entity.status = EntityStatus.ERROR
-                entity.analysis_progress = 0
-                db.commit()
-        except:
-            pass
+        # Update entity status to error, keeping progress so the
+        # resumed run picks up where this one stopped
+        job.db.rollback()
+        if job.claimed:
+            job.set_progress(status=EntityStatus.ERROR)
     finally:
-        db.close()
+        await job.close()
+        ANALYSIS_DURATION.labels(outcome=outcome).observe(time.perf_counter() - start)
+    return outcome
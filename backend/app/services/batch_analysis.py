@@ -0,0 +1,215 @@
+"""
+Batch analysis.
+Analyses many entities as one job. Each entity runs the usual analysis
+graph (with its checkpoints and per-entity writes), but the batch:
+
+- admits at most BATCH_SOURCE_CONCURRENCY entities to each source at a
+  time, so the shared per-domain rate limits are spent on scraping rather
+  than on waiting, and a source's time budget starts when the entity is
+  admitted rather than when it starts queueing (the run's
+  SCRAPE_DEADLINE_SECONDS still applies)
+- pools new documents from all its entities into embedding batches of up
+  to BATCH_EMBEDDING_BATCH_SIZE
+
+Batches live in the process that started them; the most recent
+BATCH_ANALYSIS_HISTORY are kept for status requests.
+"""
+import asyncio
+import logging
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.models import Entity
+from app.services.ai_service import get_ai_service
+from app.services.analysis_service import embed_documents, trigger_entity_analysis
+from app.services.scraper import SCRAPE_SOURCES, run_source
+
+logger = logging.getLogger(__name__)
+
+# Entity states before an outcome (see trigger_entity_analysis) is known
+QUEUED = "queued"
+RUNNING = "running"
+
+
+class EmbeddingBatcher:
+    """
+    Embeds documents submitted by concurrent analyses together: a batch is
+    sent once `size` documents are waiting, or `wait` seconds after the
+    first of them arrived.
+    """
+
+    def __init__(self, ai_service, size: int, wait: float):
+        self.ai_service = ai_service
+        self.size = max(1, size)
+        self.wait = wait
+        self._pending: List[Tuple[List[Dict[str, Any]], asyncio.Future]] = []
+        self._count = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: Set[asyncio.Task] = set()
+        self.batches = 0
+        self.documents = 0
+
+    async def embed(self, documents: List[Dict[str, Any]]) -> List[Optional[List[float]]]:
+        """Embeddings of `documents`, in order (as embed_documents)."""
+        if not documents:
+            return []
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((documents, future))
+        self._count += len(documents)
+        if self._count >= self.size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.wait, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        pending, self._pending, self._count = self._pending, [], 0
+        if pending:
+            task = asyncio.get_running_loop().create_task(self._embed(pending))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _embed(self, pending: List[Tuple[List[Dict[str, Any]], asyncio.Future]]):
+        documents = [doc for docs, _ in pending for doc in docs]
+        try:
+            embeddings = await embed_documents(self.ai_service, documents)
+        except Exception as e:
+            for _, future in pending:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        self.batches += 1
+        self.documents += len(documents)
+        offset = 0
+        for docs, future in pending:
+            if not future.done():
+                future.set_result(embeddings[offset:offset + len(docs)])
+            offset += len(docs)
+
+
+class AnalysisBatch:
+    """A batch of entity analyses: scheduling shared by its runs, and their progress."""
+
+    def __init__(self, entity_ids: List[str]):
+        self.id = uuid.uuid4().hex
+        self.entity_ids = entity_ids
+        self.states: Dict[str, str] = {entity_id: QUEUED for entity_id in entity_ids}
+        self.created_at = datetime.utcnow()
+        self.finished_at: Optional[datetime] = None
+        self.task: Optional[asyncio.Task] = None
+        self.embedder = EmbeddingBatcher(
+            get_ai_service(), settings.BATCH_EMBEDDING_BATCH_SIZE, settings.BATCH_EMBEDDING_WAIT_MS / 1000,
+        )
+        self._source_slots = {
+            source: asyncio.Semaphore(max(1, settings.BATCH_SOURCE_CONCURRENCY)) for source in SCRAPE_SOURCES
+        }
+
+    async def run_source(self, source: str, entity_name: str, deadline: Optional[float] = None):
+        """run_source once the source admits this entity (still within the run's `deadline`)."""
+        async with self._source_slots[source]:
+            return await run_source(source, entity_name, deadline)
+
+    async def embed(self, documents: List[Dict[str, Any]]) -> List[Optional[List[float]]]:
+        return await self.embedder.embed(documents)
+
+    async def run(self):
+        """Analyse the entities, BATCH_ANALYSIS_CONCURRENCY at a time."""
+        semaphore = asyncio.Semaphore(max(1, settings.BATCH_ANALYSIS_CONCURRENCY))
+
+        async def analyze(entity_id: str):
+            async with semaphore:
+                self.states[entity_id] = RUNNING
+                try:
+                    self.states[entity_id] = await trigger_entity_analysis(entity_id, batch=self)
+                except Exception as e:
+                    logger.error(f"Batch {self.id}: analysis failed for entity {entity_id}: {e}")
+                    self.states[entity_id] = "error"
+
+        try:
+            await asyncio.gather(*(analyze(entity_id) for entity_id in self.entity_ids))
+        finally:
+            self.finished_at = datetime.utcnow()
+        counts = self.counts()
+        logger.info(
+            f"Batch {self.id} finished: {counts} in {self.elapsed():.1f}s, "
+            f"{self.embedder.documents} documents in {self.embedder.batches} embedding batches"
+        )
+
+    def elapsed(self) -> float:
+        return ((self.finished_at or datetime.utcnow()) - self.created_at).total_seconds()
+
+    def counts(self) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        for state in self.states.values():
+            counts[state] = counts.get(state, 0) + 1
+        return counts
+
+    def status(self, db: Session) -> Dict[str, Any]:
+        """
+        Batch progress: entities per state, and overall progress as the mean
+        of the entities' progress (running ones as stored by their runs,
+        finished ones at 100).
+        """
+        running = [entity_id for entity_id, state in self.states.items() if state == RUNNING]
+        progress = dict(
+            db.query(Entity.id, Entity.analysis_progress).filter(Entity.id.in_(running)).all()
+        ) if running else {}
+
+        entities = []
+        total_progress = 0
+        for entity_id, state in self.states.items():
+            if state == QUEUED:
+                entity_progress = 0
+            elif state == RUNNING:
+                entity_progress = progress.get(entity_id) or 0
+            else:
+                entity_progress = 100
+            total_progress += entity_progress
+            entities.append({"entity_id": entity_id, "state": state, "progress": entity_progress})
+
+        elapsed = self.elapsed()
+        counts = self.counts()
+        completed = counts.get("complete", 0)
+        return {
+            "batch_id": self.id,
+            "status": "complete" if self.finished_at else "running",
+            "total": len(self.entity_ids),
+            "counts": counts,
+            "progress": round(total_progress / len(self.entity_ids)) if self.entity_ids else 100,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+            "elapsed_seconds": round(elapsed, 1),
+            "entities_per_hour": round(completed / elapsed * 3600, 1) if elapsed > 0 else 0.0,
+            "embedded_documents": self.embedder.documents,
+            "embedding_batches": self.embedder.batches,
+            "entities": entities,
+        }
+
+
+# Recent batches of this process, oldest first
+_batches: "OrderedDict[str, AnalysisBatch]" = OrderedDict()
+
+
+def start_batch(entity_ids: List[str]) -> AnalysisBatch:
+    """Start analysing `entity_ids` (deduplicated) as a batch; must be called from the event loop."""
+    batch = AnalysisBatch(list(dict.fromkeys(entity_ids)))
+    batch.task = asyncio.get_running_loop().create_task(batch.run())
+    _batches[batch.id] = batch
+    finished = [batch_id for batch_id, other in _batches.items() if other.finished_at is not None]
+    for batch_id in finished[:max(0, len(finished) - settings.BATCH_ANALYSIS_HISTORY)]:
+        del _batches[batch_id]
+    logger.info(f"Started batch {batch.id} of {len(batch.entity_ids)} entities")
+    return batch
+
+
+def get_batch(batch_id: str) -> Optional[AnalysisBatch]:
+    return _batches.get(batch_id)
@@ -0,0 +1,239 @@
+"""
+Bulk entity import.
+Parses a streamed CSV or JSONL upload record by record, validates each
+record with EntityCreate, skips entities that already exist (same name and
+website), inserts the rest in batches and queues their analyses.
+
+Only one batch of records is held at a time, so memory use depends on
+BULK_IMPORT_BATCH_SIZE rather than on the size of the upload.
+"""
+import codecs
+import csv
+import json
+import logging
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple, Union
+
+import orjson
+from pydantic import ValidationError
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.write_queue import run_write
+from app.models.models import Entity, EntityStatus, generate_uuid
+from app.models.schemas import EntityCreate
+from app.services.analysis_queue import analysis_queue
+
+logger = logging.getLogger(__name__)
+
+IMPORT_FORMATS = ("csv", "jsonl")
+
+# Longest accepted line (characters); longer records are reported invalid
+MAX_RECORD_CHARS = 64 * 1024
+
+# Separator for focus_areas within a CSV cell
+CSV_LIST_SEPARATOR = ";"
+
+
+class RecordError(ValueError):
+    """A record that could not be parsed."""
+
+
+def detect_format(content_type: str) -> Optional[str]:
+    """Import format implied by a Content-Type header, if any."""
+    content_type = content_type.split(";")[0].strip().lower()
+    if content_type in ("text/csv", "application/csv"):
+        return "csv"
+    if content_type in ("application/x-ndjson", "application/jsonl", "application/x-jsonlines", "application/json-seq"):
+        return "jsonl"
+    return None
+
+
+def dedupe_key(name: str, website: Optional[str]) -> Tuple[str, str]:
+    """Entities are the same if the name matches and the websites agree up to scheme, www and trailing slash."""
+    site = (website or "").strip().lower()
+    for prefix in ("https://", "http://"):
+        if site.startswith(prefix):
+            site = site[len(prefix):]
+    if site.startswith("www."):
+        site = site[4:]
+    return name.strip(), site.rstrip("/")
+
+
+async def _lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, Optional[str]]]:
+    """Decoded lines with 1-based line numbers; None for lines over MAX_RECORD_CHARS."""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+    buffer, line_no, oversized = "", 0, False
+    async for chunk in chunks:
+        pieces = decoder.decode(chunk).split("\n")
+        for piece in pieces[:-1]:
+            line, buffer = buffer + piece, ""
+            line_no += 1
+            if oversized or len(line) > MAX_RECORD_CHARS:
+                oversized = False
+                yield line_no, None
+            else:
+                yield line_no, line.rstrip("\r")
+        buffer += pieces[-1]
+        if len(buffer) > MAX_RECORD_CHARS:
+            # Drop the rest of this line as it arrives
+            buffer, oversized = "", True
+    buffer += decoder.decode(b"", final=True)
+    if buffer or oversized:
+        yield line_no + 1, None if oversized else buffer.rstrip("\r")
+
+
+async def _jsonl_records(lines) -> AsyncIterator[Tuple[int, Union[Dict[str, Any], RecordError]]]:
+    """One JSON object per non-blank line."""
+    async for line_no, line in lines:
+        if line is None:
+            yield line_no, RecordError("record too long")
+            continue
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield line_no, RecordError(f"invalid JSON: {e}")
+            continue
+        if not isinstance(record, dict):
+            yield line_no, RecordError("expected a JSON object")
+            continue
+        yield line_no, record
+
+
+def _csv_fields(header: List[str], values: List[str]) -> Dict[str, Any]:
+    """CSV cells as EntityCreate fields: blanks are None, focus_areas is a list."""
+    record = {}
+    for column, value in zip(header, values):
+        value = value.strip()
+        if column == "focus_areas":
+            record[column] = [area.strip() for area in value.split(CSV_LIST_SEPARATOR) if area.strip()] or None
+        else:
+            record[column] = value or None
+    return record
+
+
+async def _csv_records(lines) -> AsyncIterator[Tuple[int, Union[Dict[str, Any], RecordError]]]:
+    """Rows after the header row; quoted cells may span lines."""
+    header: Optional[List[str]] = None
+    pending: List[str] = []
+    start, quotes, size = 0, 0, 0
+    async for line_no, line in lines:
+        if line is None:
+            yield (start if pending else line_no), RecordError("record too long")
+            pending = []
+            continue
+        if not pending:
+            if not line.strip():
+                continue
+            start, quotes, size = line_no, 0, 0
+        pending.append(line)
+        quotes += line.count('"')
+        size += len(line)
+        if quotes % 2:
+            # Inside a quoted cell: the record continues on the next line
+            if size > MAX_RECORD_CHARS:
+                pending = []
+                yield start, RecordError("record too long")
+            continue
+
+        try:
+            values = next(csv.reader(pending))
+        except csv.Error as e:
+            pending = []
+            yield start, RecordError(f"invalid CSV: {e}")
+            continue
+        pending = []
+        if header is None:
+            header = [column.strip().lower() for column in values]
+            if "name" not in header:
+                yield start, RecordError("CSV header must include a name column")
+                return
+        else:
+            yield start, _csv_fields(header, values)
+    if pending:
+        yield start, RecordError("unterminated quoted cell")
+
+
+def _validation_errors(error: ValidationError) -> List[str]:
+    return [f"{'.'.join(str(part) for part in e['loc']) or 'record'}: {e['msg']}" for e in error.errors()]
+
+
+def _insert_batch(db: Session, batch: List[Tuple[int, EntityCreate]], analyze: bool = True) -> List[Dict[str, Any]]:
+    """
+    Insert a batch of validated entities, skipping ones that already exist
+    (in the database, or earlier in the batch). With `analyze`, new entities
+    are marked queued for analysis. Returns per-record results.
+    """
+    names = {entity.name.strip() for _, entity in batch}
+    existing = {
+        dedupe_key(name, website): entity_id
+        for entity_id, name, website in db.query(Entity.id, Entity.name, Entity.website).filter(Entity.name.in_(names))
+    }
+
+    results, rows = [], []
+    for line_no, entity in batch:
+        key = dedupe_key(entity.name, entity.website)
+        if key in existing:
+            results.append({"line": line_no, "status": "duplicate", "id": existing[key]})
+            continue
+        entity_id = existing[key] = generate_uuid()
+        rows.append({
+            "id": entity_id,
+            "name": entity.name.strip(),
+            "type": entity.type.value,
+            "status": EntityStatus.PENDING.value,
+            "analysis_queued": analyze,
+            "website": entity.website.strip() if entity.website else None,
+            "description": entity.description,
+            "focus_areas": entity.focus_areas or [],
+        })
+        results.append({"line": line_no, "status": "created", "id": entity_id})
+
+    if rows:
+        db.execute(insert(Entity), rows)
+    return results
+
+
+async def import_entities(chunks: AsyncIterator[bytes], fmt: str, analyze: bool = True) -> AsyncIterator[bytes]:
+    """
+    Import entities from an upload stream, yielding one JSON line per record
+    ({"line", "status": created|duplicate|invalid, "id" or "errors"}) as each
+    batch is committed, then a {"summary": {...}} line.
+    """
+    records = _csv_records(_lines(chunks)) if fmt == "csv" else _jsonl_records(_lines(chunks))
+    summary = {"created": 0, "duplicate": 0, "invalid": 0}
+    batch: List[Tuple[int, EntityCreate]] = []
+    invalid: List[Dict[str, Any]] = []
+
+    async def flush() -> bytes:
+        results = await run_write(_insert_batch, list(batch), analyze) if batch else []
+        results.extend(invalid)
+        results.sort(key=lambda result: result["line"])
+        if analyze:
+            analysis_queue.enqueue(r["id"] for r in results if r["status"] == "created")
+        for result in results:
+            summary[result["status"]] += 1
+        batch.clear()
+        invalid.clear()
+        return b"".join(orjson.dumps(result) + b"\n" for result in results)
+
+    async for line_no, record in records:
+        if isinstance(record, RecordError):
+            invalid.append({"line": line_no, "status": "invalid", "errors": [str(record)]})
+        else:
+            try:
+                batch.append((line_no, EntityCreate.model_validate(record)))
+            except ValidationError as e:
+                invalid.append({"line": line_no, "status": "invalid", "errors": _validation_errors(e)})
+        if len(batch) + len(invalid) >= settings.BULK_IMPORT_BATCH_SIZE:
+            yield await flush()
+
+    if batch or invalid:
+        yield await flush()
+    logger.info(
+        f"Bulk import finished: {summary['created']} created, "
+        f"{summary['duplicate']} duplicates, {summary['invalid']} invalid"
+    )
+    yield orjson.dumps({"summary": summary}) + b"\n"
@@ -0,0 +1,351 @@
+"""
+Citation graph service.
+Stores citation edges scraped from Semantic Scholar and CrossRef, and keeps
+a compact in-memory CSR index for neighbourhood, k-hop and PageRank queries.
+
+Edges are keyed by document: internal patents/papers use their row ID,
+documents we have not ingested use an external key ("doi:<doi>" or
+"s2:<paperId>"). When such a document is ingested later, stored edges are
+rewritten to its row ID and the index aliases the key to the same node.
+"""
+import logging
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.models import Citation, Paper, Patent
+from app.services.documents import _chunks
+
+logger = logging.getLogger(__name__)
+
+Edge = Tuple[str, str]
+
+
+def doi_key(doi: Optional[str]) -> Optional[str]:
+    """Normalized external key for a DOI."""
+    if not doi:
+        return None
+    doi = doi.strip().lower()
+    for prefix in ("https://doi.org/", "http://doi.org/", "doi:"):
+        if doi.startswith(prefix):
+            doi = doi[len(prefix):]
+    return f"doi:{doi}" if doi else None
+
+
+def s2_key(paper_id: Optional[str]) -> Optional[str]:
+    """External key for a Semantic Scholar paper ID."""
+    return f"s2:{paper_id}" if paper_id else None
+
+
+def document_keys(paper: Dict[str, Any]) -> List[str]:
+    """External keys under which other documents may cite this paper."""
+    keys = [doi_key(paper.get("doi")), s2_key(paper.get("s2_id"))]
+    return [k for k in keys if k]
+
+
+def _gather(indptr: np.ndarray, indices: np.ndarray, nodes: np.ndarray) -> np.ndarray:
+    """Concatenate the CSR rows of `nodes` without a Python loop."""
+    if len(nodes) == 0:
+        return np.empty(0, dtype=np.int64)
+    starts = indptr[nodes]
+    lengths = indptr[nodes + 1] - starts
+    total = int(lengths.sum())
+    if total == 0:
+        return np.empty(0, dtype=np.int64)
+    offsets = np.repeat(starts - np.concatenate(([0], np.cumsum(lengths)[:-1])), lengths)
+    return indices[offsets + np.arange(total)]
+
+
+def _build_csr(src: np.ndarray, dst: np.ndarray, n: int) -> Tuple[np.ndarray, np.ndarray]:
+    order = np.argsort(src, kind="stable")
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(src, minlength=n), out=indptr[1:])
+    return indptr, dst[order].astype(np.int64)
+
+
+class CitationIndex:
+    """
+    In-memory citation graph in CSR form (forward and reverse).
+    New edges are buffered and merged into the CSR arrays on the next
+    query, so ingest never triggers a reload from the database.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._reset()
+        self.loaded = False
+
+    def _reset(self):
+        self._names: List[str] = []
+        self._lookup: Dict[str, int] = {}
+        self._src = np.empty(0, dtype=np.int64)
+        self._dst = np.empty(0, dtype=np.int64)
+        self._pending: List[Tuple[int, int]] = []
+        self._out = (np.zeros(1, dtype=np.int64), np.empty(0, dtype=np.int64))
+        self._in = (np.zeros(1, dtype=np.int64), np.empty(0, dtype=np.int64))
+        self._pagerank: Optional[np.ndarray] = None
+
+    @property
+    def node_count(self) -> int:
+        return len(self._names)
+
+    @property
+    def edge_count(self) -> int:
+        return len(self._src) + len(self._pending)
+
+    def _node(self, key: str) -> int:
+        idx = self._lookup.get(key)
+        if idx is None:
+            idx = len(self._names)
+            self._names.append(key)
+            self._lookup[key] = idx
+        return idx
+
+    def load(self, db: Session):
+        """Build the index from the citations table."""
+        with self._lock:
+            self._reset()
+            for source_id, target_id in db.query(Citation.source_id, Citation.target_id).yield_per(10000):
+                self._add_edge(source_id, target_id)
+            self._compact()
+            self.loaded = True
+            logger.info(f"Citation index loaded: {self.node_count} nodes, {self.edge_count} edges")
+
+    def _add_edge(self, source: str, target: str):
+        edge = (self._node(source), self._node(target))
+        if edge[0] != edge[1]:
+            self._pending.append(edge)
+
+    def add_edges(self, edges: Iterable[Edge]):
+        """Buffer new (already deduplicated) edges; merged into CSR on the next query."""
+        with self._lock:
+            for source, target in edges:
+                self._add_edge(source, target)
+
+    def alias(self, key: str, doc_id: str):
+        """Make an external key and an internal ID refer to the same node."""
+        with self._lock:
+            idx = self._lookup.get(key)
+            if idx is None:
+                return
+            existing = self._lookup.get(doc_id)
+            if existing is None:
+                self._lookup[doc_id] = idx
+                self._names[idx] = doc_id
+            elif existing != idx:
+                logger.debug(f"Citation nodes {key} and {doc_id} both exist; leaving them separate")
+
+    def _compact(self):
+        """Merge buffered edges into the CSR arrays."""
+        if not self._pending and len(self._out[0]) == self.node_count + 1:
+            return
+        if self._pending:
+            new = np.asarray(self._pending, dtype=np.int64)
+            self._src = np.concatenate((self._src, new[:, 0]))
+            self._dst = np.concatenate((self._dst, new[:, 1]))
+            self._pending = []
+        n = self.node_count
+        self._out = _build_csr(self._src, self._dst, n)
+        self._in = _build_csr(self._dst, self._src, n)
+        self._pagerank = None
+
+    def _index_of(self, key: str) -> Optional[int]:
+        return self._lookup.get(key)
+
+    def neighbors(self, key: str) -> Optional[Dict[str, List[str]]]:
+        """Documents this one cites and documents citing it."""
+        with self._lock:
+            self._compact()
+            idx = self._index_of(key)
+            if idx is None:
+                return None
+            node = np.array([idx])
+            return {
+                "references": [self._names[i] for i in _gather(*self._out, node)],
+                "cited_by": [self._names[i] for i in _gather(*self._in, node)],
+            }
+
+    def k_hop(self, key: str, k: int = 2, direction: str = "both", limit: int = 500) -> Optional[Dict[str, Any]]:
+        """
+        Breadth-first neighbourhood up to `k` hops.
+        Returns node names with their hop distance and the edges among them.
+        """
+        with self._lock:
+            self._compact()
+            idx = self._index_of(key)
+            if idx is None:
+                return None
+
+            hops = {idx: 0}
+            frontier = np.array([idx], dtype=np.int64)
+            for hop in range(1, k + 1):
+                reached = []
+                if direction in ("out", "both"):
+                    reached.append(_gather(*self._out, frontier))
+                if direction in ("in", "both"):
+                    reached.append(_gather(*self._in, frontier))
+                if not reached:
+                    break
+                candidates = np.unique(np.concatenate(reached)).tolist()
+                new_nodes = [n for n in candidates if n not in hops][: max(limit - len(hops), 0)]
+                for n in new_nodes:
+                    hops[n] = hop
+                if not new_nodes or len(hops) >= limit:
+                    break
+                frontier = np.array(new_nodes, dtype=np.int64)
+
+            visited = np.fromiter(hops.keys(), dtype=np.int64)
+            mask = np.zeros(self.node_count, dtype=bool)
+            mask[visited] = True
+            indptr, indices = self._out
+            edge_src = np.repeat(visited, indptr[visited + 1] - indptr[visited])
+            edge_dst = _gather(indptr, indices, visited)
+            keep = mask[edge_dst]
+
+            return {
+                "nodes": [{"id": self._names[n], "hop": h} for n, h in hops.items()],
+                "links": [
+                    {"source": self._names[s], "target": self._names[t]}
+                    for s, t in zip(edge_src[keep].tolist(), edge_dst[keep].tolist())
+                ],
+            }
+
+    def pagerank(self, damping: float = 0.85, max_iter: int = 100, tol: float = 1e-8) -> np.ndarray:
+        """PageRank over the citation graph (cached until the graph changes)."""
+        with self._lock:
+            self._compact()
+            if self._pagerank is not None:
+                return self._pagerank
+
+            n = self.node_count
+            if n == 0:
+                return np.empty(0)
+            out_degree = np.diff(self._out[0]).astype(np.float64)
+            dangling = out_degree == 0
+            safe_degree = np.where(dangling, 1.0, out_degree)
+            rank = np.full(n, 1.0 / n)
+            for _ in range(max_iter):
+                contrib = rank / safe_degree
+                contrib[dangling] = 0.0
+                new_rank = np.bincount(self._dst, weights=contrib[self._src], minlength=n)
+                new_rank = damping * (new_rank + rank[dangling].sum() / n) + (1.0 - damping) / n
+                converged = np.abs(new_rank - rank).sum() < tol
+                rank = new_rank
+                if converged:
+                    break
+            self._pagerank = rank
+            return rank
+
+    def top_pagerank(self, limit: int = 50, internal_only: bool = True) -> List[Tuple[str, float]]:
+        """Highest-ranked documents, by default only ones we have ingested."""
+        rank = self.pagerank()
+        with self._lock:
+            order = np.argsort(-rank)
+            results = []
+            for i in order.tolist():
+                name = self._names[i]
+                if internal_only and ":" in name:
+                    continue
+                results.append((name, float(rank[i])))
+                if len(results) >= limit:
+                    break
+            return results
+
+
+# Global index (loaded on first query)
+citation_index = CitationIndex()
+
+
+def get_citation_index(db: Session) -> CitationIndex:
+    """Get the citation index, loading it from the database on first use."""
+    if not citation_index.loaded:
+        citation_index.load(db)
+    return citation_index
+
+
+def record_citations(db: Session, papers: List[Tuple[str, Dict[str, Any]]]) -> Tuple[List[Edge], Dict[str, str]]:
+    """
+    Store citation edges for newly saved papers, in the caller's transaction.
+
+    `papers` pairs each new paper's row ID with its scraped data. Edges that
+    pointed at one of these papers by external key are rewritten to its ID.
+    Returns the new edges and the key -> ID aliases for the in-memory index.
+    """
+    aliases: Dict[str, str] = {}
+    candidates: List[Edge] = []
+    limit = settings.CITATION_MAX_PER_PAPER
+
+    for paper_id, data in papers:
+        for key in document_keys(data):
+            aliases[key] = paper_id
+        for ref in (data.get("references") or [])[:limit]:
+            candidates.append((paper_id, ref))
+        for citing in (data.get("cited_by") or [])[:limit]:
+            candidates.append((citing, paper_id))
+
+    # IN lists are chunked to stay under the database's bind-variable limit
+    rewrites: Dict[str, Citation] = {}
+    for keys in _chunks(list(aliases)):
+        for citation in db.query(Citation).filter(
+            or_(Citation.source_id.in_(keys), Citation.target_id.in_(keys))
+        ).all():
+            rewrites[citation.id] = citation
+    for citation in rewrites.values():
+        if citation.source_id in aliases:
+            citation.source_id = aliases[citation.source_id]
+            citation.source_type = "paper"
+        if citation.target_id in aliases:
+            citation.target_id = aliases[citation.target_id]
+            citation.target_type = "paper"
+
+    # Resolve references to documents already ingested in this batch
+    edges = {(aliases.get(s, s), aliases.get(t, t)) for s, t in candidates}
+    edges = {(s, t) for s, t in edges if s != t}
+    if not edges:
+        return [], aliases
+
+    # Skip edges already stored (e.g. recorded from the other direction)
+    existing = set()
+    for sources in _chunks(list({s for s, _ in edges})):
+        existing.update(
+            db.query(Citation.source_id, Citation.target_id)
+            .filter(Citation.source_id.in_(sources))
+            .all()
+        )
+    new_edges = [e for e in edges if e not in existing]
+
+    internal_ids = set(aliases.values())
+    for source, target in new_edges:
+        db.add(Citation(
+            source_id=source,
+            source_type="paper" if source in internal_ids or ":" not in source else "external",
+            target_id=target,
+            target_type="paper" if target in internal_ids or ":" not in target else "external",
+        ))
+    return new_edges, aliases
+
+
+def publish_citations(edges: List[Edge], aliases: Dict[str, str]):
+    """Apply committed edges to the in-memory index (if it is loaded)."""
+    if not citation_index.loaded:
+        return
+    for key, doc_id in aliases.items():
+        citation_index.alias(key, doc_id)
+    citation_index.add_edges(edges)
+
+
+def describe_documents(db: Session, ids: Iterable[str]) -> Dict[str, Dict[str, str]]:
+    """Titles and types for internal document IDs (external keys are skipped)."""
+    internal = [i for i in ids if ":" not in i]
+    info: Dict[str, Dict[str, str]] = {}
+    if not internal:
+        return info
+    for doc_id, title in db.query(Paper.id, Paper.title).filter(Paper.id.in_(internal)).all():
+        info[doc_id] = {"name": title, "type": "paper"}
+    for doc_id, title in db.query(Patent.id, Patent.title).filter(Patent.id.in_(internal)).all():
+        info[doc_id] = {"name": title, "type": "patent"}
+    return info
@@ -0,0 +1,201 @@
+"""
+Shared document store.
+
+Each patent and paper is stored once, with its embedding, however many
+tracked entities it belongs to (a lab and its university, a company and
+its subsidiary). The entity_patents and entity_papers tables link
+entities to documents; entity document counts are derived from the links.
+
+Documents are identified across analyses by patent number and DOI. A
+document no entity links to any more is deleted with its last link.
+"""
+import logging
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, NamedTuple
+
+from sqlalchemy import exists, func, inspect, insert, select, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from app.models.models import EntityPaper, EntityPatent, Paper, Patent
+
+logger = logging.getLogger(__name__)
+
+
+class DocumentKind(NamedTuple):
+    model: Any
+    link: Any
+    link_column: Any  # link table column holding the document ID
+    key_field: str  # scraped field identifying the document across analyses
+    key_column: Any
+
+
+DOCUMENT_KINDS = {
+    "patents": DocumentKind(Patent, EntityPatent, EntityPatent.patent_id, "patent_number", Patent.patent_number),
+    "papers": DocumentKind(Paper, EntityPaper, EntityPaper.paper_id, "doi", Paper.doi),
+}
+
+# Bound parameters per IN (...) list, within every backend's limit
+_CHUNK = 500
+
+
+def _chunks(values: List[Any]) -> Iterable[List[Any]]:
+    for start in range(0, len(values), _CHUNK):
+        yield values[start:start + _CHUNK]
+
+
+def of_entity(kind: str, entity_id: str):
+    """Filter clause: documents of `kind` linked to the entity."""
+    k = DOCUMENT_KINDS[kind]
+    return k.model.id.in_(select(k.link_column).where(k.link.entity_id == entity_id))
+
+
+def entity_document_ids(db: Session, kind: str, entity_id: str) -> List[str]:
+    """IDs of the documents of `kind` linked to the entity."""
+    k = DOCUMENT_KINDS[kind]
+    return [doc_id for (doc_id,) in db.query(k.link_column).filter(k.link.entity_id == entity_id)]
+
+
+def document_embeddings(db: Session, kind: str, doc_ids: List[str]) -> Dict[str, List[float]]:
+    """Stored embeddings by document ID (documents without one are left out)."""
+    k = DOCUMENT_KINDS[kind]
+    embeddings = {}
+    for chunk in _chunks(list(set(doc_ids))):
+        embeddings.update(
+            db.query(k.model.id, k.model.embedding).filter(k.model.id.in_(chunk), k.model.embedding.isnot(None))
+        )
+    return embeddings
+
+
+def stored_document_ids(db: Session, kind: str, documents: List[Dict[str, Any]]) -> Dict[str, str]:
+    """Stored document IDs by key (patent number or DOI) for scraped documents."""
+    k = DOCUMENT_KINDS[kind]
+    keys = list({d.get(k.key_field) for d in documents if d.get(k.key_field)})
+    stored = {}
+    for chunk in _chunks(keys):
+        stored.update(db.query(k.key_column, k.model.id).filter(k.key_column.in_(chunk)).all())
+    return stored
+
+
+def link_documents(db: Session, entity_id: str, kind: str, doc_ids: List[str]) -> List[str]:
+    """Link an entity to documents, in the caller's transaction. Returns the IDs newly linked."""
+    k = DOCUMENT_KINDS[kind]
+    wanted = list(dict.fromkeys(doc_ids))
+    linked = set()
+    for chunk in _chunks(wanted):
+        linked.update(
+            doc_id for (doc_id,) in
+            db.query(k.link_column).filter(k.link.entity_id == entity_id, k.link_column.in_(chunk))
+        )
+    new = [doc_id for doc_id in wanted if doc_id not in linked]
+    if new:
+        db.execute(insert(k.link), [{"entity_id": entity_id, k.link_column.key: doc_id} for doc_id in new])
+    return new
+
+
+def linked_entities(db: Session, kind: str, doc_ids: List[str]) -> Dict[str, List[str]]:
+    """Entity IDs linked to each document."""
+    k = DOCUMENT_KINDS[kind]
+    entities = defaultdict(list)
+    for chunk in _chunks(list(set(doc_ids))):
+        for doc_id, entity_id in db.query(k.link_column, k.link.entity_id).filter(k.link_column.in_(chunk)):
+            entities[doc_id].append(entity_id)
+    return entities
+
+
+def count_documents(db: Session, kind: str, entity_id: str) -> int:
+    """Documents of `kind` linked to the entity."""
+    k = DOCUMENT_KINDS[kind]
+    return db.query(func.count()).select_from(k.link).filter(k.link.entity_id == entity_id).scalar()
+
+
+def unlink_entity(db: Session, entity_id: str):
+    """Remove an entity's links, deleting documents no other entity links to."""
+    for kind, k in DOCUMENT_KINDS.items():
+        doc_ids = entity_document_ids(db, kind, entity_id)
+        db.query(k.link).filter(k.link.entity_id == entity_id).delete(synchronize_session=False)
+        for chunk in _chunks(doc_ids):
+            db.query(k.model).filter(
+                k.model.id.in_(chunk),
+                ~exists().where(k.link_column == k.model.id),
+            ).delete(synchronize_session=False)
+
+
+# ============== Upgrade ==============
+
+def _merge_duplicate_papers(conn):
+    """Keep one row per DOI (the oldest), moving links and citations of the others to it."""
+    rows = conn.execute(text("""
+        SELECT doi, id FROM papers
+        WHERE doi IN (SELECT doi FROM papers WHERE doi <> '' GROUP BY doi HAVING count(*) > 1)
+        ORDER BY doi, created_at, id
+    """)).all()
+    keep = {}
+    merged = 0
+    for doi, doc_id in rows:
+        if doi not in keep:
+            keep[doi] = doc_id
+            continue
+        params = {"keep": keep[doi], "dup": doc_id}
+        conn.execute(text("""
+            INSERT INTO entity_papers (entity_id, paper_id, created_at)
+            SELECT entity_id, :keep, created_at FROM entity_papers
+            WHERE paper_id = :dup
+              AND entity_id NOT IN (SELECT entity_id FROM entity_papers WHERE paper_id = :keep)
+        """), params)
+        conn.execute(text("DELETE FROM entity_papers WHERE paper_id = :dup"), params)
+        conn.execute(text("UPDATE citations SET source_id = :keep WHERE source_id = :dup"), params)
+        conn.execute(text("UPDATE citations SET target_id = :keep WHERE target_id = :dup"), params)
+        conn.execute(text("DELETE FROM papers WHERE id = :dup"), params)
+        merged += 1
+    return merged
+
+
+def _drop_entity_column_sqlite(conn, table):
+    """
+    SQLite cannot drop a foreign key column, so the table is rebuilt: the
+    old one is renamed aside (without rewriting references to it), the
+    current schema created, and the rows copied. Search triggers go with
+    the old table and are recreated by setup_search_index.
+    """
+    name = table.name
+    indexes = conn.execute(text(
+        "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = :table AND sql IS NOT NULL"
+    ), {"table": name}).scalars().all()
+    for index in indexes:
+        conn.exec_driver_sql(f'DROP INDEX "{index}"')
+    conn.exec_driver_sql("PRAGMA legacy_alter_table = ON")
+    conn.exec_driver_sql(f"ALTER TABLE {name} RENAME TO _{name}_legacy")
+    conn.exec_driver_sql("PRAGMA legacy_alter_table = OFF")
+    table.create(conn)
+    columns = ", ".join(column.name for column in table.columns)
+    conn.exec_driver_sql(f"INSERT INTO {name} ({columns}) SELECT {columns} FROM _{name}_legacy")
+    conn.exec_driver_sql(f"DROP TABLE _{name}_legacy")
+
+
+def upgrade_document_store(engine: Engine):
+    """
+    Move a database from per-entity document rows to the shared store:
+    link each patent and paper to the entity it was stored for, merge
+    papers stored once per entity, and drop the old entity_id columns.
+    Does nothing on databases already upgraded.
+    """
+    for kind, k in DOCUMENT_KINDS.items():
+        table = k.model.__table__
+        if "entity_id" not in {column["name"] for column in inspect(engine).get_columns(table.name)}:
+            continue
+        with engine.begin() as conn:
+            link_table = k.link.__table__.name
+            conn.execute(text(f"""
+                INSERT INTO {link_table} (entity_id, {k.link_column.key}, created_at)
+                SELECT d.entity_id, d.id, d.created_at FROM {table.name} d
+                WHERE d.entity_id IS NOT NULL AND NOT EXISTS (
+                    SELECT 1 FROM {link_table} l WHERE l.{k.link_column.key} = d.id
+                )
+            """))
+            merged = _merge_duplicate_papers(conn) if kind == "papers" else 0
+            if engine.dialect.name == "sqlite":
+                _drop_entity_column_sqlite(conn, table)
+            else:
+                conn.exec_driver_sql(f"ALTER TABLE {table.name} DROP COLUMN entity_id")
+        logger.info(f"Moved {kind} to the shared document store ({merged} duplicates merged)")
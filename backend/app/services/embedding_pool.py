@@ -0,0 +1,311 @@
+"""
+Embedding worker pool.
+Runs fastembed in dedicated processes so embedding scales with CPU cores
+instead of sharing the web worker's GIL. Texts go to each worker over its
+own queue, vectors come back through shared-memory float32 buffers (no
+pickling). A worker that dies fails only the tasks queued to it, and is
+replaced.
+"""
+import asyncio
+import hashlib
+import logging
+import multiprocessing as mp
+import os
+import queue
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from multiprocessing import shared_memory
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class StubTextEmbedding:
+    """
+    Stand-in for fastembed's TextEmbedding (EMBEDDING_BACKEND="stub").
+    Unit vectors seeded by a hash of each text: repeatable, no model download.
+    """
+
+    def __init__(self, dim: int):
+        self.dim = dim
+
+    def embed(self, texts: List[str], batch_size: Optional[int] = None, **kwargs):
+        for text in texts:
+            seed = int.from_bytes(hashlib.blake2b(text.encode(), digest_size=8).digest(), "little")
+            vector = np.random.default_rng(seed).standard_normal(self.dim).astype(np.float32)
+            yield vector / np.linalg.norm(vector)
+
+
+def create_text_embedding(backend: str, model_name: str, dim: int, threads: Optional[int] = None):
+    """Embedding model for a backend: fastembed, or the stub."""
+    if backend == "stub":
+        return StubTextEmbedding(dim)
+    from fastembed import TextEmbedding
+
+    return TextEmbedding(model_name=model_name, threads=threads)
+
+
+def _worker_main(worker_id: int, backend: str, model_name: str, threads: int, dim: int, tasks, results):
+    """Worker process loop. Each worker owns one ONNX session."""
+    os.environ["OMP_NUM_THREADS"] = str(threads)
+    model = create_text_embedding(backend, model_name, dim, threads)
+    results.put(("ready", worker_id, None))
+
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+
+        task_id, shm_name, total_rows, offset, texts = task
+        try:
+            shm = shared_memory.SharedMemory(name=shm_name)
+            try:
+                out = np.ndarray((total_rows, dim), dtype=np.float32, buffer=shm.buf)
+                for i, vector in enumerate(model.embed(texts, batch_size=len(texts))):
+                    out[offset + i] = vector
+                del out
+            finally:
+                shm.close()
+            results.put(("done", task_id, None))
+        except Exception as e:
+            results.put(("error", task_id, f"worker {worker_id}: {e}"))
+
+
+class EmbeddingPool:
+    """Pool of embedding worker processes with shared-memory output."""
+
+    def __init__(
+        self,
+        workers: int,
+        model_name: str,
+        threads_per_worker: int = 1,
+        dim: int = 384,
+        chunk_size: int = 64,
+        backend: str = "fastembed",
+    ):
+        self.workers = workers
+        self.backend = backend
+        self.model_name = model_name
+        self.threads_per_worker = threads_per_worker
+        self.dim = dim
+        self.chunk_size = chunk_size
+
+        self._ctx = None
+        self._processes: List[mp.Process] = []
+        self._task_queues: List[mp.Queue] = []
+        # Per worker: ids of the tasks queued to it and not yet reported
+        self._assigned: List[Set[str]] = []
+        self._results = None
+        # task id -> (future, worker the task was queued to)
+        self._pending: Dict[str, Tuple[Future, int]] = {}
+        self._lock = threading.Lock()
+        self._collector: Optional[threading.Thread] = None
+        self._running = False
+
+    def start(self):
+        """Spawn worker processes and the result collector thread."""
+        if self._running:
+            return
+
+        self._ctx = mp.get_context("spawn")
+        self._results = self._ctx.Queue()
+
+        logger.info(
+            f"Starting embedding pool: {self.workers} workers x "
+            f"{self.threads_per_worker} threads ({self.model_name})"
+        )
+        self._processes = [None] * self.workers
+        self._task_queues = [None] * self.workers
+        self._assigned = [set() for _ in range(self.workers)]
+        for worker_id in range(self.workers):
+            self._spawn(worker_id)
+
+        self._running = True
+        self._collector = threading.Thread(target=self._collect, daemon=True, name="embedding-collector")
+        self._collector.start()
+
+    def _spawn(self, worker_id: int):
+        """Start worker `worker_id` with a fresh task queue."""
+        tasks = self._ctx.Queue()
+        process = self._ctx.Process(
+            target=_worker_main,
+            args=(worker_id, self.backend, self.model_name, self.threads_per_worker, self.dim, tasks, self._results),
+            daemon=True,
+            name=f"embedding-worker-{worker_id}",
+        )
+        process.start()
+        self._task_queues[worker_id] = tasks
+        self._processes[worker_id] = process
+
+    def _replace_dead_workers(self):
+        """
+        Fail the tasks queued to workers that died and start new workers in
+        their place. The old task queue is dropped with the worker: a process
+        killed inside get() never releases the queue's lock.
+        """
+        for worker_id, process in enumerate(self._processes):
+            if process.is_alive() or not self._running:
+                continue
+            logger.error(f"Embedding worker {worker_id} died (exit code {process.exitcode}), restarting it")
+            old_tasks = self._task_queues[worker_id]
+            with self._lock:
+                task_ids, self._assigned[worker_id] = self._assigned[worker_id], set()
+                failed = [self._pending.pop(task_id, (None, None))[0] for task_id in task_ids]
+                self._spawn(worker_id)
+            old_tasks.cancel_join_thread()
+            old_tasks.close()
+            for future in failed:
+                if future is not None and not future.done():
+                    future.set_exception(RuntimeError(f"Embedding worker {worker_id} died"))
+
+    def stop(self):
+        """Stop workers and fail anything still pending."""
+        if not self._running:
+            return
+
+        self._running = False
+        for tasks in self._task_queues:
+            tasks.put(None)
+        for process in self._processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        self._processes = []
+        self._task_queues = []
+        self._fail_pending(RuntimeError("Embedding pool stopped"))
+        logger.info("Embedding pool stopped")
+
+    def _fail_pending(self, error: Exception):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._assigned = [set() for _ in self._assigned]
+        for future, _ in pending.values():
+            if not future.done():
+                future.set_exception(error)
+
+    def _collect(self):
+        """Resolve task futures as workers report back, replacing workers that die."""
+        last_check = time.monotonic()
+        while self._running:
+            try:
+                message = self._results.get(timeout=1.0)
+            except queue.Empty:
+                message = None
+            except (EOFError, OSError):
+                break
+
+            # Also checked under load, when the queue is never empty
+            if message is None or time.monotonic() - last_check >= 1.0:
+                self._replace_dead_workers()
+                last_check = time.monotonic()
+            if message is None:
+                continue
+
+            kind, key, error = message
+            if kind == "ready":
+                logger.info(f"Embedding worker {key} ready")
+                continue
+
+            with self._lock:
+                future, worker_id = self._pending.pop(key, (None, None))
+                if worker_id is not None:
+                    self._assigned[worker_id].discard(key)
+            if future is None or future.done():
+                continue
+            if kind == "done":
+                future.set_result(None)
+            else:
+                future.set_exception(RuntimeError(error))
+
+    def _submit(self, texts: List[str]):
+        """
+        Allocate the output segment and queue one task per chunk, each to the
+        worker with the fewest outstanding tasks.
+        """
+        n = len(texts)
+        shm = shared_memory.SharedMemory(create=True, size=n * self.dim * 4)
+        futures = []
+        for offset in range(0, n, self.chunk_size):
+            task_id = uuid.uuid4().hex
+            future = Future()
+            with self._lock:
+                worker_id = min(range(self.workers), key=lambda w: len(self._assigned[w]))
+                self._assigned[worker_id].add(task_id)
+                self._pending[task_id] = (future, worker_id)
+                self._task_queues[worker_id].put((task_id, shm.name, n, offset, texts[offset:offset + self.chunk_size]))
+            futures.append(future)
+        return shm, futures
+
+    def _collect_output(self, shm: shared_memory.SharedMemory, n: int) -> np.ndarray:
+        return np.ndarray((n, self.dim), dtype=np.float32, buffer=shm.buf).copy()
+
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        """Embed texts without blocking the event loop. Returns an (n, dim) float32 array."""
+        if not texts:
+            return np.empty((0, self.dim), dtype=np.float32)
+        if not self._running:
+            raise RuntimeError("Embedding pool is not running")
+
+        shm, futures = self._submit(texts)
+        try:
+            await asyncio.gather(*(asyncio.wrap_future(f) for f in futures))
+            return self._collect_output(shm, len(texts))
+        finally:
+            shm.close()
+            shm.unlink()
+
+    def embed_sync(self, texts: List[str]) -> np.ndarray:
+        """Blocking variant of embed() for non-async callers."""
+        if not texts:
+            return np.empty((0, self.dim), dtype=np.float32)
+        if not self._running:
+            raise RuntimeError("Embedding pool is not running")
+
+        shm, futures = self._submit(texts)
+        try:
+            for future in futures:
+                future.result()
+            return self._collect_output(shm, len(texts))
+        finally:
+            shm.close()
+            shm.unlink()
+
+
+# Global pool instance (created on first use when enabled)
+_embedding_pool: Optional[EmbeddingPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_embedding_pool() -> Optional[EmbeddingPool]:
+    """Get the embedding pool, or None when EMBEDDING_WORKERS is 0."""
+    global _embedding_pool
+    if settings.EMBEDDING_WORKERS <= 0:
+        return None
+
+    with _pool_lock:
+        if _embedding_pool is None:
+            _embedding_pool = EmbeddingPool(
+                workers=settings.EMBEDDING_WORKERS,
+                model_name=settings.EMBEDDING_MODEL,
+                threads_per_worker=settings.EMBEDDING_THREADS_PER_WORKER,
+                dim=settings.EMBEDDING_DIM,
+                chunk_size=settings.EMBEDDING_BATCH_SIZE,
+                backend=settings.EMBEDDING_BACKEND,
+            )
+            _embedding_pool.start()
+    return _embedding_pool
+
+
+def shutdown_embedding_pool():
+    """Stop the embedding pool if it was started."""
+    global _embedding_pool
+    with _pool_lock:
+        if _embedding_pool is not None:
+            _embedding_pool.stop()
+            _embedding_pool = None
@@ -0,0 +1,337 @@
+"""
+Related-entity discovery from document embedding centroids.
+
+Each entity's centroid is the mean of its documents' unit-normalised
+embeddings, folded in as a running mean when documents are linked to the
+entity, so it never rescans documents. Similar entities are found by cosine
+similarity against every centroid, held in memory as one unit-normalised
+float32 matrix: a query is a single matrix-vector product, bound by memory
+bandwidth (about 150 MB read at 100k entities of 384 dimensions). The
+clustering job groups all entities with spherical k-means over the same
+vectors and stores each one's cluster.
+"""
+import logging
+import math
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import orjson
+import scipy.sparse as sp
+from sqlalchemy import Text, type_coerce, update
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.write_queue import run_write_sync
+from app.models.models import Entity, EntityCentroid, Paper, Patent
+from app.models.schemas import SimilarEntitiesResponse, SimilarEntity
+from app.services.documents import document_embeddings, of_entity
+
+logger = logging.getLogger(__name__)
+
+# Rows scored at once when assigning clusters (bounds the score matrix)
+_ASSIGN_BLOCK = 8192
+
+
+def _unit(vectors: Any) -> np.ndarray:
+    """Rows scaled to unit length (zero rows stay zero)."""
+    matrix = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms > 0, norms, 1.0)
+
+
+def _valid(embedding: Optional[List[float]]) -> bool:
+    return bool(embedding) and len(embedding) == settings.EMBEDDING_DIM
+
+
+class CentroidIndex:
+    """
+    Unit-normalised entity centroids in one matrix, updated in place.
+    Rows are kept dense: a removed entity's row is filled with the last one.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self):
+        self.ids: List[str] = []
+        self._rows: Dict[str, int] = {}
+        # Grown by doubling; only the first len(self.ids) rows are in use
+        self._matrix = np.zeros((0, settings.EMBEDDING_DIM), dtype=np.float32)
+        self.loaded = False
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _add_rows(self, ids: List[str], embeddings: List[List[float]]):
+        """Add or replace centroids in one assignment."""
+        if not ids:
+            return
+        rows = []
+        for entity_id in ids:
+            row = self._rows.get(entity_id)
+            if row is None:
+                row = len(self.ids)
+                self.ids.append(entity_id)
+                self._rows[entity_id] = row
+            rows.append(row)
+        if len(self.ids) > len(self._matrix):
+            capacity = max(1024, 2 * len(self._matrix), len(self.ids))
+            grown = np.zeros((capacity, settings.EMBEDDING_DIM), dtype=np.float32)
+            grown[:len(self._matrix)] = self._matrix
+            self._matrix = grown
+        self._matrix[rows] = _unit(embeddings)
+
+    def update(self, entity_id: str, embedding: Optional[List[float]]):
+        """Add or replace an entity's centroid."""
+        if _valid(embedding):
+            with self._lock:
+                self._add_rows([entity_id], [embedding])
+
+    def remove(self, entity_id: str):
+        with self._lock:
+            row = self._rows.pop(entity_id, None)
+            if row is None:
+                return
+            last = len(self.ids) - 1
+            moved = self.ids.pop()
+            if row != last:
+                self.ids[row] = moved
+                self._rows[moved] = row
+                self._matrix[row] = self._matrix[last]
+
+    def load(self, db: Session):
+        """Read every stored centroid (as raw JSON, decoded with orjson)."""
+        with self._lock:
+            self._reset()
+            query = db.query(EntityCentroid.entity_id, type_coerce(EntityCentroid.embedding, Text))
+            batch_ids, batch = [], []
+            for entity_id, embedding in query.yield_per(2000):
+                batch_ids.append(entity_id)
+                batch.append(embedding)
+                if len(batch) >= 2000:
+                    self._add_valid(batch_ids, batch)
+                    batch_ids, batch = [], []
+            self._add_valid(batch_ids, batch)
+            self.loaded = True
+            logger.info(f"Entity centroid index loaded: {len(self.ids)} entities")
+
+    def _add_valid(self, ids: List[str], embeddings: List[Any]):
+        decoded = [orjson.loads(e) if isinstance(e, (str, bytes)) else e for e in embeddings]
+        keep = [i for i, embedding in enumerate(decoded) if _valid(embedding)]
+        self._add_rows([ids[i] for i in keep], [decoded[i] for i in keep])
+
+    def vector(self, entity_id: str) -> Optional[np.ndarray]:
+        with self._lock:
+            row = self._rows.get(entity_id)
+            return None if row is None else self._matrix[row].copy()
+
+    def snapshot(self) -> Tuple[List[str], np.ndarray]:
+        """Entity IDs and a copy of their unit centroids."""
+        with self._lock:
+            return list(self.ids), self._matrix[:len(self.ids)].copy()
+
+    def search(self, vector: np.ndarray, limit: int, exclude: Optional[str] = None) -> List[Tuple[str, float]]:
+        """Most similar entities as (entity ID, cosine similarity)."""
+        with self._lock:
+            scores = self._matrix[:len(self.ids)] @ vector
+            skip = self._rows.get(exclude) if exclude else None
+            if skip is not None:
+                scores[skip] = -np.inf
+            top = min(limit, len(scores) - (skip is not None))
+            if top <= 0:
+                return []
+            best = np.argpartition(-scores, top - 1)[:top]
+            best = best[np.argsort(-scores[best])]
+            return [(self.ids[i], float(scores[i])) for i in best.tolist()]
+
+
+# Global centroid index (loaded on first similarity query)
+centroid_index = CentroidIndex()
+
+
+# ============== Centroid maintenance ==============
+
+def _fold(db: Session, entity_id: str, embeddings: List[List[float]]) -> Optional[List[float]]:
+    """Fold embeddings into the entity's running mean. Returns the new centroid."""
+    vectors = [embedding for embedding in embeddings if _valid(embedding)]
+    if not vectors:
+        return None
+    row = db.get(EntityCentroid, entity_id)
+    count = row.document_count if row is not None and _valid(row.embedding) else 0
+    total = _unit(vectors).sum(axis=0, dtype=np.float64)
+    if count:
+        total += np.asarray(row.embedding, dtype=np.float64) * count
+    count += len(vectors)
+    centroid = (total / count).astype(np.float32).tolist()
+    if row is None:
+        row = EntityCentroid(entity_id=entity_id)
+        db.add(row)
+    row.embedding = centroid
+    row.document_count = count
+    # Later folds in this transaction (patents, then papers) find the row
+    db.flush([row])
+    return row.embedding
+
+
+def record_documents(
+    db: Session, entity_id: str, kind: str, doc_ids: List[str], documents: List[Dict[str, Any]],
+) -> Optional[List[float]]:
+    """
+    Fold documents newly linked to the entity into its centroid. Documents
+    scraped without an embedding (already stored for another entity) use
+    the stored one. Call within the ingest transaction; once it commits,
+    pass the returned centroid to index_centroid.
+    """
+    embeddings = {doc_id: doc.get("embedding") for doc_id, doc in zip(doc_ids, documents) if doc.get("embedding")}
+    missing = [doc_id for doc_id in doc_ids if doc_id not in embeddings]
+    if missing:
+        embeddings.update(document_embeddings(db, kind, missing))
+    return _fold(db, entity_id, list(embeddings.values()))
+
+
+def index_centroid(entity_id: str, centroid: List[float]):
+    """Update a committed centroid in the index (if it is loaded)."""
+    if centroid_index.loaded:
+        centroid_index.update(entity_id, centroid)
+
+
+def remove_entity(entity_id: str):
+    """Drop a deleted entity from the index."""
+    centroid_index.remove(entity_id)
+
+
+def rebuild_centroid(db: Session, entity_id: str):
+    """
+    Recompute an entity's centroid from its stored documents, as a write
+    (see app.core.write_queue). Only needed to backfill data ingested
+    before centroids were maintained.
+    """
+    db.query(EntityCentroid).filter(EntityCentroid.entity_id == entity_id).delete()
+    for kind, model in (("patents", Patent), ("papers", Paper)):
+        batch = []
+        query = db.query(model.embedding).filter(of_entity(kind, entity_id), model.embedding.isnot(None))
+        for (embedding,) in query.yield_per(1000):
+            batch.append(embedding)
+            if len(batch) >= 1000:
+                _fold(db, entity_id, batch)
+                db.flush()
+                batch = []
+        _fold(db, entity_id, batch)
+
+
+# ============== Queries ==============
+
+def similar_entities(db: Session, entity_id: str, limit: int = 10) -> SimilarEntitiesResponse:
+    """Entities whose document centroids are closest to the entity's."""
+    centroid = db.query(EntityCentroid).filter(EntityCentroid.entity_id == entity_id).first()
+    if centroid is None or not _valid(centroid.embedding):
+        return SimilarEntitiesResponse(entity_id=entity_id, results=[])
+
+    if not centroid_index.loaded:
+        centroid_index.load(db)
+    # Centroids updated by another worker process are not in this index yet
+    centroid_index.update(entity_id, centroid.embedding)
+    hits = centroid_index.search(centroid_index.vector(entity_id), limit, exclude=entity_id)
+
+    rows = {
+        row.id: row
+        for row in db.query(
+            Entity.id, Entity.name, Entity.type, EntityCentroid.cluster, EntityCentroid.document_count,
+        ).join(EntityCentroid, EntityCentroid.entity_id == Entity.id).filter(
+            Entity.id.in_([hit_id for hit_id, _ in hits])
+        )
+    }
+    results = [
+        SimilarEntity(
+            id=hit_id,
+            name=rows[hit_id].name,
+            type=rows[hit_id].type,
+            similarity=round(similarity, 4),
+            near_duplicate=similarity >= settings.ENTITY_NEAR_DUPLICATE_SIMILARITY,
+            cluster=rows[hit_id].cluster,
+            document_count=rows[hit_id].document_count,
+        )
+        # Entities deleted by another worker process are still in this index
+        for hit_id, similarity in hits if hit_id in rows
+    ]
+    return SimilarEntitiesResponse(
+        entity_id=entity_id,
+        cluster=centroid.cluster,
+        document_count=centroid.document_count,
+        results=results,
+    )
+
+
+# ============== Clustering ==============
+
+def _assign(matrix: np.ndarray, centers: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Nearest center of each row (by cosine) and the similarity to it."""
+    labels = np.empty(len(matrix), dtype=np.int64)
+    best = np.empty(len(matrix), dtype=np.float32)
+    for start in range(0, len(matrix), _ASSIGN_BLOCK):
+        scores = matrix[start:start + _ASSIGN_BLOCK] @ centers.T
+        labels[start:start + len(scores)] = scores.argmax(axis=1)
+        best[start:start + len(scores)] = scores.max(axis=1)
+    return labels, best
+
+
+def spherical_kmeans(matrix: np.ndarray, k: int, iterations: int, seed: int = 0) -> np.ndarray:
+    """
+    Cluster unit rows by cosine similarity. A cluster left empty is
+    re-seeded with the row furthest from its center. Returns dense labels.
+    """
+    n = len(matrix)
+    k = max(1, min(k, n))
+    rng = np.random.default_rng(seed)
+    centers = matrix[rng.choice(n, size=k, replace=False)].copy()
+    labels = np.full(n, -1, dtype=np.int64)
+    for _ in range(iterations):
+        new_labels, best = _assign(matrix, centers)
+        if np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+        membership = sp.csr_matrix((np.ones(n, dtype=np.float32), (labels, np.arange(n))), shape=(k, n))
+        sums = np.asarray(membership @ matrix)
+        norms = np.linalg.norm(sums, axis=1)
+        centers = sums / np.where(norms > 0, norms, 1.0)[:, None]
+        empty = np.flatnonzero(norms == 0)
+        if len(empty):
+            centers[empty] = matrix[np.argsort(best)[:len(empty)]]
+    return np.unique(labels, return_inverse=True)[1]
+
+
+def _store_clusters(db: Session, rows: List[Dict[str, Any]]):
+    db.execute(update(EntityCentroid), rows)
+
+
+def cluster_entities(db: Session, clusters: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Cluster every entity with a centroid (read with `db`) and store the
+    clusters through the write path. Returns a summary of the run.
+    """
+    start = time.perf_counter()
+    index = CentroidIndex()
+    index.load(db)
+    ids, matrix = index.snapshot()
+    if not ids:
+        return {"entities": 0, "clusters": 0, "seconds": 0.0}
+
+    k = clusters or settings.ENTITY_CLUSTERS or max(1, round(math.sqrt(len(ids) / 2)))
+    labels = spherical_kmeans(matrix, k, settings.ENTITY_CLUSTER_ITERATIONS)
+    db.rollback()
+    for offset in range(0, len(ids), 2000):
+        run_write_sync(_store_clusters, [
+            {"entity_id": entity_id, "cluster": label}
+            for entity_id, label in zip(ids[offset:offset + 2000], labels[offset:offset + 2000].tolist())
+        ])
+
+    summary = {
+        "entities": len(ids),
+        "clusters": int(labels.max()) + 1,
+        "seconds": round(time.perf_counter() - start, 2),
+    }
+    logger.info(f"Clustered {summary['entities']} entities into {summary['clusters']} clusters")
+    return summary
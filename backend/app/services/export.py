@@ -0,0 +1,196 @@
+"""
+Bulk export service.
+Streams entities, patents, papers, personnel and the entity-document links
+(optionally with document embeddings) as JSONL or Parquet.
+
+Rows are read through a server-side cursor (yield_per) and encoded one
+batch at a time, so memory use depends on EXPORT_BATCH_SIZE rather than on
+the number of rows exported. Embeddings are written as float32: fixed-size
+list columns in Parquet, arrays of numbers in JSONL.
+"""
+import io
+import logging
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+import orjson
+import pyarrow as pa
+import pyarrow.parquet as pq
+from sqlalchemy import JSON, Boolean, DateTime, Float, Integer, Text, select, type_coerce
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.models import Entity, EntityPaper, EntityPatent, Patent, Paper, Personnel
+from app.services.documents import DOCUMENT_KINDS, of_entity
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMATS = ("jsonl", "parquet")
+
+EXPORT_MODELS = {
+    "entities": Entity,
+    "patents": Patent,
+    "papers": Paper,
+    "personnel": Personnel,
+    "entity_patents": EntityPatent,
+    "entity_papers": EntityPaper,
+}
+
+# Columns never exported as-is
+_SKIPPED_COLUMNS = {"embedding", "analysis_report"}
+
+
+def _export_columns(model, include_embeddings: bool) -> List:
+    """Selected columns for a model; embeddings come back as raw JSON text."""
+    columns = [column for column in model.__table__.columns if column.name not in _SKIPPED_COLUMNS]
+    if include_embeddings and "embedding" in model.__table__.columns:
+        columns.append(type_coerce(model.__table__.c.embedding, Text).label("embedding"))
+    return columns
+
+
+def _arrow_type(column) -> pa.DataType:
+    if column.name == "embedding":
+        return pa.list_(pa.float32(), settings.EMBEDDING_DIM)
+    if isinstance(column.type, JSON):
+        return pa.list_(pa.string())
+    if isinstance(column.type, DateTime):
+        return pa.timestamp("us")
+    if isinstance(column.type, Integer):
+        return pa.int64()
+    if isinstance(column.type, Float):
+        return pa.float64()
+    if isinstance(column.type, Boolean):
+        return pa.bool_()
+    return pa.string()
+
+
+def arrow_schema(kind: str, include_embeddings: bool = False) -> pa.Schema:
+    """Parquet schema of an export."""
+    return pa.schema([
+        pa.field(column.name, _arrow_type(column))
+        for column in _export_columns(EXPORT_MODELS[kind], include_embeddings)
+    ])
+
+
+def _embedding_matrix(values: Sequence[Any]) -> tuple:
+    """
+    Stack a batch of stored embeddings into a float32 matrix.
+    Returns (matrix, valid) where rows without an embedding of the
+    configured dimension are zero and marked invalid.
+    """
+    dim = settings.EMBEDDING_DIM
+    matrix = np.zeros((len(values), dim), dtype=np.float32)
+    valid = np.zeros(len(values), dtype=bool)
+    for i, value in enumerate(values):
+        if isinstance(value, (str, bytes)):
+            value = orjson.loads(value)
+        if value is not None and len(value) == dim:
+            matrix[i] = value
+            valid[i] = True
+    return matrix, valid
+
+
+def _batches(db: Session, kind: str, entity_id: Optional[str], include_embeddings: bool) -> Iterator[Sequence]:
+    """Rows of an export in batches, streamed from a server-side cursor."""
+    model = EXPORT_MODELS[kind]
+    query = select(*_export_columns(model, include_embeddings)).order_by(*model.__table__.primary_key)
+    if entity_id:
+        if model is Entity:
+            query = query.where(model.id == entity_id)
+        elif kind in DOCUMENT_KINDS:
+            query = query.where(of_entity(kind, entity_id))
+        else:
+            query = query.where(model.entity_id == entity_id)
+    result = db.execute(query.execution_options(yield_per=settings.EXPORT_BATCH_SIZE))
+    yield from result.partitions()
+
+
+def _jsonl_chunk(names: List[str], rows: Sequence) -> bytes:
+    columns = list(zip(*rows))
+    if "embedding" in names:
+        position = names.index("embedding")
+        matrix, valid = _embedding_matrix(columns[position])
+        columns[position] = [row if ok else None for row, ok in zip(matrix, valid)]
+    return b"".join(
+        orjson.dumps(dict(zip(names, values)), option=orjson.OPT_SERIALIZE_NUMPY) + b"\n"
+        for values in zip(*columns)
+    )
+
+
+def _record_batch(schema: pa.Schema, rows: Sequence) -> pa.RecordBatch:
+    columns = list(zip(*rows))
+    arrays = []
+    for field, values in zip(schema, columns):
+        if field.name == "embedding":
+            matrix, valid = _embedding_matrix(values)
+            arrays.append(pa.FixedSizeListArray.from_arrays(
+                pa.array(matrix.ravel()), settings.EMBEDDING_DIM, mask=pa.array(~valid),
+            ))
+        else:
+            arrays.append(pa.array(values, type=field.type))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only stream that hands written bytes back in chunks."""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def iter_export(
+    kind: str,
+    fmt: str = "jsonl",
+    entity_id: Optional[str] = None,
+    include_embeddings: bool = False,
+    session_factory: Callable[[], Session] = SessionLocal,
+) -> Iterator[bytes]:
+    """
+    Encoded export as a stream of byte chunks (one per batch of rows).
+    Opens its own session from `session_factory` once iteration starts, so
+    it can run after the request's session has closed and holds no
+    connection if the stream is never read.
+    """
+    if kind not in EXPORT_MODELS:
+        raise ValueError(f"Unknown export: {kind}")
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format: {fmt}")
+
+    db = session_factory()
+    rows_written = 0
+    try:
+        if fmt == "jsonl":
+            names = arrow_schema(kind, include_embeddings).names
+            for rows in _batches(db, kind, entity_id, include_embeddings):
+                rows_written += len(rows)
+                yield _jsonl_chunk(names, rows)
+        else:
+            schema = arrow_schema(kind, include_embeddings)
+            sink = _ChunkSink()
+            with pq.ParquetWriter(sink, schema, compression="zstd") as writer:
+                for rows in _batches(db, kind, entity_id, include_embeddings):
+                    rows_written += len(rows)
+                    writer.write_batch(_record_batch(schema, rows))
+                    yield sink.drain()
+            yield sink.drain()
+        logger.info(f"Exported {rows_written} {kind} as {fmt}")
+    finally:
+        db.close()
@@ -0,0 +1,276 @@
+"""
+Gap analysis service.
+Maintains per-entity, per-domain scores incrementally as documents are
+ingested, and compares them with DRDO capability scores.
+
+Scores are read from EntityDomainScore in O(domains); documents are never
+rescanned at query time. Recency decay is applied at read time: each
+document adds `weight * 2^((date - epoch) / half_life)` to the stored mass,
+and multiplying by `2^(-(now - epoch) / half_life)` decays every document
+to "now" at once. The multiplier is the same for every entity, so ranking
+by stored mass is ranking by decayed score.
+"""
+import logging
+import math
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.core.write_queue import run_write_sync
+from app.models.models import (
+    Entity, EntityDomainScore, EntityPaper, EntityPatent, DRDOCapability, Patent, Paper,
+)
+from app.models.schemas import (
+    GapAnalysisItem,
+    GapAnalysisResponse,
+    GapRankingItem,
+    GapRankingResponse,
+)
+from app.services.documents import of_entity
+
+logger = logging.getLogger(__name__)
+
+# Reference point for recency mass (keeps exponents small)
+RECENCY_EPOCH = datetime(2000, 1, 1)
+
+
+def _naive_utc(value: Optional[datetime]) -> datetime:
+    if value is None:
+        return datetime.utcnow()
+    if value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _epoch_days(value: datetime) -> float:
+    return (_naive_utc(value) - RECENCY_EPOCH).total_seconds() / 86400
+
+
+def citation_weight(citations: Optional[int]) -> float:
+    """Weight of one document: 1 + ln(1 + citations)."""
+    return 1.0 + math.log1p(max(citations or 0, 0))
+
+
+def recency_factor(date: Optional[datetime]) -> float:
+    """Growth factor stored at ingest for a document dated `date`."""
+    return 2.0 ** (_epoch_days(date) / settings.GAP_RECENCY_HALF_LIFE_DAYS)
+
+
+def decay_factor(now: Optional[datetime] = None) -> float:
+    """Multiplier that decays stored recency mass to `now`."""
+    return 2.0 ** (-_epoch_days(now or datetime.utcnow()) / settings.GAP_RECENCY_HALF_LIFE_DAYS)
+
+
+def score_from_mass(recency_mass: float, decay: float) -> float:
+    """Map decayed mass to a 0-100 score that saturates with activity."""
+    decayed = (recency_mass or 0.0) * decay
+    return round(100.0 * (1.0 - math.exp(-decayed / settings.GAP_SCORE_SCALE)), 1)
+
+
+def mass_for_score(score: float, decay: float) -> float:
+    """Inverse of score_from_mass: stored mass needed to reach `score`."""
+    if score >= 100.0:
+        return math.inf
+    if score <= 0.0:
+        return 0.0
+    return -settings.GAP_SCORE_SCALE * math.log(1.0 - score / 100.0) / decay
+
+
+def drdo_scores(db: Session) -> Dict[str, float]:
+    """DRDO capability score per technology domain."""
+    return {
+        c.technology_domain: c.capability_score or 0.0
+        for c in db.query(DRDOCapability).all()
+    }
+
+
+def record_documents(db: Session, entity_id: str, kind: str, documents: List[Dict[str, Any]]):
+    """
+    Fold newly ingested documents into the entity's domain scores.
+    Call within the ingest transaction; the caller commits.
+    """
+    deltas = defaultdict(lambda: {"patent_count": 0, "paper_count": 0, "citation_weight": 0.0, "recency_mass": 0.0})
+    count_field = "patent_count" if kind == "patents" else "paper_count"
+    date_field = "filing_date" if kind == "patents" else "publication_date"
+
+    for doc in documents:
+        domains = set(doc.get("technologies") or [])
+        if not domains:
+            continue
+        weight = citation_weight(doc.get("citation_count"))
+        mass = weight * recency_factor(doc.get(date_field))
+        for domain in domains:
+            delta = deltas[domain]
+            delta[count_field] += 1
+            delta["citation_weight"] += weight
+            delta["recency_mass"] += mass
+
+    if not deltas:
+        return
+
+    existing = {
+        row.domain: row
+        for row in db.query(EntityDomainScore).filter(
+            EntityDomainScore.entity_id == entity_id,
+            EntityDomainScore.domain.in_(list(deltas)),
+        ).all()
+    }
+    for domain, delta in deltas.items():
+        row = existing.get(domain)
+        if row is None:
+            row = EntityDomainScore(
+                entity_id=entity_id,
+                domain=domain,
+                patent_count=0,
+                paper_count=0,
+                citation_weight=0.0,
+                recency_mass=0.0,
+            )
+            db.add(row)
+        for field, value in delta.items():
+            setattr(row, field, (getattr(row, field) or 0) + value)
+
+
+def rebuild_domain_scores(db: Session, entity_id: str):
+    """
+    Recompute an entity's domain scores from its stored documents, as a
+    write (see app.core.write_queue). Only needed to backfill data ingested
+    before scores were maintained.
+    """
+    db.query(EntityDomainScore).filter(EntityDomainScore.entity_id == entity_id).delete()
+    sources = (
+        ("patents", "filing_date", db.query(
+            Patent.technologies, Patent.filing_date,
+        ).filter(of_entity("patents", entity_id))),
+        ("papers", "publication_date", db.query(
+            Paper.technologies, Paper.publication_date, Paper.citation_count,
+        ).filter(of_entity("papers", entity_id))),
+    )
+    for kind, date_field, query in sources:
+        batch = []
+        for row in query.yield_per(1000):
+            batch.append({
+                "technologies": row[0],
+                date_field: row[1],
+                "citation_count": row[2] if kind == "papers" else 0,
+            })
+            if len(batch) >= 1000:
+                record_documents(db, entity_id, kind, batch)
+                db.flush()
+                batch = []
+        record_documents(db, entity_id, kind, batch)
+
+
+def backfill_domain_scores() -> int:
+    """
+    Build domain scores for every entity with documents when there are no
+    scores at all (a database from before scores were maintained). Each
+    entity is one write. Returns the number of entities rebuilt.
+    """
+    db = SessionLocal()
+    try:
+        if db.query(EntityDomainScore.entity_id).first() is not None:
+            return 0
+        entity_ids = [
+            entity_id for (entity_id,) in db.query(EntityPatent.entity_id).union(db.query(EntityPaper.entity_id))
+        ]
+    finally:
+        db.close()
+    for entity_id in entity_ids:
+        run_write_sync(rebuild_domain_scores, entity_id)
+    if entity_ids:
+        logger.info(f"Backfilled domain scores for {len(entity_ids)} entities")
+    return len(entity_ids)
+
+
+def get_gap_analysis(db: Session, entity: Entity) -> GapAnalysisResponse:
+    """Compare an entity's domain scores with DRDO capabilities."""
+    decay = decay_factor()
+    capabilities = drdo_scores(db)
+    rows = {
+        row.domain: row
+        for row in db.query(EntityDomainScore).filter(EntityDomainScore.entity_id == entity.id).all()
+    }
+
+    analysis = []
+    for domain in sorted(set(rows) | set(capabilities)):
+        row = rows.get(domain)
+        entity_score = score_from_mass(row.recency_mass, decay) if row else 0.0
+        drdo_score = capabilities.get(domain, 0.0)
+        analysis.append(GapAnalysisItem(
+            domain=domain,
+            entity_score=entity_score,
+            drdo_score=drdo_score,
+            gap=round(entity_score - drdo_score, 1),
+            patent_count=(row.patent_count or 0) if row else 0,
+            paper_count=(row.paper_count or 0) if row else 0,
+        ))
+
+    critical = sum(1 for item in analysis if item.gap >= settings.GAP_CRITICAL_THRESHOLD)
+    collaboration = sum(
+        1 for item in analysis
+        if item.entity_score > 0 and abs(item.gap) <= settings.GAP_COLLABORATION_BAND
+    )
+
+    return GapAnalysisResponse(
+        entity_id=entity.id,
+        entity_name=entity.name,
+        analysis=analysis,
+        critical_gaps=critical,
+        collaboration_opportunities=collaboration,
+    )
+
+
+def rank_entities(db: Session, domain: str, limit: int = 20) -> GapRankingResponse:
+    """Rank entities by their score in one domain (highest lead over DRDO first)."""
+    decay = decay_factor()
+    drdo_score = drdo_scores(db).get(domain, 0.0)
+
+    rows = (
+        db.query(EntityDomainScore, Entity.name)
+        .join(Entity, Entity.id == EntityDomainScore.entity_id)
+        .filter(EntityDomainScore.domain == domain)
+        .order_by(EntityDomainScore.recency_mass.desc())
+        .limit(limit)
+        .all()
+    )
+
+    items = []
+    for score_row, entity_name in rows:
+        entity_score = score_from_mass(score_row.recency_mass, decay)
+        items.append(GapRankingItem(
+            entity_id=score_row.entity_id,
+            entity_name=entity_name,
+            entity_score=entity_score,
+            drdo_score=drdo_score,
+            gap=round(entity_score - drdo_score, 1),
+            patent_count=score_row.patent_count or 0,
+            paper_count=score_row.paper_count or 0,
+        ))
+
+    return GapRankingResponse(domain=domain, drdo_score=drdo_score, items=items)
+
+
+def count_critical_gaps(db: Session) -> int:
+    """
+    Number of (entity, domain) pairs where the entity leads DRDO by at least
+    GAP_CRITICAL_THRESHOLD. One indexed count per domain.
+    """
+    decay = decay_factor()
+    capabilities = drdo_scores(db)
+    domains = {d for (d,) in db.query(EntityDomainScore.domain).distinct().all()}
+
+    total = 0
+    for domain in domains:
+        threshold = mass_for_score(capabilities.get(domain, 0.0) + settings.GAP_CRITICAL_THRESHOLD, decay)
+        if math.isinf(threshold):
+            continue
+        total += db.query(EntityDomainScore).filter(
+            EntityDomainScore.domain == domain,
+            EntityDomainScore.recency_mass >= threshold,
+        ).count()
+    return total
@@ -0,0 +1,186 @@
+"""
+Technology heatmap service.
+Keeps the entity x technology document-count matrix for all entities in
+memory, built from the incrementally maintained EntityDomainScore table,
+and serves normalised views of it.
+
+The matrix is loaded once. Ingest marks the affected entity dirty and only
+that entity's row is re-read on the next request; encoded responses are
+cached per normalisation mode until the matrix changes.
+"""
+import logging
+import threading
+from typing import Dict, Iterable, List, Set
+
+import numpy as np
+import orjson
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.models.models import Entity, EntityDomainScore
+
+logger = logging.getLogger(__name__)
+
+HEATMAP_MODES = ("count", "row", "column", "tfidf")
+
+
+def normalise(counts: np.ndarray, mode: str) -> np.ndarray:
+    """
+    Normalise a count matrix.
+
+    - count: raw document counts
+    - row: share of each entity's documents per technology
+    - column: share of each technology's documents per entity
+    - tfidf: row shares weighted by how few entities work on the technology
+    """
+    if mode == "count" or counts.size == 0:
+        return counts
+    if mode == "row":
+        totals = counts.sum(axis=1, keepdims=True)
+        return np.divide(counts, totals, out=np.zeros_like(counts), where=totals > 0)
+    if mode == "column":
+        totals = counts.sum(axis=0, keepdims=True)
+        return np.divide(counts, totals, out=np.zeros_like(counts), where=totals > 0)
+    if mode == "tfidf":
+        tf = normalise(counts, "row")
+        document_frequency = (counts > 0).sum(axis=0)
+        idf = np.log((1 + counts.shape[0]) / (1 + document_frequency)) + 1.0
+        return tf * idf
+    raise ValueError(f"Unknown heatmap mode: {mode}")
+
+
+class HeatmapMatrix:
+    """
+    Dense document counts with entity rows and technology columns.
+    Rows with no documents are dropped when the matrix is encoded.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self):
+        self.entity_ids: List[str] = []
+        self.entity_names: List[str] = []
+        self.technologies: List[str] = []
+        self._entity_index: Dict[str, int] = {}
+        self._technology_index: Dict[str, int] = {}
+        self.counts = np.zeros((0, 0), dtype=np.float64)
+        self._dirty: Set[str] = set()
+        self._encoded: Dict[str, bytes] = {}
+        self.loaded = False
+
+    def _intern(self, keys: Iterable[str], index: Dict[str, int], labels: List[str]) -> np.ndarray:
+        """Map keys to row/column positions, appending unseen ones."""
+        positions = []
+        for key in keys:
+            pos = index.get(key)
+            if pos is None:
+                pos = index[key] = len(labels)
+                labels.append(key)
+            positions.append(pos)
+        return np.asarray(positions, dtype=np.int64)
+
+    def _scatter(self, rows):
+        """Add (entity_id, domain, count) rows into the matrix, growing it as needed."""
+        if not rows:
+            return
+        entity_keys, domain_keys, values = zip(*rows)
+        entity_idx = self._intern(entity_keys, self._entity_index, self.entity_ids)
+        domain_idx = self._intern(domain_keys, self._technology_index, self.technologies)
+
+        shape = (len(self.entity_ids), len(self.technologies))
+        if shape != self.counts.shape:
+            grown = np.zeros(shape, dtype=np.float64)
+            grown[: self.counts.shape[0], : self.counts.shape[1]] = self.counts
+            self.counts = grown
+        np.add.at(self.counts, (entity_idx, domain_idx), np.asarray(values, dtype=np.float64))
+
+    def load(self, db: Session):
+        """Build the full matrix with one scan of the domain score table."""
+        with self._lock:
+            self._reset()
+            self._scatter(db.execute(select(
+                EntityDomainScore.entity_id,
+                EntityDomainScore.domain,
+                EntityDomainScore.patent_count + EntityDomainScore.paper_count,
+            )).all())
+            names = dict(db.execute(select(Entity.id, Entity.name)).all())
+            self.entity_names = [names.get(i, "") for i in self.entity_ids]
+            self.loaded = True
+            logger.info(f"Heatmap loaded: {len(self.entity_ids)} entities x {len(self.technologies)} technologies")
+
+    def mark_dirty(self, entity_id: str):
+        """Re-read this entity's row on the next request."""
+        with self._lock:
+            self._dirty.add(entity_id)
+            self._encoded.clear()
+
+    def _refresh(self, db: Session):
+        """Re-read the rows of entities changed since the last request."""
+        if not self._dirty:
+            return
+        dirty = list(self._dirty)
+        self._dirty.clear()
+
+        known = [self._entity_index[i] for i in dirty if i in self._entity_index]
+        self.counts[known, :] = 0.0
+        self._scatter(db.execute(select(
+            EntityDomainScore.entity_id,
+            EntityDomainScore.domain,
+            EntityDomainScore.patent_count + EntityDomainScore.paper_count,
+        ).where(EntityDomainScore.entity_id.in_(dirty))).all())
+
+        names = dict(db.execute(select(Entity.id, Entity.name).where(Entity.id.in_(dirty))).all())
+        self.entity_names.extend([""] * (len(self.entity_ids) - len(self.entity_names)))
+        for entity_id in dirty:
+            pos = self._entity_index.get(entity_id)
+            if pos is None:
+                continue
+            if entity_id in names:
+                self.entity_names[pos] = names[entity_id]
+            else:
+                # Deleted entity: leave an empty row, skipped when encoding
+                self.counts[pos, :] = 0.0
+
+    def encode(self, db: Session, mode: str) -> bytes:
+        """JSON heatmap for a normalisation mode, from cache when possible."""
+        with self._lock:
+            if not self.loaded:
+                self.load(db)
+            self._refresh(db)
+
+            encoded = self._encoded.get(mode)
+            if encoded is not None:
+                return encoded
+
+            # Active entities only; most active technologies first
+            active = np.flatnonzero(self.counts.sum(axis=1) > 0)
+            counts = self.counts[active]
+            totals = counts.sum(axis=0)
+            order = np.flatnonzero(totals > 0)
+            order = order[np.argsort(-totals[order], kind="stable")]
+            values = np.round(normalise(counts[:, order], mode), 4)
+
+            encoded = orjson.dumps({
+                "mode": mode,
+                "entities": [{"id": self.entity_ids[i], "name": self.entity_names[i]} for i in active.tolist()],
+                "technologies": [self.technologies[j] for j in order.tolist()],
+                "values": np.ascontiguousarray(values),
+            }, option=orjson.OPT_SERIALIZE_NUMPY)
+            self._encoded[mode] = encoded
+            return encoded
+
+
+# Global matrix (loaded on first request)
+heatmap_matrix = HeatmapMatrix()
+
+
+def invalidate(entity_id: str):
+    """Mark an entity's row stale after ingest or deletion."""
+    heatmap_matrix.mark_dirty(entity_id)
+
+
+def get_heatmap_json(db: Session, mode: str = "count") -> bytes:
+    """Encoded heatmap response for a normalisation mode."""
+    return heatmap_matrix.encode(db, mode)
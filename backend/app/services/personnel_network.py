@@ -0,0 +1,248 @@
+"""
+Co-authorship network and personnel clustering.
+
+A global co-author graph is built from Paper.authors across all entities
+(sparse, symmetric, weighted by number of joint papers) and extended as new
+papers are ingested. For each entity, its researchers are clustered with
+label propagation over that graph, and each researcher gets an expertise
+embedding averaged from their papers' embeddings. Results are cached per
+entity and invalidated when the entity's papers change.
+"""
+import logging
+import threading
+from collections import Counter
+from itertools import combinations
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+import scipy.sparse as sp
+from sqlalchemy.orm import Session
+
+from app.models.models import Paper, Personnel
+from app.models.schemas import PersonnelCluster, PersonnelClusterResponse, PersonnelResponse
+from app.services.documents import of_entity
+
+logger = logging.getLogger(__name__)
+
+# Papers with huge author lists add little signal and many edges
+MAX_AUTHORS_PER_PAPER = 25
+
+
+class CoauthorGraph:
+    """Global weighted co-author graph as a sparse matrix."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._loading = False
+        self._reset()
+        self.loaded = False
+
+    def _reset(self):
+        self._names: List[str] = []
+        self._lookup: Dict[str, int] = {}
+        self._rows: List[int] = []
+        self._cols: List[int] = []
+        self._matrix = sp.csr_matrix((0, 0), dtype=np.float32)
+
+    def _node(self, name: str) -> int:
+        idx = self._lookup.get(name)
+        if idx is None:
+            idx = len(self._names)
+            self._names.append(name)
+            self._lookup[name] = idx
+        return idx
+
+    def add_papers(self, author_lists: Iterable[List[str]]):
+        """Buffer co-author pairs from papers; merged into the matrix on next use."""
+        with self._lock:
+            for authors in author_lists:
+                unique = sorted({a for a in (authors or [])[:MAX_AUTHORS_PER_PAPER] if a})
+                ids = [self._node(a) for a in unique]
+                for i, j in combinations(ids, 2):
+                    self._rows.append(i)
+                    self._cols.append(j)
+
+    def load(self, db: Session):
+        """
+        Build the graph from every stored paper's author list. Callers that
+        waited for another thread's load reuse its graph.
+        """
+        with self._lock:
+            if self.loaded or self._loading:
+                return
+            self._loading = True
+            try:
+                self._reset()
+                batch = []
+                for (authors,) in db.query(Paper.authors).yield_per(5000):
+                    batch.append(authors)
+                    if len(batch) >= 5000:
+                        self.add_papers(batch)
+                        batch = []
+                self.add_papers(batch)
+                self.loaded = True
+            finally:
+                self._loading = False
+            logger.info(f"Co-author graph loaded: {len(self._names)} authors")
+
+    def matrix(self) -> sp.csr_matrix:
+        """Symmetric co-authorship matrix, merging buffered pairs."""
+        with self._lock:
+            n = len(self._names)
+            if self._rows or self._matrix.shape[0] != n:
+                rows = np.asarray(self._rows, dtype=np.int64)
+                cols = np.asarray(self._cols, dtype=np.int64)
+                delta = sp.coo_matrix(
+                    (np.ones(len(rows), dtype=np.float32), (rows, cols)), shape=(n, n)
+                ).tocsr()
+                current = self._matrix
+                if current.shape[0] != n:
+                    current = sp.csr_matrix(
+                        (current.data, current.indices, np.pad(current.indptr, (0, n - current.shape[0]), mode="edge")),
+                        shape=(n, n),
+                    )
+                self._matrix = (current + delta + delta.T).tocsr()
+                self._rows, self._cols = [], []
+            return self._matrix
+
+    def subgraph(self, names: List[str]) -> sp.csr_matrix:
+        """Co-authorship among `names` (unknown names become isolated nodes)."""
+        matrix = self.matrix()
+        with self._lock:
+            idx = np.array([self._lookup.get(name, -1) for name in names], dtype=np.int64)
+        known = np.flatnonzero(idx >= 0)
+        block = matrix[idx[known]][:, idx[known]].tocoo()
+        return sp.coo_matrix(
+            (block.data, (known[block.row], known[block.col])),
+            shape=(len(names), len(names)),
+        ).tocsr()
+
+
+def label_propagation(adjacency: sp.csr_matrix, max_iter: int = 30) -> np.ndarray:
+    """
+    Vectorised synchronous label propagation.
+
+    Each node also votes for its own label with the weight of its strongest
+    edge, and ties go to the smallest label, which prevents the label
+    swapping synchronous propagation is prone to. Returns dense cluster IDs.
+    """
+    n = adjacency.shape[0]
+    if n == 0:
+        return np.empty(0, dtype=np.int64)
+
+    row_max = adjacency.max(axis=1).toarray().ravel()
+    votes_matrix = (adjacency + sp.diags(np.where(row_max > 0, row_max, 1.0))).tocsr()
+    labels = np.arange(n)
+    node_ids = np.arange(n)
+    for _ in range(max_iter):
+        one_hot = sp.csr_matrix((np.ones(n, dtype=np.float32), (node_ids, labels)), shape=(n, n))
+        votes = votes_matrix @ one_hot
+        new_labels = np.asarray(votes.argmax(axis=1)).ravel()
+        if np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+    return np.unique(labels, return_inverse=True)[1]
+
+
+def expertise_embeddings(db: Session, entity_id: str, names: List[str]) -> Optional[np.ndarray]:
+    """Per-person mean of their papers' embeddings (unit-normalised), or None."""
+    lookup = {name: i for i, name in enumerate(names)}
+    rows, cols, vectors = [], [], []
+    for authors, embedding in db.query(Paper.authors, Paper.embedding).filter(
+        of_entity("papers", entity_id), Paper.embedding.isnot(None)
+    ).yield_per(2000):
+        if not embedding:
+            continue
+        paper_idx = len(vectors)
+        vectors.append(embedding)
+        for author in set(authors or []):
+            if author in lookup:
+                rows.append(lookup[author])
+                cols.append(paper_idx)
+
+    if not vectors:
+        return None
+
+    papers = np.asarray(vectors, dtype=np.float32)
+    incidence = sp.csr_matrix(
+        (np.ones(len(rows), dtype=np.float32), (rows, cols)), shape=(len(names), len(vectors))
+    )
+    counts = np.asarray(incidence.sum(axis=1)).ravel()
+    means = (incidence @ papers) / np.maximum(counts, 1.0)[:, None]
+    norms = np.linalg.norm(means, axis=1, keepdims=True)
+    return means / np.where(norms > 0, norms, 1.0)
+
+
+# Global graph and per-entity cluster cache
+coauthor_graph = CoauthorGraph()
+_cluster_cache: Dict[str, PersonnelClusterResponse] = {}
+# Bumped on every invalidation, so clusters computed meanwhile are not cached
+_cache_versions: Dict[str, int] = {}
+_cache_lock = threading.Lock()
+
+
+def invalidate_entity(entity_id: str):
+    """Drop an entity's cached clusters."""
+    with _cache_lock:
+        _cluster_cache.pop(entity_id, None)
+        _cache_versions[entity_id] = _cache_versions.get(entity_id, 0) + 1
+
+
+def record_papers(entity_id: str, papers: List[Dict]):
+    """Extend the co-author graph with new papers and invalidate the entity."""
+    if coauthor_graph.loaded:
+        coauthor_graph.add_papers(p.get("authors") or [] for p in papers)
+    invalidate_entity(entity_id)
+
+
+def _compute_clusters(db: Session, entity_id: str) -> PersonnelClusterResponse:
+    people = db.query(Personnel).filter(Personnel.entity_id == entity_id).all()
+    names = [p.name for p in people]
+
+    if not coauthor_graph.loaded:
+        coauthor_graph.load(db)
+    labels = label_propagation(coauthor_graph.subgraph(names))
+    embeddings = expertise_embeddings(db, entity_id, names)
+
+    clusters = []
+    for cluster_id in range(int(labels.max()) + 1 if len(labels) else 0):
+        members = np.flatnonzero(labels == cluster_id)
+        expertise = Counter()
+        for i in members:
+            expertise.update(people[i].expertise or [])
+
+        cohesion = None
+        if embeddings is not None:
+            vectors = embeddings[members]
+            vectors = vectors[np.linalg.norm(vectors, axis=1) > 0]
+            if len(vectors):
+                centroid = vectors.mean(axis=0)
+                centroid /= np.linalg.norm(centroid) or 1.0
+                cohesion = round(float((vectors @ centroid).mean()), 4)
+
+        ordered = sorted(members, key=lambda i: -(people[i].publication_count or 0))
+        clusters.append(PersonnelCluster(
+            cluster_id=cluster_id,
+            size=len(members),
+            top_expertise=[t for t, _ in expertise.most_common(3)],
+            cohesion=cohesion,
+            members=[PersonnelResponse.model_validate(people[i], from_attributes=True) for i in ordered],
+        ))
+
+    clusters.sort(key=lambda c: -c.size)
+    return PersonnelClusterResponse(entity_id=entity_id, total_personnel=len(people), clusters=clusters)
+
+
+def get_personnel_clusters(db: Session, entity_id: str) -> PersonnelClusterResponse:
+    """Cached personnel clusters for an entity (computed on first request)."""
+    with _cache_lock:
+        cached = _cluster_cache.get(entity_id)
+        version = _cache_versions.get(entity_id, 0)
+    if cached is not None:
+        return cached
+
+    result = _compute_clusters(db, entity_id)
+    with _cache_lock:
+        if _cache_versions.get(entity_id, 0) == version:
+            _cluster_cache[entity_id] = result
+    return result
@@ -0,0 +1,315 @@
+"""
+Opt-in profiling of single analysis jobs.
+
+A profiled job is run as its own task while three collectors are active:
+
+- cProfile on the event-loop thread (profile.pstats, profile.txt)
+- a stack sampler over every thread, so work handed to asyncio.to_thread
+  (embeddings, parsing) shows up too (stacks.txt, in the folded format
+  read by flamegraph.pl and speedscope)
+- an asyncio task timeline: each task the job creates, when it ran and
+  for how long, plus event-loop lag (timeline.json, in the Chrome trace
+  format read by Perfetto and chrome://tracing)
+
+Artifacts are written to PROFILE_DIR/<profile id>/ with a meta.json.
+Jobs that are not profiled only pay for the sampling-rate check. cProfile
+covers one job at a time; while a profile is running, other jobs are not
+profiled.
+"""
+import asyncio
+import collections.abc
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import random
+import re
+import shutil
+import sys
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Files written for each profile, in listing order
+ARTIFACTS = {
+    "meta.json": "application/json",
+    "profile.txt": "text/plain",
+    "profile.pstats": "application/octet-stream",
+    "stacks.txt": "text/plain",
+    "timeline.json": "application/json",
+}
+
+PROFILE_ID_PATTERN = re.compile(r"^[0-9]{8}T[0-9]{6}-[A-Za-z0-9_-]+$")
+
+# Trace events kept per profile; later ones are dropped (and counted)
+MAX_TIMELINE_EVENTS = 200_000
+LOOP_LAG_INTERVAL = 0.01
+
+_profile_lock = threading.Lock()
+_active_timeline: ContextVar[Optional["_TaskTimeline"]] = ContextVar("active_timeline", default=None)
+
+
+def should_profile(requested: bool = False) -> bool:
+    """Profile this job if asked to, or by PROFILE_SAMPLE_RATE."""
+    return requested or (settings.PROFILE_SAMPLE_RATE > 0 and random.random() < settings.PROFILE_SAMPLE_RATE)
+
+
+# ============== Stack sampler ==============
+
+class _StackSampler(threading.Thread):
+    """Counts the stacks of every other thread every interval."""
+
+    def __init__(self, interval: float):
+        super().__init__(name="profile-sampler", daemon=True)
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        own = threading.get_ident()
+        names = {}
+        while not self._stop_event.wait(self.interval):
+            if len(names) != threading.active_count():
+                names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                frames = []
+                while frame is not None:
+                    code = frame.f_code
+                    frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                frames.append(names.get(ident, f"thread-{ident}"))
+                self.stacks[";".join(reversed(frames))] += 1
+            self.samples += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+# ============== Task timeline ==============
+
+class _TimedCoroutine(collections.abc.Coroutine):
+    """Wraps a task's coroutine to record each step it runs for."""
+
+    def __init__(self, coro, timeline: "_TaskTimeline", tid: int):
+        self._coro = coro
+        self._timeline = timeline
+        self._tid = tid
+
+    def _step(self, method, *args):
+        start = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            self._timeline.slice(self._tid, start, time.perf_counter())
+
+    def send(self, value):
+        return self._step(self._coro.send, value)
+
+    def throw(self, *args):
+        return self._step(self._coro.throw, *args)
+
+    def close(self):
+        return self._coro.close()
+
+    def __await__(self):
+        return self
+
+
+class _TaskTimeline:
+    """Records tasks created under the profiled job, as Chrome trace events."""
+
+    def __init__(self):
+        self.origin = time.perf_counter()
+        self.events: List[Dict[str, Any]] = []
+        self.dropped = 0
+        self.tasks = 0
+        self._previous_factory = None
+
+    def _us(self, t: float) -> float:
+        return round((t - self.origin) * 1e6, 1)
+
+    def _add(self, event: Dict[str, Any]):
+        if len(self.events) < MAX_TIMELINE_EVENTS:
+            self.events.append(event)
+        else:
+            self.dropped += 1
+
+    def slice(self, tid: int, start: float, end: float):
+        self._add({"ph": "X", "name": "running", "pid": 1, "tid": tid, "ts": self._us(start), "dur": self._us(end) - self._us(start)})
+
+    def lag(self, seconds: float):
+        self._add({"ph": "C", "name": "loop lag (ms)", "pid": 1, "ts": self._us(time.perf_counter()), "args": {"lag": round(seconds * 1000, 2)}})
+
+    def _task_factory(self, loop, coro, **kwargs):
+        timeline = _active_timeline.get()
+        if timeline is self:
+            self.tasks += 1
+            tid = self.tasks
+            name = getattr(coro, "__qualname__", type(coro).__name__)
+            coro = _TimedCoroutine(coro, self, tid)
+            created = time.perf_counter()
+        if self._previous_factory is not None:
+            task = self._previous_factory(loop, coro, **kwargs)
+        else:
+            task = asyncio.Task(coro, loop=loop, **kwargs)
+        if timeline is self:
+            self._add({"ph": "M", "name": "thread_name", "pid": 1, "tid": tid, "args": {"name": f"{task.get_name()} {name}"}})
+
+            def done(task):
+                state = "cancelled" if task.cancelled() else ("error" if task.exception() else "done")
+                end = time.perf_counter()
+                self._add({"ph": "X", "name": name, "cat": state, "pid": 1, "tid": tid, "ts": self._us(created), "dur": self._us(end) - self._us(created)})
+
+            task.add_done_callback(done)
+        return task
+
+    def install(self, loop):
+        self._previous_factory = loop.get_task_factory()
+        loop.set_task_factory(self._task_factory)
+
+    def uninstall(self, loop):
+        loop.set_task_factory(self._previous_factory)
+
+    def trace(self) -> Dict[str, Any]:
+        return {"traceEvents": self.events, "displayTimeUnit": "ms", "otherData": {"dropped_events": self.dropped}}
+
+
+async def _watch_loop_lag(timeline: _TaskTimeline):
+    """Record how late the loop wakes this task; blocking calls show up as lag."""
+    while True:
+        expected = time.perf_counter() + LOOP_LAG_INTERVAL
+        await asyncio.sleep(LOOP_LAG_INTERVAL)
+        timeline.lag(max(0.0, time.perf_counter() - expected))
+
+
+# ============== Profiled runs ==============
+
+def _profile_dir(profile_id: str) -> str:
+    return os.path.join(settings.PROFILE_DIR, profile_id)
+
+
+def _write_artifacts(profile_id: str, meta: Dict[str, Any], profiler: cProfile.Profile,
+                     sampler: _StackSampler, timeline: _TaskTimeline):
+    path = _profile_dir(profile_id)
+    os.makedirs(path, exist_ok=True)
+    profiler.dump_stats(os.path.join(path, "profile.pstats"))
+    report = io.StringIO()
+    pstats.Stats(profiler, stream=report).sort_stats("cumulative").print_stats(60)
+    with open(os.path.join(path, "profile.txt"), "w") as f:
+        f.write(report.getvalue())
+    with open(os.path.join(path, "stacks.txt"), "w") as f:
+        f.write(sampler.folded())
+    with open(os.path.join(path, "timeline.json"), "w") as f:
+        json.dump(timeline.trace(), f)
+    with open(os.path.join(path, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=2)
+    _prune_profiles()
+
+
+def _prune_profiles():
+    """Delete the oldest profiles beyond PROFILE_MAX_ARTIFACTS."""
+    profiles = sorted(name for name in os.listdir(settings.PROFILE_DIR) if PROFILE_ID_PATTERN.match(name))
+    for name in profiles[:max(0, len(profiles) - settings.PROFILE_MAX_ARTIFACTS)]:
+        shutil.rmtree(_profile_dir(name), ignore_errors=True)
+
+
+async def run_profiled(kind: str, subject_id: str, job: Callable[[], Awaitable[Any]]) -> Any:
+    """
+    Run `job` with profiling if no other profile is running (otherwise it
+    runs normally). Returns the job's result; artifacts are written after
+    it finishes, whether or not it succeeded.
+    """
+    if not _profile_lock.acquire(blocking=False):
+        logger.info(f"Skipping profile of {kind} {subject_id}: another profile is running")
+        return await job()
+
+    started = datetime.utcnow()
+    profile_id = f"{started.strftime('%Y%m%dT%H%M%S')}-{re.sub(r'[^A-Za-z0-9_-]', '', subject_id)[:40]}"
+    loop = asyncio.get_running_loop()
+    timeline = _TaskTimeline()
+    sampler = _StackSampler(settings.PROFILE_STACK_INTERVAL_MS / 1000)
+    profiler = cProfile.Profile()
+    lag_watcher = loop.create_task(_watch_loop_lag(timeline))
+    outcome = "error"
+    try:
+        timeline.install(loop)
+        token = _active_timeline.set(timeline)
+        sampler.start()
+        profiler.enable()
+        start = time.perf_counter()
+        try:
+            result = await loop.create_task(job())
+            outcome = "complete"
+            return result
+        finally:
+            seconds = time.perf_counter() - start
+            profiler.disable()
+            sampler.stop()
+            _active_timeline.reset(token)
+            timeline.uninstall(loop)
+            lag_watcher.cancel()
+            meta = {
+                "id": profile_id,
+                "kind": kind,
+                "subject_id": subject_id,
+                "started_at": started.isoformat(timespec="seconds") + "Z",
+                "seconds": round(seconds, 3),
+                "outcome": outcome,
+                "stack_samples": sampler.samples,
+                "tasks": timeline.tasks,
+                "artifacts": list(ARTIFACTS),
+            }
+            try:
+                await asyncio.to_thread(_write_artifacts, profile_id, meta, profiler, sampler, timeline)
+                logger.info(f"Profile of {kind} {subject_id} written to {_profile_dir(profile_id)}")
+            except OSError as e:
+                logger.error(f"Could not write profile {profile_id}: {e}")
+    finally:
+        _profile_lock.release()
+
+
+def list_profiles() -> List[Dict[str, Any]]:
+    """Metadata of stored profiles, newest first."""
+    if not os.path.isdir(settings.PROFILE_DIR):
+        return []
+    profiles = []
+    for name in sorted(os.listdir(settings.PROFILE_DIR), reverse=True):
+        meta = get_profile(name)
+        if meta is not None:
+            profiles.append(meta)
+    return profiles
+
+
+def get_profile(profile_id: str) -> Optional[Dict[str, Any]]:
+    """A profile's metadata, or None if there is no such profile."""
+    if not PROFILE_ID_PATTERN.match(profile_id):
+        return None
+    try:
+        with open(os.path.join(_profile_dir(profile_id), "meta.json")) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def artifact_path(profile_id: str, artifact: str) -> Optional[str]:
+    """Path of one profile artifact, or None if it does not exist."""
+    if artifact not in ARTIFACTS or not PROFILE_ID_PATTERN.match(profile_id):
+        return None
+    path = os.path.join(_profile_dir(profile_id), artifact)
+    return path if os.path.isfile(path) else None
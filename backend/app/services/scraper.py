@@ -4,13 +4,20 @@ No API keys required - uses free public sources.
 """
 import asyncio
 import aiohttp
+from collections import Counter
 from bs4 import BeautifulSoup
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 from datetime import datetime
 import re
 import logging
 from urllib.parse import quote_plus, urljoin
 import hashlib
+import time
+
+from app.core.config import settings
+from app.core.metrics import SCRAPER_CIRCUIT_OPEN, SCRAPER_RATE_LIMITED, SCRAPER_RATE_LIMIT_WAIT, SCRAPER_REQUESTS
+from app.core.single_flight import SingleFlight
+from app.services.citation_graph import doi_key, s2_key
 
 logger = logging.getLogger(__name__)
 
@@ -23,8 +30,67 @@ HEADERS = {
     "Connection": "keep-alive",
 }
 
-# Rate limiting
-RATE_LIMIT_DELAY = 1.0  # seconds between requests to same domain
+def url_domain(url: str) -> str:
+    """Host part of a URL ("" if it has none)."""
+    parts = url.split("/")
+    return parts[2] if len(parts) > 2 else ""
+
+
+class SourceError(Exception):
+    """A scraping source failed to respond (as opposed to returning no results)."""
+
+
+class CircuitBreaker:
+    """
+    Skip sources that keep failing.
+    After `threshold` consecutive failures a source is skipped for
+    `cooldown` seconds, then a single trial request is let through; other
+    callers are still refused until the trial succeeds (closing the
+    circuit) or fails (re-opening it). A trial that never reports back is
+    replaced by another after a further `cooldown`.
+    """
+    
+    def __init__(self, threshold: int, cooldown: float):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures: Dict[str, int] = {}
+        self.opened_at: Dict[str, float] = {}
+        # Sources with a trial request in flight, and when it started
+        self.half_open: Dict[str, float] = {}
+    
+    def allow(self, source: str) -> bool:
+        """Whether a request to this source should be attempted."""
+        opened = self.opened_at.get(source)
+        if opened is None:
+            return True
+        now = time.monotonic()
+        if now - opened < self.cooldown:
+            return False
+        trial = self.half_open.get(source)
+        if trial is not None and now - trial < self.cooldown:
+            return False
+        self.half_open[source] = now
+        return True
+    
+    def record_success(self, source: str):
+        self.failures.pop(source, None)
+        self.opened_at.pop(source, None)
+        self.half_open.pop(source, None)
+        SCRAPER_CIRCUIT_OPEN.labels(source=source).set(0)
+    
+    def record_failure(self, source: str):
+        self.failures[source] = self.failures.get(source, 0) + 1
+        # A failed trial re-opens the circuit for another cooldown
+        if self.half_open.pop(source, None) is not None or self.failures[source] >= self.threshold:
+            if source not in self.opened_at:
+                logger.warning(f"Circuit open for {source} after {self.failures[source]} failures")
+            self.opened_at[source] = time.monotonic()
+            SCRAPER_CIRCUIT_OPEN.labels(source=source).set(1)
+    
+    def state(self, source: str) -> str:
+        if source in self.half_open:
+            return "half_open"
+        return "open" if source in self.opened_at else "closed"
 
 
 class AsyncScraper:
@@ -33,6 +99,8 @@ class AsyncScraper:
     def __init__(self):
         self.session: Optional[aiohttp.ClientSession] = None
         self.last_request_time: Dict[str, float] = {}
+        # Concurrent analyses requesting the same URL share one request
+        self.in_flight = SingleFlight("fetch")
     
     async def get_session(self) -> aiohttp.ClientSession:
         """Get or create aiohttp session."""
@@ -52,47 +120,98 @@ class AsyncScraper:
             await self.session.close()
     
     async def rate_limit(self, domain: str):
-        """Apply rate limiting per domain."""
+        """
+        Apply rate limiting per domain. Each caller reserves the next free
+        slot before sleeping, so concurrent analyses queue behind each other
+        instead of all waiting out the same gap and firing together.
+        """
         now = asyncio.get_event_loop().time()
-        last = self.last_request_time.get(domain, 0)
-        wait_time = RATE_LIMIT_DELAY - (now - last)
+        slot = max(now, self.last_request_time.get(domain, 0) + settings.SCRAPE_RATE_LIMIT_SECONDS)
+        self.last_request_time[domain] = slot
+        wait_time = slot - now
         if wait_time > 0:
+            SCRAPER_RATE_LIMITED.labels(domain=domain).inc()
+            SCRAPER_RATE_LIMIT_WAIT.labels(domain=domain).inc(wait_time)
             await asyncio.sleep(wait_time)
-        self.last_request_time[domain] = asyncio.get_event_loop().time()
     
     async def fetch(self, url: str) -> Optional[str]:
-        """Fetch a URL with rate limiting."""
+        """Fetch a URL with rate limiting, sharing any identical request in flight."""
+        return await self.in_flight.do(("text", url), lambda: self._fetch_once(url))
+    
+    async def _fetch_once(self, url: str) -> Optional[str]:
+        domain = url_domain(url)
         try:
-            domain = url.split("/")[2]
             await self.rate_limit(domain)
             
             session = await self.get_session()
             async with session.get(url) as response:
                 if response.status == 200:
-                    return await response.text()
+                    text = await response.text()
+                    SCRAPER_REQUESTS.labels(domain=domain, outcome="ok").inc()
+                    return text
                 else:
+                    SCRAPER_REQUESTS.labels(domain=domain, outcome="http_error").inc()
                     logger.warning(f"HTTP {response.status} for {url}")
                     return None
         except Exception as e:
+            SCRAPER_REQUESTS.labels(domain=domain, outcome="error").inc()
             logger.error(f"Error fetching {url}: {e}")
             return None
     
-    async def fetch_json(self, url: str) -> Optional[Dict]:
-        """Fetch JSON from URL."""
+    async def _fetch_json_once(self, url: str) -> Optional[Dict]:
+        domain = url_domain(url)
         try:
-            domain = url.split("/")[2]
             await self.rate_limit(domain)
             
             session = await self.get_session()
             async with session.get(url) as response:
                 if response.status == 200:
-                    return await response.json()
+                    data = await response.json()
+                    SCRAPER_REQUESTS.labels(domain=domain, outcome="ok").inc()
+                    return data
                 else:
+                    SCRAPER_REQUESTS.labels(domain=domain, outcome="http_error").inc()
                     logger.warning(f"HTTP {response.status} for {url}")
                     return None
         except Exception as e:
+            SCRAPER_REQUESTS.labels(domain=domain, outcome="error").inc()
             logger.error(f"Error fetching JSON {url}: {e}")
             return None
+    
+    async def fetch_json(self, url: str, hedge_after: Optional[float] = None) -> Optional[Dict]:
+        """
+        Fetch JSON from URL.
+        If `hedge_after` seconds pass without a response, a second identical
+        request is sent and whichever succeeds first wins. Only use this for
+        idempotent GET APIs. Identical requests in flight are shared; callers
+        must not modify the returned data.
+        """
+        return await self.in_flight.do(("json", url), lambda: self._fetch_json_hedged(url, hedge_after))
+    
+    async def _fetch_json_hedged(self, url: str, hedge_after: Optional[float]) -> Optional[Dict]:
+        if hedge_after is None:
+            hedge_after = settings.SCRAPE_HEDGE_AFTER_SECONDS
+        if not hedge_after or hedge_after <= 0:
+            return await self._fetch_json_once(url)
+        
+        primary = asyncio.create_task(self._fetch_json_once(url))
+        done, _ = await asyncio.wait({primary}, timeout=hedge_after)
+        if done:
+            return primary.result()
+        
+        logger.info(f"Hedging slow request after {hedge_after}s: {url}")
+        pending = {primary, asyncio.create_task(self._fetch_json_once(url))}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    result = task.result()
+                    if result is not None:
+                        return result
+            return None
+        finally:
+            for task in pending:
+                task.cancel()
 
 
 # Global scraper instance
@@ -106,14 +225,14 @@ async def search_google_patents(entity_name: str, max_results: int = 20) -> List
     """
     patents = []
     query = quote_plus(entity_name)
-    url = f"https://patents.google.com/?q={query}&num=20"
+    url = f"{settings.GOOGLE_PATENTS_URL}/?q={query}&num=20"
     
     logger.info(f"Searching Google Patents for: {entity_name}")
     
     try:
         html = await scraper.fetch(url)
-        if not html:
-            return patents
+        if html is None:
+            raise SourceError("Google Patents did not respond")
         
         soup = BeautifulSoup(html, 'lxml')
         
@@ -147,6 +266,8 @@ async def search_google_patents(entity_name: str, max_results: int = 20) -> List
         
         logger.info(f"Found {len(patents)} patents from Google Patents")
         
+    except SourceError:
+        raise
     except Exception as e:
         logger.error(f"Error searching Google Patents: {e}")
     
@@ -159,14 +280,14 @@ async def search_arxiv(entity_name: str, max_results: int = 20) -> List[Dict[str
     """
     papers = []
     query = quote_plus(entity_name)
-    url = f"http://export.arxiv.org/api/query?search_query=all:{query}&start=0&max_results={max_results}&sortBy=submittedDate&sortOrder=descending"
+    url = f"{settings.ARXIV_API_URL}?search_query=all:{query}&start=0&max_results={max_results}&sortBy=submittedDate&sortOrder=descending"
     
     logger.info(f"Searching arXiv for: {entity_name}")
     
     try:
         xml_content = await scraper.fetch(url)
-        if not xml_content:
-            return papers
+        if xml_content is None:
+            raise SourceError("arXiv did not respond")
         
         soup = BeautifulSoup(xml_content, 'lxml-xml')
         entries = soup.find_all('entry')
@@ -203,25 +324,39 @@ async def search_arxiv(entity_name: str, max_results: int = 20) -> List[Dict[str
         
         logger.info(f"Found {len(papers)} papers from arXiv")
         
+    except SourceError:
+        raise
     except Exception as e:
         logger.error(f"Error searching arXiv: {e}")
     
     return papers
 
 
+def _s2_citation_keys(papers: Optional[List[Dict[str, Any]]]) -> List[str]:
+    """Citation keys for S2 reference/citation entries (DOI preferred)."""
+    keys = []
+    for paper in papers or []:
+        key = doi_key((paper.get('externalIds') or {}).get('DOI')) or s2_key(paper.get('paperId'))
+        if key:
+            keys.append(key)
+    return keys
+
+
 async def search_semantic_scholar(entity_name: str, max_results: int = 20) -> List[Dict[str, Any]]:
     """
     Search Semantic Scholar (free tier, no API key for basic queries).
     """
     papers = []
     query = quote_plus(entity_name)
-    url = f"https://api.semanticscholar.org/graph/v1/paper/search?query={query}&limit={max_results}&fields=title,abstract,authors,year,venue,citationCount,externalIds"
+    url = f"{settings.SEMANTIC_SCHOLAR_API_URL}/paper/search?query={query}&limit={max_results}&fields=title,abstract,authors,year,venue,citationCount,externalIds,references.paperId,references.externalIds,citations.paperId,citations.externalIds"
     
     logger.info(f"Searching Semantic Scholar for: {entity_name}")
     
     try:
         data = await scraper.fetch_json(url)
-        if not data or 'data' not in data:
+        if data is None:
+            raise SourceError("Semantic Scholar did not respond")
+        if 'data' not in data:
             return papers
         
         for paper in data.get('data', []):
@@ -238,6 +373,9 @@ async def search_semantic_scholar(entity_name: str, max_results: int = 20) -> Li
                     "doi": paper.get('externalIds', {}).get('DOI', ''),
                     "citation_count": paper.get('citationCount', 0),
                     "source_url": f"https://www.semanticscholar.org/paper/{paper.get('paperId', '')}",
+                    "s2_id": paper.get('paperId'),
+                    "references": _s2_citation_keys(paper.get('references')),
+                    "cited_by": _s2_citation_keys(paper.get('citations')),
                 })
             except Exception as e:
                 logger.debug(f"Error parsing S2 paper: {e}")
@@ -245,6 +383,8 @@ async def search_semantic_scholar(entity_name: str, max_results: int = 20) -> Li
         
         logger.info(f"Found {len(papers)} papers from Semantic Scholar")
         
+    except SourceError:
+        raise
     except Exception as e:
         logger.error(f"Error searching Semantic Scholar: {e}")
     
@@ -257,13 +397,15 @@ async def search_dblp(entity_name: str, max_results: int = 20) -> List[Dict[str,
     """
     papers = []
     query = quote_plus(entity_name)
-    url = f"https://dblp.org/search/publ/api?q={query}&format=json&h={max_results}"
+    url = f"{settings.DBLP_API_URL}?q={query}&format=json&h={max_results}"
     
     logger.info(f"Searching DBLP for: {entity_name}")
     
     try:
         data = await scraper.fetch_json(url)
-        if not data or 'result' not in data:
+        if data is None:
+            raise SourceError("DBLP did not respond")
+        if 'result' not in data:
             return papers
         
         hits = data.get('result', {}).get('hits', {}).get('hit', [])
@@ -299,6 +441,8 @@ async def search_dblp(entity_name: str, max_results: int = 20) -> List[Dict[str,
         
         logger.info(f"Found {len(papers)} papers from DBLP")
         
+    except SourceError:
+        raise
     except Exception as e:
         logger.error(f"Error searching DBLP: {e}")
     
@@ -311,13 +455,15 @@ async def search_crossref(entity_name: str, max_results: int = 20) -> List[Dict[
     """
     papers = []
     query = quote_plus(entity_name)
-    url = f"https://api.crossref.org/works?query={query}&rows={max_results}&sort=relevance"
+    url = f"{settings.CROSSREF_API_URL}?query={query}&rows={max_results}&sort=relevance"
     
     logger.info(f"Searching CrossRef for: {entity_name}")
     
     try:
         data = await scraper.fetch_json(url)
-        if not data or 'message' not in data:
+        if data is None:
+            raise SourceError("CrossRef did not respond")
+        if 'message' not in data:
             return papers
         
         items = data.get('message', {}).get('items', [])
@@ -349,6 +495,10 @@ async def search_crossref(entity_name: str, max_results: int = 20) -> List[Dict[
                     "doi": item.get('DOI', ''),
                     "citation_count": item.get('is-referenced-by-count', 0),
                     "source_url": item.get('URL', ''),
+                    "references": [
+                        key for key in (doi_key(ref.get('DOI')) for ref in item.get('reference', []))
+                        if key
+                    ],
                 })
             except Exception as e:
                 logger.debug(f"Error parsing CrossRef entry: {e}")
@@ -356,70 +506,154 @@ async def search_crossref(entity_name: str, max_results: int = 20) -> List[Dict[
         
         logger.info(f"Found {len(papers)} papers from CrossRef")
         
+    except SourceError:
+        raise
     except Exception as e:
         logger.error(f"Error searching CrossRef: {e}")
     
     return papers
 
 
+# Source registry: name -> (search function, document kind)
+SCRAPE_SOURCES = {
+    "patents": (search_google_patents, "patents"),
+    "arxiv": (search_arxiv, "papers"),
+    "semantic_scholar": (search_semantic_scholar, "papers"),
+    "dblp": (search_dblp, "papers"),
+    "crossref": (search_crossref, "papers"),
+}
+
+
+def document_key(doc: Dict[str, Any]) -> str:
+    """Deduplication key: patent number for patents, title prefix for papers."""
+    if doc.get("patent_number"):
+        return f"patent:{doc['patent_number']}"
+    return doc.get("title", "").lower()[:50]
+
+
+def extract_personnel(papers: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Extract unique personnel from paper author lists."""
+    personnel = {}
+    for paper in papers:
+        for author in paper.get('authors', []):
+            if author and author not in personnel:
+                personnel[author] = {
+                    "name": author,
+                    "role": "Researcher",
+                    "publication_count": 0,
+                    "expertise": [],
+                }
+            if author in personnel:
+                personnel[author]["publication_count"] += 1
+    return list(personnel.values())
+
+
+# Global circuit breaker shared by all analyses
+circuit_breaker = CircuitBreaker(
+    threshold=settings.CIRCUIT_BREAKER_THRESHOLD,
+    cooldown=settings.CIRCUIT_BREAKER_COOLDOWN_SECONDS,
+)
+
+
+def scrape_deadline() -> float:
+    """Absolute (monotonic) deadline for a scrape starting now."""
+    return time.monotonic() + settings.SCRAPE_DEADLINE_SECONDS
+
+
+async def run_source(
+    source: str,
+    entity_name: str,
+    deadline: Optional[float] = None,
+) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """
+    Run one source under its time budget and the circuit breaker.
+    
+    The budget is the source's SCRAPE_SOURCE_BUDGETS entry, capped by the
+    remaining time before `deadline`. Never raises; returns the documents
+    found (possibly empty) and a status record for the analysis report.
+    """
+    search, _ = SCRAPE_SOURCES[source]
+    if deadline is None:
+        deadline = scrape_deadline()
+    budget = min(
+        settings.SCRAPE_SOURCE_BUDGETS.get(source, settings.SCRAPE_DEADLINE_SECONDS),
+        deadline - time.monotonic(),
+    )
+    status = {"status": "ok", "count": 0, "elapsed": 0.0, "budget": round(max(budget, 0.0), 2)}
+    
+    if not circuit_breaker.allow(source):
+        logger.info(f"Skipping {source}: circuit open")
+        status.update(status="skipped", error="circuit open")
+        return [], status
+    if budget <= 0:
+        status.update(status="timeout", error="scrape deadline exceeded")
+        return [], status
+    
+    documents: List[Dict[str, Any]] = []
+    start = time.monotonic()
+    try:
+        documents = await asyncio.wait_for(search(entity_name), timeout=budget)
+        circuit_breaker.record_success(source)
+    except asyncio.TimeoutError:
+        logger.warning(f"{source} exceeded its {budget:.1f}s budget for {entity_name}")
+        circuit_breaker.record_failure(source)
+        status.update(status="timeout", error=f"exceeded {budget:.1f}s budget")
+    except Exception as e:
+        logger.error(f"{source} failed for {entity_name}: {e}")
+        circuit_breaker.record_failure(source)
+        status.update(status="error", error=str(e))
+    
+    status["elapsed"] = round(time.monotonic() - start, 3)
+    status["count"] = len(documents)
+    return documents, status
+
+
 async def scrape_entity_data(
     entity_name: str,
     website: Optional[str] = None
 ) -> Dict[str, Any]:
     """
     Main function to scrape all data for an entity.
-    Runs all scrapers concurrently for maximum speed.
+    Runs all scrapers concurrently under a shared deadline and returns
+    whatever completed in time, with a per-source status.
     """
     logger.info(f"Starting comprehensive scrape for: {entity_name}")
     
     # Run all scrapers concurrently
+    deadline = scrape_deadline()
+    sources = list(SCRAPE_SOURCES)
     results = await asyncio.gather(
-        search_google_patents(entity_name),
-        search_arxiv(entity_name),
-        search_semantic_scholar(entity_name),
-        search_dblp(entity_name),
-        search_crossref(entity_name),
-        return_exceptions=True,
+        *(run_source(source, entity_name, deadline) for source in sources)
     )
+    source_status = {source: status for source, (_, status) in zip(sources, results)}
     
-    patents = results[0] if isinstance(results[0], list) else []
-    
-    # Combine papers from all sources
+    patents = []
     all_papers = []
     seen_titles = set()
     
-    for result in results[1:]:
-        if isinstance(result, list):
-            for paper in result:
-                # Deduplicate by title
-                title_key = paper.get('title', '').lower()[:50]
-                if title_key and title_key not in seen_titles:
-                    seen_titles.add(title_key)
-                    all_papers.append(paper)
+    for source, (documents, _) in zip(sources, results):
+        if SCRAPE_SOURCES[source][1] == "patents":
+            patents.extend(documents)
+            continue
+        # Combine papers from all sources, deduplicating by title
+        for paper in documents:
+            title_key = document_key(paper)
+            if title_key and title_key not in seen_titles:
+                seen_titles.add(title_key)
+                all_papers.append(paper)
     
     # Extract unique personnel from papers
-    personnel = {}
-    for paper in all_papers:
-        for author in paper.get('authors', []):
-            if author and author not in personnel:
-                personnel[author] = {
-                    "name": author,
-                    "role": "Researcher",
-                    "publication_count": 0,
-                    "expertise": [],
-                }
-            if author in personnel:
-                personnel[author]["publication_count"] += 1
+    personnel = extract_personnel(all_papers)
     
     # Extract technologies from all content
     from app.services.ai_service import get_ai_service
     ai = get_ai_service()
     
-    all_text = " ".join([
-        p.get("abstract", "") or p.get("title", "")
-        for p in patents + all_papers
-    ])
-    technologies = ai.extract_technologies(all_text)
+    # Per document rather than over one joined string, most frequent first
+    technology_counts = Counter()
+    for doc in patents + all_papers:
+        technology_counts.update(ai.extract_technologies(doc.get("abstract", "") or doc.get("title", "")))
+    technologies = [tech for tech, _ in technology_counts.most_common()]
     
     logger.info(f"Scrape complete: {len(patents)} patents, {len(all_papers)} papers, {len(personnel)} personnel")
     
@@ -429,6 +663,7 @@ async def scrape_entity_data(
     return {
         "patents": patents,
         "papers": all_papers,
-        "personnel": list(personnel.values()),
+        "personnel": personnel,
         "technologies": technologies,
+        "source_status": source_status,
     }
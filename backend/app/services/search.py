@@ -0,0 +1,420 @@
+"""
+Document search service.
+Keyword search over patent and paper titles and abstracts, with optional
+hybrid ranking that fuses keyword and embedding results.
+
+Keyword index:
+- SQLite: an FTS5 table ranked with BM25. Its rowids come from a
+  `search_documents` table (doc ID -> integer key), and triggers on the
+  patents and papers tables keep both in sync on insert, update and delete.
+- PostgreSQL: a generated, weighted `search_vector` tsvector column with a
+  GIN index on each table, ranked with ts_rank_cd (Postgres has no built-in
+  BM25).
+
+Hybrid mode ranks documents by embedding similarity from an in-memory
+matrix of document embeddings, then merges both lists with reciprocal rank
+fusion.
+"""
+import logging
+import re
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import DateTime, JSON, String, Float, bindparam, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.models import Paper, Patent
+from app.services.documents import entity_document_ids, linked_entities
+
+logger = logging.getLogger(__name__)
+
+SEARCH_KINDS = {"patent": ("patents", "filing_date"), "paper": ("papers", "publication_date")}
+# Search kind -> shared document store kind (app.services.documents)
+STORE_KINDS = {"patent": "patents", "paper": "papers"}
+HIGHLIGHT_START = "<mark>"
+HIGHLIGHT_END = "</mark>"
+
+# Set by setup_search_index
+fts_available = False
+
+
+class SearchUnavailable(Exception):
+    """The database has no full-text index."""
+
+
+# ============== Index maintenance ==============
+
+_SQLITE_DDL = [
+    """
+    CREATE TABLE IF NOT EXISTS search_documents (
+        id INTEGER PRIMARY KEY,
+        doc_id VARCHAR(36) NOT NULL UNIQUE,
+        kind VARCHAR(10) NOT NULL
+    )
+    """,
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts
+    USING fts5(title, abstract, tokenize = 'porter unicode61')
+    """,
+]
+
+_SQLITE_TRIGGERS = [
+    """
+    CREATE TRIGGER IF NOT EXISTS {table}_search_insert AFTER INSERT ON {table} BEGIN
+        INSERT INTO search_documents (doc_id, kind) VALUES (new.id, '{kind}');
+        INSERT INTO documents_fts (rowid, title, abstract)
+        VALUES ((SELECT id FROM search_documents WHERE doc_id = new.id), new.title, new.abstract);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS {table}_search_update AFTER UPDATE OF title, abstract ON {table} BEGIN
+        UPDATE documents_fts SET title = new.title, abstract = new.abstract
+        WHERE rowid = (SELECT id FROM search_documents WHERE doc_id = new.id);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS {table}_search_delete AFTER DELETE ON {table} BEGIN
+        DELETE FROM documents_fts WHERE rowid = (SELECT id FROM search_documents WHERE doc_id = old.id);
+        DELETE FROM search_documents WHERE doc_id = old.id;
+    END
+    """,
+]
+
+_SQLITE_BACKFILL = [
+    """
+    INSERT INTO search_documents (doc_id, kind)
+    SELECT id, '{kind}' FROM {table}
+    WHERE id NOT IN (SELECT doc_id FROM search_documents)
+    """,
+    """
+    INSERT INTO documents_fts (rowid, title, abstract)
+    SELECT s.id, d.title, d.abstract
+    FROM search_documents s JOIN {table} d ON d.id = s.doc_id
+    WHERE s.kind = '{kind}' AND s.id > :last_id
+    """,
+]
+
+_POSTGRES_DDL = [
+    """
+    ALTER TABLE {table} ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(abstract, '')), 'B')
+    ) STORED
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_{table}_search_vector ON {table} USING GIN (search_vector)",
+]
+
+
+def setup_search_index(engine: Engine):
+    """Create the full-text index and its triggers if missing, and index existing rows."""
+    global fts_available
+    try:
+        with engine.begin() as conn:
+            if engine.dialect.name == "postgresql":
+                for table, _ in SEARCH_KINDS.values():
+                    for statement in _POSTGRES_DDL:
+                        conn.exec_driver_sql(statement.format(table=table))
+            elif engine.dialect.name == "sqlite":
+                for statement in _SQLITE_DDL:
+                    conn.exec_driver_sql(statement)
+                for kind, (table, _) in SEARCH_KINDS.items():
+                    for statement in _SQLITE_TRIGGERS:
+                        conn.exec_driver_sql(statement.format(table=table, kind=kind))
+                    last_id = conn.execute(text("SELECT coalesce(max(id), 0) FROM search_documents")).scalar()
+                    conn.exec_driver_sql(_SQLITE_BACKFILL[0].format(table=table, kind=kind))
+                    conn.execute(text(_SQLITE_BACKFILL[1].format(table=table, kind=kind)), {"last_id": last_id})
+            else:
+                logger.warning(f"Full-text search not supported on {engine.dialect.name}")
+                return
+        fts_available = True
+    except Exception as e:
+        logger.error(f"Full-text search index unavailable: {e}")
+
+
+# ============== Keyword search ==============
+
+def fts5_query(query: str, match_any: bool = False) -> Optional[str]:
+    """Turn free text into a safe FTS5 query of quoted terms."""
+    terms = re.findall(r"\w+", query.lower())
+    if not terms:
+        return None
+    return (" OR " if match_any else " ").join(f'"{term}"' for term in terms)
+
+
+def _filters(alias: str, kind: str, dialect: str, entity_id, technology, start, end) -> str:
+    table, date_column = SEARCH_KINDS[kind]
+    clauses = []
+    if entity_id:
+        clauses.append(
+            f"EXISTS (SELECT 1 FROM entity_{table} l WHERE l.{kind}_id = {alias}.id AND l.entity_id = :entity_id)"
+        )
+    if technology:
+        if dialect == "postgresql":
+            clauses.append(f"{alias}.technologies::jsonb ? :technology")
+        else:
+            clauses.append(f"EXISTS (SELECT 1 FROM json_each({alias}.technologies) WHERE json_each.value = :technology)")
+    if start:
+        clauses.append(f"{alias}.{date_column} >= :start")
+    if end:
+        clauses.append(f"{alias}.{date_column} < :end")
+    return "".join(f" AND {c}" for c in clauses)
+
+
+def _keyword_statement(dialect: str, kind: str, filters: str):
+    table, date_column = SEARCH_KINDS[kind]
+    if dialect == "postgresql":
+        sql = f"""
+            SELECT d.id, d.{date_column} AS date, d.technologies,
+                ts_headline('english', d.title, q, 'HighlightAll=true, StartSel={HIGHLIGHT_START}, StopSel={HIGHLIGHT_END}') AS title,
+                ts_headline('english', coalesce(d.abstract, ''), q, 'MaxWords=35, StartSel={HIGHLIGHT_START}, StopSel={HIGHLIGHT_END}') AS snippet,
+                ts_rank_cd(d.search_vector, q, 32) AS score
+            FROM {table} d, websearch_to_tsquery('english', :query) q
+            WHERE d.search_vector @@ q{filters}
+            ORDER BY score DESC
+            LIMIT :limit
+        """
+    else:
+        sql = f"""
+            SELECT d.id, d.{date_column} AS date, d.technologies,
+                highlight(documents_fts, 0, '{HIGHLIGHT_START}', '{HIGHLIGHT_END}') AS title,
+                snippet(documents_fts, 1, '{HIGHLIGHT_START}', '{HIGHLIGHT_END}', '...', 32) AS snippet,
+                -bm25(documents_fts, :title_weight, 1.0) AS score
+            FROM documents_fts
+            JOIN search_documents s ON s.id = documents_fts.rowid
+            JOIN {table} d ON d.id = s.doc_id
+            WHERE documents_fts MATCH :query AND s.kind = '{kind}'{filters}
+            ORDER BY bm25(documents_fts, :title_weight, 1.0)
+            LIMIT :limit
+        """
+    dates = [bindparam(name, type_=DateTime) for name in ("start", "end") if f":{name}" in filters]
+    return text(sql).bindparams(*dates).columns(
+        id=String, date=DateTime, technologies=JSON,
+        title=String, snippet=String, score=Float,
+    )
+
+
+def keyword_search(
+    db: Session,
+    query: str,
+    kinds: List[str],
+    entity_id: Optional[str] = None,
+    technology: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    limit: int = 20,
+) -> List[Dict[str, Any]]:
+    """Ranked keyword matches with highlighted title and abstract snippet."""
+    if not fts_available:
+        raise SearchUnavailable()
+
+    dialect = db.get_bind().dialect.name
+    search_query = query if dialect == "postgresql" else fts5_query(query)
+    if not search_query:
+        return []
+
+    params = {
+        "query": search_query,
+        "entity_id": entity_id,
+        "technology": technology,
+        "start": start,
+        "end": end,
+        "limit": limit,
+        "title_weight": settings.SEARCH_TITLE_WEIGHT,
+    }
+    results = []
+    for kind in kinds:
+        filters = _filters("d", kind, dialect, entity_id, technology, start, end)
+        rows = db.execute(_keyword_statement(dialect, kind, filters), params).mappings().all()
+        entities = linked_entities(db, STORE_KINDS[kind], [row["id"] for row in rows])
+        for row in rows:
+            results.append({
+                **row, "kind": kind, "entity_ids": entities.get(row["id"], []),
+                "technologies": row["technologies"] or [],
+            })
+
+    # Scores come from one index, so patents and papers merge by score
+    results.sort(key=lambda r: -r["score"])
+    return results[:limit]
+
+
+# ============== Embedding search ==============
+
+class DocumentVectorIndex:
+    """Unit-normalised document embeddings in one matrix, appended at ingest."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self):
+        self.ids: List[str] = []
+        self.kinds: List[str] = []
+        self._chunks: List[np.ndarray] = []
+        self._matrix = np.zeros((0, settings.EMBEDDING_DIM), dtype=np.float32)
+        self._kind_array = np.empty(0, dtype=object)
+        self._id_array = np.empty(0, dtype=object)
+        self.loaded = False
+
+    def add(self, kind: str, ids: List[str], embeddings: List[Optional[List[float]]]):
+        """Add documents that have embeddings of the configured dimension."""
+        with self._lock:
+            rows = []
+            for doc_id, embedding in zip(ids, embeddings):
+                if embedding and len(embedding) == settings.EMBEDDING_DIM:
+                    self.ids.append(doc_id)
+                    self.kinds.append(kind)
+                    rows.append(embedding)
+            if rows:
+                vectors = np.asarray(rows, dtype=np.float32)
+                norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+                self._chunks.append(vectors / np.where(norms > 0, norms, 1.0))
+
+    def load(self, db: Session):
+        """Read every stored embedding."""
+        with self._lock:
+            self._reset()
+            for kind, model in (("patent", Patent), ("paper", Paper)):
+                query = db.query(model.id, model.embedding).filter(model.embedding.isnot(None))
+                batch = []
+                for row in query.yield_per(2000):
+                    batch.append(row)
+                    if len(batch) >= 2000:
+                        self.add(kind, *zip(*batch))
+                        batch = []
+                if batch:
+                    self.add(kind, *zip(*batch))
+            self.loaded = True
+            logger.info(f"Document vector index loaded: {len(self.ids)} documents")
+
+    def _compact(self) -> np.ndarray:
+        """Merge added chunks into the matrix."""
+        if self._chunks:
+            self._matrix = np.vstack([self._matrix, *self._chunks])
+            self._chunks = []
+            self._kind_array = np.asarray(self.kinds, dtype=object)
+            self._id_array = np.asarray(self.ids, dtype=object)
+        return self._matrix
+
+    def search(
+        self,
+        vector: List[float],
+        kinds: List[str],
+        doc_ids: Optional[List[str]] = None,
+        limit: int = 200,
+    ) -> List[Tuple[str, str, float]]:
+        """Most similar documents (among `doc_ids` when given) as (kind, id, cosine similarity)."""
+        query = np.asarray(vector, dtype=np.float32)
+        if len(query) != settings.EMBEDDING_DIM or not np.linalg.norm(query):
+            return []
+
+        with self._lock:
+            matrix = self._compact()
+            if len(matrix) == 0:
+                return []
+            scores = matrix @ (query / np.linalg.norm(query))
+            mask = np.isin(self._kind_array, kinds)
+            if doc_ids is not None:
+                mask &= np.isin(self._id_array, doc_ids)
+            scores = np.where(mask, scores, -np.inf)
+
+            top = min(limit, int(mask.sum()))
+            if top == 0:
+                return []
+            best = np.argpartition(-scores, top - 1)[:top]
+            best = best[np.argsort(-scores[best])]
+            return [(self.kinds[i], self.ids[i], float(scores[i])) for i in best.tolist()]
+
+
+# Global vector index (loaded on first hybrid search)
+vector_index = DocumentVectorIndex()
+
+
+def index_embeddings(kind: str, ids: List[str], documents: List[Dict[str, Any]]):
+    """Add newly committed documents to the vector index (if it is loaded)."""
+    if vector_index.loaded:
+        vector_index.add(kind, ids, [d.get("embedding") for d in documents])
+
+
+def _describe(db: Session, hits: List[Tuple[str, str]], technology, start, end) -> Dict[str, Dict[str, Any]]:
+    """Stored fields for embedding hits, dropping those outside the filters."""
+    details = {}
+    for kind, model, date_column in (
+        ("patent", Patent, Patent.filing_date),
+        ("paper", Paper, Paper.publication_date),
+    ):
+        ids = [doc_id for k, doc_id in hits if k == kind]
+        if not ids:
+            continue
+        query = db.query(model.id, date_column, model.technologies, model.title, model.abstract).filter(
+            model.id.in_(ids)
+        )
+        if start:
+            query = query.filter(date_column >= start)
+        if end:
+            query = query.filter(date_column < end)
+        rows = query.all()
+        entities = linked_entities(db, STORE_KINDS[kind], [row[0] for row in rows])
+        for doc_id, date, technologies, title, abstract in rows:
+            if technology and technology not in (technologies or []):
+                continue
+            details[doc_id] = {
+                "id": doc_id,
+                "kind": kind,
+                "entity_ids": entities.get(doc_id, []),
+                "date": date,
+                "technologies": technologies or [],
+                "title": title,
+                "snippet": (abstract or "")[:200] or None,
+            }
+    return details
+
+
+async def hybrid_search(
+    db: Session,
+    query: str,
+    kinds: List[str],
+    entity_id: Optional[str] = None,
+    technology: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    limit: int = 20,
+) -> List[Dict[str, Any]]:
+    """
+    Keyword and embedding results merged with reciprocal rank fusion:
+    score = sum over both lists of 1 / (k + rank).
+    """
+    from app.services.ai_service import get_ai_service
+
+    candidates = settings.SEARCH_HYBRID_CANDIDATES
+    rrf_k = settings.SEARCH_RRF_K
+
+    keyword_hits = keyword_search(db, query, kinds, entity_id, technology, start, end, candidates)
+
+    if not vector_index.loaded:
+        vector_index.load(db)
+    embeddings = await get_ai_service().aembed_batch([query])
+    entity_documents = None
+    if entity_id:
+        entity_documents = [
+            doc_id for kind in kinds for doc_id in entity_document_ids(db, STORE_KINDS[kind], entity_id)
+        ]
+    vector_hits = vector_index.search(embeddings[0] if embeddings else [], kinds, entity_documents, candidates)
+    described = _describe(db, [(k, i) for k, i, _ in vector_hits], technology, start, end)
+    vector_hits = [(k, i, s) for k, i, s in vector_hits if i in described]
+
+    fused: Dict[str, float] = {}
+    documents: Dict[str, Dict[str, Any]] = {}
+    for rank, hit in enumerate(keyword_hits):
+        fused[hit["id"]] = fused.get(hit["id"], 0.0) + 1.0 / (rrf_k + rank + 1)
+        documents[hit["id"]] = hit
+    for rank, (_, doc_id, _) in enumerate(vector_hits):
+        fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (rrf_k + rank + 1)
+        documents.setdefault(doc_id, described[doc_id])
+
+    ranked = sorted(fused.items(), key=lambda item: -item[1])[:limit]
+    return [{**documents[doc_id], "score": round(score, 6)} for doc_id, score in ranked]
@@ -0,0 +1,248 @@
+"""
+Timeline service.
+Maintains monthly document counts per entity and technology at ingest, and
+serves time series with any bucket size by summing those monthly rollups.
+
+Query cost depends on the number of months and technologies involved, not
+on the number of stored patents or papers.
+"""
+import logging
+from collections import defaultdict
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.core.database import SessionLocal
+from app.core.write_queue import run_write_sync
+from app.models.models import EntityMonthlyRollup, EntityPaper, EntityPatent, Patent, Paper
+from app.models.schemas import TimelinePoint
+from app.services.documents import of_entity
+
+logger = logging.getLogger(__name__)
+
+# Technology key holding per-document totals
+ALL_TECHNOLOGIES = "*"
+
+# Upper bound on points returned in one series
+MAX_BUCKETS = 600
+
+
+def month_index(value: date) -> int:
+    """Months since year 0 for a date."""
+    return value.year * 12 + value.month - 1
+
+
+def month_start(index: int) -> date:
+    """First day of the month with the given index."""
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def record_documents(db: Session, entity_id: str, kind: str, documents: List[Dict[str, Any]]):
+    """
+    Fold newly ingested documents into the entity's monthly rollups.
+    Call within the ingest transaction; the caller commits. Undated
+    documents are skipped.
+    """
+    deltas = defaultdict(lambda: {"patent_count": 0, "paper_count": 0, "citation_count": 0})
+    count_field = "patent_count" if kind == "patents" else "paper_count"
+    date_field = "filing_date" if kind == "patents" else "publication_date"
+
+    for doc in documents:
+        when = doc.get(date_field)
+        if not isinstance(when, (date, datetime)):
+            continue
+        month = month_index(when)
+        citations = doc.get("citation_count") or 0
+        for technology in {ALL_TECHNOLOGIES, *(doc.get("technologies") or [])}:
+            delta = deltas[(technology, month)]
+            delta[count_field] += 1
+            delta["citation_count"] += citations
+
+    if not deltas:
+        return
+
+    technologies = {tech for tech, _ in deltas}
+    months = [month for _, month in deltas]
+    existing = {
+        (row.technology, row.month): row
+        for row in db.query(EntityMonthlyRollup).filter(
+            EntityMonthlyRollup.entity_id == entity_id,
+            EntityMonthlyRollup.technology.in_(technologies),
+            EntityMonthlyRollup.month.between(min(months), max(months)),
+        ).all()
+    }
+    for (technology, month), delta in deltas.items():
+        row = existing.get((technology, month))
+        if row is None:
+            row = EntityMonthlyRollup(
+                entity_id=entity_id,
+                technology=technology,
+                month=month,
+                patent_count=0,
+                paper_count=0,
+                citation_count=0,
+            )
+            db.add(row)
+        for field, value in delta.items():
+            setattr(row, field, (getattr(row, field) or 0) + value)
+
+
+def rebuild_rollups(db: Session, entity_id: str):
+    """
+    Recompute an entity's monthly rollups from its stored documents, as a
+    write (see app.core.write_queue). Only needed to backfill data ingested
+    before rollups were maintained.
+    """
+    db.query(EntityMonthlyRollup).filter(EntityMonthlyRollup.entity_id == entity_id).delete()
+    sources = (
+        ("patents", "filing_date", db.query(
+            Patent.technologies, Patent.filing_date,
+        ).filter(of_entity("patents", entity_id))),
+        ("papers", "publication_date", db.query(
+            Paper.technologies, Paper.publication_date, Paper.citation_count,
+        ).filter(of_entity("papers", entity_id))),
+    )
+    for kind, date_field, query in sources:
+        batch = []
+        for row in query.yield_per(1000):
+            batch.append({
+                "technologies": row[0],
+                date_field: row[1],
+                "citation_count": row[2] if kind == "papers" else 0,
+            })
+            if len(batch) >= 1000:
+                record_documents(db, entity_id, kind, batch)
+                db.flush()
+                batch = []
+        record_documents(db, entity_id, kind, batch)
+
+
+def backfill_rollups() -> int:
+    """
+    Build monthly rollups for every entity with documents when there are no
+    rollups at all (a database from before rollups were maintained). Each
+    entity is one write. Returns the number of entities rebuilt.
+    """
+    db = SessionLocal()
+    try:
+        if db.query(EntityMonthlyRollup.entity_id).first() is not None:
+            return 0
+        entity_ids = [
+            entity_id for (entity_id,) in db.query(EntityPatent.entity_id).union(db.query(EntityPaper.entity_id))
+        ]
+    finally:
+        db.close()
+    for entity_id in entity_ids:
+        run_write_sync(rebuild_rollups, entity_id)
+    if entity_ids:
+        logger.info(f"Backfilled monthly rollups for {len(entity_ids)} entities")
+    return len(entity_ids)
+
+
+def _bucketed_counts(
+    db: Session,
+    filters: list,
+    bucket_months: int,
+    start: Optional[date],
+    end: Optional[date],
+) -> Tuple[int, Dict[Tuple[str, int], Tuple[int, int, int]]]:
+    """
+    Sum rollups into buckets of `bucket_months` in SQL, per technology.
+    Buckets are aligned to `start` when given, otherwise to multiples of the
+    bucket size (so 12-month buckets are calendar years).
+    Returns the alignment origin and {(technology, bucket): counts}.
+    """
+    origin = month_index(start) if start else 0
+    bucket = ((EntityMonthlyRollup.month - origin) // bucket_months).label("bucket")
+
+    query = db.query(
+        EntityMonthlyRollup.technology,
+        bucket,
+        func.sum(EntityMonthlyRollup.patent_count),
+        func.sum(EntityMonthlyRollup.paper_count),
+        func.sum(EntityMonthlyRollup.citation_count),
+    ).filter(*filters)
+    if start:
+        query = query.filter(EntityMonthlyRollup.month >= origin)
+    if end:
+        query = query.filter(EntityMonthlyRollup.month <= month_index(end))
+
+    counts = {}
+    for technology, bucket_id, patents, papers, citations in query.group_by(EntityMonthlyRollup.technology, bucket):
+        counts[(technology, int(bucket_id))] = (int(patents or 0), int(papers or 0), int(citations or 0))
+    return origin, counts
+
+
+def _series(
+    counts: Dict[int, Tuple[int, int, int]],
+    origin: int,
+    bucket_months: int,
+    first: int,
+    last: int,
+) -> List[TimelinePoint]:
+    """Dense series from `first` to `last` bucket, with empty buckets as zeros."""
+    first = max(first, last - MAX_BUCKETS + 1)
+    series = []
+    for bucket_id in range(first, last + 1):
+        patents, papers, citations = counts.get(bucket_id, (0, 0, 0))
+        start_month = origin + bucket_id * bucket_months
+        series.append(TimelinePoint(
+            period_start=month_start(start_month),
+            period_end=month_start(start_month + bucket_months),
+            patent_count=patents,
+            paper_count=papers,
+            citation_count=citations,
+        ))
+    return series
+
+
+def _bucket_range(origin: int, bucket_months: int, start: Optional[date], end: Optional[date], buckets) -> Optional[Tuple[int, int]]:
+    """First and last bucket to return: the requested range, else the range with data."""
+    first = 0 if start else min(buckets, default=None)
+    last = (month_index(end) - origin) // bucket_months if end else max(buckets, default=None)
+    if first is None or last is None or first > last:
+        return None
+    return first, last
+
+
+def entity_timeline(
+    db: Session,
+    entity_id: str,
+    bucket_months: int = 12,
+    technology: Optional[str] = None,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+) -> List[TimelinePoint]:
+    """Document counts for one entity (optionally one technology) over time."""
+    filters = [
+        EntityMonthlyRollup.entity_id == entity_id,
+        EntityMonthlyRollup.technology == (technology or ALL_TECHNOLOGIES),
+    ]
+    origin, counts = _bucketed_counts(db, filters, bucket_months, start, end)
+    by_bucket = {bucket_id: value for (_, bucket_id), value in counts.items()}
+
+    bounds = _bucket_range(origin, bucket_months, start, end, by_bucket)
+    if bounds is None:
+        return []
+    return _series(by_bucket, origin, bucket_months, *bounds)
+
+
+def technology_trends(
+    db: Session,
+    technologies: List[str],
+    bucket_months: int = 12,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+) -> Dict[str, List[TimelinePoint]]:
+    """Document counts per technology across all entities, on a shared axis."""
+    filters = [EntityMonthlyRollup.technology.in_(technologies)]
+    origin, counts = _bucketed_counts(db, filters, bucket_months, start, end)
+
+    bounds = _bucket_range(origin, bucket_months, start, end, {bucket_id for _, bucket_id in counts})
+    trends = {}
+    for tech in technologies:
+        by_bucket = {bucket_id: value for (t, bucket_id), value in counts.items() if t == tech}
+        trends[tech] = _series(by_bucket, origin, bucket_months, *bounds) if bounds else []
+    return trends
@@ -0,0 +1,65 @@
+"""
+Compare two benchmark result files written by benchmarks.pipeline --output.
+
+Prints every numeric result present in both files with its relative
+change. Metrics where lower is better (latencies, seconds, memory) are
+flagged as regressions when they grow by more than --threshold percent;
+the rest (throughputs, counts) when they shrink by more.
+
+Usage (from backend/):
+    python -m benchmarks.compare before.json after.json --threshold 10
+"""
+import argparse
+import json
+import sys
+from typing import Any, Dict
+
+# Key fragments of metrics where a smaller value is an improvement
+LOWER_IS_BETTER = ("_ms", "seconds", "rss", "errors")
+
+
+def numeric_leaves(data: Any, prefix: str = "") -> Dict[str, float]:
+    """Flatten nested results to {"section.key.subkey": value} for numbers."""
+    leaves = {}
+    if isinstance(data, dict):
+        for key, value in data.items():
+            leaves.update(numeric_leaves(value, f"{prefix}.{key}" if prefix else key))
+    elif isinstance(data, (int, float)) and not isinstance(data, bool):
+        leaves[prefix] = float(data)
+    return leaves
+
+
+def lower_is_better(path: str) -> bool:
+    name = path.rsplit(".", 1)[-1]
+    return any(fragment in name for fragment in LOWER_IS_BETTER) and "per_second" not in name
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("before")
+    parser.add_argument("after")
+    parser.add_argument("--threshold", type=float, default=10.0, help="percent change flagged as a regression")
+    args = parser.parse_args()
+
+    with open(args.before) as f:
+        before = numeric_leaves(json.load(f)["sections"])
+    with open(args.after) as f:
+        after = numeric_leaves(json.load(f)["sections"])
+
+    regressions = 0
+    width = max((len(path) for path in before if path in after), default=10)
+    print(f"{'metric':{width}}  {'before':>12}  {'after':>12}  {'change':>8}")
+    for path in sorted(before.keys() & after.keys()):
+        old, new = before[path], after[path]
+        change = (new - old) / old * 100 if old else 0.0
+        worse = change > args.threshold if lower_is_better(path) else change < -args.threshold
+        regressions += worse
+        flag = "  REGRESSION" if worse else ""
+        print(f"{path:{width}}  {old:12.3f}  {new:12.3f}  {change:+7.1f}%{flag}")
+
+    print(f"\n{regressions} regression(s) beyond {args.threshold:g}%")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
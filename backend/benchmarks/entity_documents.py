@@ -0,0 +1,182 @@
+"""
+Benchmark: listing an entity's patents and papers.
+
+Compares the naive approach (lazy `entity.patents` / `entity.papers`
+relationships or OFFSET pages of full ORM rows, serialized through the
+Pydantic response models) with the keyset-paginated, column-projected
+/entities/{id}/patents|papers endpoints.
+
+Runs against a throwaway SQLite database.
+
+Usage (from backend/):
+    python -m benchmarks.entity_documents --documents 50000
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.core.config import settings
+from app.core.database import Base, get_db, get_read_db
+from app.main import app
+from app.models.models import Entity, EntityPaper, EntityPatent, Patent, Paper
+from app.models.schemas import PaperResponse, PatentResponse
+from app.services.documents import DOCUMENT_KINDS, of_entity
+
+TECHNOLOGIES = ["Quantum Computing", "Machine Learning", "Cryptography", "Robotics", "Aerospace"]
+PAGE_SIZE = 200
+
+
+def seed(engine, documents: int, dim: int) -> str:
+    """Create one entity with `documents` patents and `documents` papers."""
+    rng = random.Random(0)
+    entity_id = str(uuid.uuid4())
+    base = datetime(2000, 1, 1)
+    with engine.begin() as conn:
+        conn.execute(Entity.__table__.insert(), [{"id": entity_id, "name": "Benchmark Corp", "type": "company"}])
+        for start in range(0, documents, 5000):
+            count = min(5000, documents - start)
+            patent_ids = [str(uuid.uuid4()) for _ in range(count)]
+            paper_ids = [str(uuid.uuid4()) for _ in range(count)]
+            conn.execute(Patent.__table__.insert(), [{
+                "id": patent_ids[i],
+                "patent_number": f"BM{start + i}",
+                "title": f"Patent {start + i} on {rng.choice(TECHNOLOGIES)}",
+                "abstract": "A method and apparatus. " * 40,
+                "filing_date": base + timedelta(days=rng.randint(0, 9000)),
+                "status": "granted",
+                "inventors": ["Inventor A", "Inventor B"],
+                "technologies": rng.sample(TECHNOLOGIES, 2),
+                "embedding": [round(rng.random(), 4) for _ in range(dim)],
+            } for i in range(count)])
+            conn.execute(Paper.__table__.insert(), [{
+                "id": paper_ids[i],
+                "title": f"Paper {start + i} on {rng.choice(TECHNOLOGIES)}",
+                "abstract": "We study the problem. " * 40,
+                "authors": ["Author A", "Author B", "Author C"],
+                "publication_date": base + timedelta(days=rng.randint(0, 9000)),
+                "venue": "Benchmark Conference",
+                "technologies": rng.sample(TECHNOLOGIES, 2),
+                "citation_count": rng.randint(0, 500),
+                "embedding": [round(rng.random(), 4) for _ in range(dim)],
+            } for i in range(count)])
+            conn.execute(EntityPatent.__table__.insert(), [
+                {"entity_id": entity_id, "patent_id": patent_id} for patent_id in patent_ids
+            ])
+            conn.execute(EntityPaper.__table__.insert(), [
+                {"entity_id": entity_id, "paper_id": paper_id} for paper_id in paper_ids
+            ])
+    return entity_id
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+
+def naive_all(Session, entity_id, relationship, schema):
+    """Everything through the lazy relationship, validated row by row."""
+    db = Session()
+    try:
+        entity = db.get(Entity, entity_id)
+        return [schema.model_validate(row).model_dump(mode="json") for row in getattr(entity, relationship)]
+    finally:
+        db.close()
+
+
+def naive_offset_page(Session, entity_id, kind, sort_column, schema, offset):
+    """One OFFSET page of full ORM rows."""
+    db = Session()
+    try:
+        model = DOCUMENT_KINDS[kind].model
+        rows = (
+            db.query(model)
+            .filter(of_entity(kind, entity_id))
+            .order_by(sort_column.desc(), model.id.desc())
+            .offset(offset)
+            .limit(PAGE_SIZE)
+            .all()
+        )
+        return [schema.model_validate(row).model_dump(mode="json") for row in rows]
+    finally:
+        db.close()
+
+
+def walk_endpoint(client, path):
+    """Fetch every page through the cursor; returns per-page latencies."""
+    latencies, cursor, total = [], None, 0
+    while True:
+        params = {"limit": PAGE_SIZE}
+        if cursor:
+            params["cursor"] = cursor
+        elapsed, response = timed(lambda: client.get(path, params=params))
+        response.raise_for_status()
+        body = response.json()
+        latencies.append(elapsed)
+        total += len(body["items"])
+        cursor = body["next_cursor"]
+        if not cursor:
+            return latencies, total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--documents", type=int, default=50000, help="patents and papers per entity")
+    parser.add_argument("--dim", type=int, default=settings.EMBEDDING_DIM, help="embedding dimension")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        Base.metadata.create_all(engine)
+        Session = sessionmaker(bind=engine)
+
+        print(f"Seeding {args.documents} patents and {args.documents} papers...")
+        elapsed, entity_id = timed(lambda: seed(engine, args.documents, args.dim))
+        print(f"  seeded in {elapsed:.1f}s\n")
+
+        def override_db():
+            db = Session()
+            try:
+                yield db
+            finally:
+                db.close()
+
+        app.dependency_overrides[get_db] = override_db
+        app.dependency_overrides[get_read_db] = override_db
+        client = TestClient(app)
+        last_offset = max(args.documents - PAGE_SIZE, 0)
+
+        cases = (
+            ("patents", Patent.filing_date, PatentResponse),
+            ("papers", Paper.publication_date, PaperResponse),
+        )
+        for name, sort_column, schema in cases:
+            print(f"== {name} ({PAGE_SIZE} per page) ==")
+            t, rows = timed(lambda: naive_all(Session, entity_id, name, schema))
+            print(f"  naive relationship, all rows     {t * 1000:9.1f} ms  ({len(rows)} rows)")
+            t, _ = timed(lambda: naive_offset_page(Session, entity_id, name, sort_column, schema, 0))
+            print(f"  naive OFFSET, first page         {t * 1000:9.1f} ms")
+            t, _ = timed(lambda: naive_offset_page(Session, entity_id, name, sort_column, schema, last_offset))
+            print(f"  naive OFFSET, last page          {t * 1000:9.1f} ms")
+
+            latencies, total = walk_endpoint(client, f"{settings.API_V1_STR}/entities/{entity_id}/{name}")
+            print(f"  keyset endpoint, first page      {latencies[0] * 1000:9.1f} ms")
+            print(f"  keyset endpoint, last page       {latencies[-1] * 1000:9.1f} ms")
+            print(f"  keyset endpoint, median page     {statistics.median(latencies) * 1000:9.1f} ms")
+            print(f"  keyset endpoint, all pages       {sum(latencies) * 1000:9.1f} ms  ({total} rows)\n")
+
+        app.dependency_overrides.clear()
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
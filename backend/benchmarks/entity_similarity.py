@@ -0,0 +1,148 @@
+"""
+Benchmark: finding entities similar to a given one.
+
+Compares scoring every stored centroid per request (read from the database
+on each query) with the in-memory centroid index behind
+/entities/{id}/similar, and times the clustering job.
+
+Runs against a throwaway SQLite database seeded with synthetic centroids
+drawn around a number of topics.
+
+Usage (from backend/):
+    python -m benchmarks.entity_similarity --entities 100000
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+import uuid
+
+import numpy as np
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.core.config import settings
+from app.core.database import Base, get_db, get_read_db
+from app.main import app
+from app.models.models import Entity, EntityCentroid
+from app.services import entity_similarity
+from app.services.entity_similarity import CentroidIndex
+
+LIMIT = 10
+
+
+def seed(engine, entities: int, topics: int) -> list:
+    """Entities whose centroids are noisy copies of `topics` random directions."""
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(topics, settings.EMBEDDING_DIM)).astype(np.float32)
+    ids = [str(uuid.uuid4()) for _ in range(entities)]
+    with engine.begin() as conn:
+        for start in range(0, entities, 5000):
+            batch = ids[start:start + 5000]
+            vectors = centers[rng.integers(0, topics, len(batch))] + rng.normal(
+                scale=0.5, size=(len(batch), settings.EMBEDDING_DIM)
+            ).astype(np.float32)
+            conn.execute(Entity.__table__.insert(), [
+                {"id": entity_id, "name": f"Entity {start + i}", "type": "company"} for i, entity_id in enumerate(batch)
+            ])
+            conn.execute(EntityCentroid.__table__.insert(), [
+                {"entity_id": entity_id, "embedding": np.round(vector, 4).tolist(), "document_count": 20}
+                for entity_id, vector in zip(batch, vectors)
+            ])
+    return ids
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+
+def naive_similar(Session, entity_id: str):
+    """Read every centroid and score it against the entity's."""
+    db = Session()
+    try:
+        rows = db.query(EntityCentroid.entity_id, EntityCentroid.embedding).all()
+        ids = [row[0] for row in rows]
+        matrix = np.asarray([row[1] for row in rows], dtype=np.float32)
+        matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+        scores = matrix @ matrix[ids.index(entity_id)]
+        return [ids[i] for i in np.argsort(-scores)[1:LIMIT + 1]]
+    finally:
+        db.close()
+
+
+def percentiles(samples: list) -> str:
+    ordered = sorted(samples)
+    p = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000
+    return f"p50 {p(0.5):7.2f} ms   p95 {p(0.95):7.2f} ms   p99 {p(0.99):7.2f} ms"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--entities", type=int, default=100000)
+    parser.add_argument("--topics", type=int, default=200, help="topics the synthetic centroids are drawn around")
+    parser.add_argument("--queries", type=int, default=1000, help="queries per index measurement")
+    parser.add_argument("--naive-queries", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        Base.metadata.create_all(engine)
+        Session = sessionmaker(bind=engine)
+
+        print(f"Seeding {args.entities} entity centroids (dim {settings.EMBEDDING_DIM})...")
+        elapsed, ids = timed(lambda: seed(engine, args.entities, args.topics))
+        print(f"  seeded in {elapsed:.1f}s\n")
+        rng = np.random.default_rng(1)
+        sample = [ids[i] for i in rng.integers(0, len(ids), args.queries)]
+
+        print("== per query ==")
+        naive = [timed(lambda: naive_similar(Session, entity_id))[0] for entity_id in sample[:args.naive_queries]]
+        print(f"  naive, scan all centroids     {statistics.median(naive) * 1000:9.1f} ms (median of {len(naive)})")
+
+        index = CentroidIndex()
+        db = Session()
+        elapsed, _ = timed(lambda: index.load(db))
+        db.close()
+        print(f"  index load (once per process) {elapsed * 1000:9.1f} ms")
+        latencies = []
+        for entity_id in sample:
+            vector = index.vector(entity_id)
+            latencies.append(timed(lambda: index.search(vector, LIMIT, exclude=entity_id))[0])
+        print(f"  index search                  {percentiles(latencies)}")
+
+        def override_db():
+            db = Session()
+            try:
+                yield db
+            finally:
+                db.close()
+
+        app.dependency_overrides[get_db] = override_db
+        app.dependency_overrides[get_read_db] = override_db
+        entity_similarity.centroid_index = index
+        client = TestClient(app)
+        latencies = []
+        for entity_id in sample:
+            elapsed, response = timed(lambda: client.get(
+                f"{settings.API_V1_STR}/entities/{entity_id}/similar", params={"limit": LIMIT}
+            ))
+            response.raise_for_status()
+            latencies.append(elapsed)
+        print(f"  /similar endpoint             {percentiles(latencies)}\n")
+
+        print("== clustering job ==")
+        db = Session()
+        elapsed, summary = timed(lambda: entity_similarity.cluster_entities(db))
+        db.close()
+        print(f"  {summary['entities']} entities into {summary['clusters']} clusters in {elapsed:.1f}s")
+
+        app.dependency_overrides.clear()
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Benchmark: peak memory of one analysis of a very large entity.
+
+Replaces every scrape source with a synthetic one so that a single
+trigger_entity_analysis ingests --documents documents (split evenly across
+the sources), then reports the process's peak RSS above its RSS before the
+run. Exits non-zero when that growth exceeds --max-rss-mb, so it can gate a
+change that makes memory scale with the entity again.
+
+Documents are stored in chunks of ANALYSIS_CHUNK_SIZE; compare runs with
+--chunk-size to see its effect. SQLite's memory map is switched off so
+that pages of the database file do not count towards the peak.
+
+Usage (from backend/):
+    python -m benchmarks.large_entity --documents 50000 --max-rss-mb 400
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+from datetime import datetime
+
+from app.core.config import settings
+from app.core import database
+from app.core.database import SessionLocal
+from app.models.models import Entity, EntityType
+from app.services import scraper
+
+from benchmarks.pipeline import peak_rss_mb, reset_peak_rss
+
+WORDS = "quantum neural robot satellite encryption graphene sensor drone network protein radar laser".split()
+
+
+def current_rss_mb() -> float:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return round(int(line.split()[1]) / 1024, 1)
+    return 0.0
+
+
+def synthetic_source(source: str, kind: str, count: int, authors: int):
+    """A scraper returning `count` distinct documents of `kind` with ~120-word abstracts."""
+    async def scrape(entity_name: str, max_results: int = 20):
+        rng = random.Random(source)
+        abstract = lambda: " ".join(rng.choice(WORDS) for _ in range(120))
+        if kind == "patents":
+            return [{
+                "patent_number": f"US-{source}-{i}",
+                "title": f"{rng.choice(WORDS)} apparatus {i}",
+                "abstract": abstract(),
+                "filing_date": datetime(2000 + i % 20, 1 + i % 12, 1),
+                "status": "granted",
+                "inventors": [f"Inventor {i % 500}"],
+                "source_url": f"https://patents.example.com/{source}/{i}",
+            } for i in range(count)]
+        return [{
+            "title": f"{source} {rng.choice(WORDS)} study {i}",
+            "abstract": abstract(),
+            "authors": [f"Author {rng.randrange(authors)}" for _ in range(4)],
+            "publication_date": datetime(2000 + i % 20, 1 + i % 12, 1),
+            "venue": source,
+            "doi": f"10.5555/{source}.{i}",
+            "citation_count": i % 50,
+            "source_url": f"https://papers.example.com/{source}/{i}",
+        } for i in range(count)]
+    return scrape
+
+
+async def run(args) -> int:
+    from app.services.analysis_service import trigger_entity_analysis
+
+    per_source = args.documents // len(scraper.SCRAPE_SOURCES)
+    for source, (_, kind) in list(scraper.SCRAPE_SOURCES.items()):
+        scraper.SCRAPE_SOURCES[source] = (synthetic_source(source, kind, per_source, args.authors), kind)
+
+    db = SessionLocal()
+    try:
+        entity = Entity(name="Large Institution", type=EntityType.INSTITUTION)
+        db.add(entity)
+        db.commit()
+        entity_id = entity.id
+    finally:
+        db.close()
+
+    baseline = current_rss_mb()
+    reset_peak_rss()
+    start = time.perf_counter()
+    await trigger_entity_analysis(entity_id)
+    elapsed = time.perf_counter() - start
+    peak = peak_rss_mb()
+
+    db = SessionLocal()
+    try:
+        entity = db.get(Entity, entity_id)
+        print(f"status {entity.status}: {entity.patent_count} patents, {entity.paper_count} papers, "
+              f"{entity.personnel_count} personnel in {elapsed:.1f}s")
+    finally:
+        db.close()
+    growth = peak - baseline
+    print(f"RSS before {baseline:.0f} MB, peak {peak:.0f} MB, growth {growth:.0f} MB "
+          f"(bound {args.max_rss_mb:.0f} MB, chunk size {settings.ANALYSIS_CHUNK_SIZE})")
+    if entity.status != "complete":
+        return 1
+    return 1 if growth > args.max_rss_mb else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--documents", type=int, default=50000, help="documents scraped for the entity")
+    parser.add_argument("--authors", type=int, default=3000, help="distinct paper authors")
+    parser.add_argument("--chunk-size", type=int, default=settings.ANALYSIS_CHUNK_SIZE)
+    parser.add_argument("--max-rss-mb", type=float, default=400.0, help="allowed peak RSS growth")
+    args = parser.parse_args()
+
+    settings.EMBEDDING_BACKEND = "stub"
+    settings.ANALYSIS_CHUNK_SIZE = args.chunk_size
+    settings.SQLITE_MMAP_SIZE_MB = 0
+    settings.SCRAPE_DEADLINE_SECONDS = 24 * 3600
+    settings.SCRAPE_SOURCE_BUDGETS = {}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        settings.CHECKPOINT_DB_PATH = os.path.join(tmp, "checkpoints.db")
+        database.engine = database.make_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        SessionLocal.configure(bind=database.engine)
+        with redirect_stdout(sys.stderr):
+            database.init_db()
+        status = asyncio.run(run(args))
+        database.engine.dispose()
+    sys.exit(status)
+
+
+if __name__ == "__main__":
+    main()
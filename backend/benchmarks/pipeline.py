@@ -0,0 +1,510 @@
+"""
+Benchmark: the full analysis pipeline, offline.
+
+Runs against the local stub sources (benchmarks/stub_server.py) and a
+throwaway SQLite database, so results do not depend on the network or on
+existing data. Sections:
+
+    scrape     scrape_entity_data per entity, with per-source timings
+    ai         embedding throughput (texts/s) and technology extraction;
+               LLM generation too with --llm
+    pipeline   trigger_entity_analysis for --entities entities, with
+               entities/min and the per-stage breakdown from the
+               analysis stage metrics
+    batch      the same number of entities as one batch analysis
+               (app.services.batch_analysis), with entities/min and the
+               embedding batches it made
+    db         ORM and core write rates on SQLite, and on Postgres when
+               --postgres-url is given (it must point at an empty database)
+    api        API latency under load: simulated users pick weighted
+               requests and wait between them, locust style, in-process
+               or against --base-url
+
+Each section also reports its peak RSS. Results are written as JSON
+(--output) for comparison between runs with benchmarks/compare.py.
+
+Usage (from backend/):
+    python -m benchmarks.pipeline --embedding stub --entities 20 --output before.json
+    python -m benchmarks.pipeline --sections pipeline batch --embedding stub --entities 100 --concurrency 1
+    python -m benchmarks.pipeline --sections api --base-url http://localhost:8000 --duration 60
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from contextlib import redirect_stdout
+from datetime import datetime
+from typing import Any, Callable, Dict, List
+
+import httpx
+from sqlalchemy import create_engine, distinct, func, inspect, insert
+from sqlalchemy.orm import sessionmaker
+
+from app.core.config import settings
+from app.core import database
+from app.core.database import Base, SessionLocal
+from app.core.metrics import ANALYSIS_STAGE_DURATION
+from app.models.models import Entity, EntityPaper, EntityPatent, EntityType, Patent
+from app.services.scraper import scraper
+
+from benchmarks.stub_server import StubSourceServer
+
+SECTIONS = ("scrape", "ai", "pipeline", "batch", "db", "api")
+
+PREFIXES = ["Quantum", "Aero", "Neural", "Crypto", "Robo", "Photon", "Nano", "Hyper", "Secure", "Astra"]
+SUFFIXES = ["Dynamics", "Labs", "Systems", "Technologies", "Research", "Devices", "Networks", "Works"]
+
+
+def entity_names(count: int, seed: int = 0) -> List[str]:
+    rng = random.Random(seed)
+    return [f"{rng.choice(PREFIXES)} {rng.choice(SUFFIXES)} {i}" for i in range(count)]
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    """p50/p95/p99/max of latencies in seconds, as milliseconds."""
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+
+    def at(q: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 2)
+
+    return {"p50_ms": at(0.50), "p95_ms": at(0.95), "p99_ms": at(0.99), "max_ms": round(ordered[-1] * 1000, 2)}
+
+
+# ============== Memory ==============
+
+def reset_peak_rss() -> bool:
+    """Reset the process's RSS high-water mark (Linux only)."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss_mb() -> float:
+    """RSS high-water mark since the last reset (since start where resets are unsupported)."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, kilobytes elsewhere
+    return round(maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+# ============== Database ==============
+
+def use_database(url: str):
+    """Point the app's engine and sessions at a benchmark database."""
+    engine = create_engine(url, connect_args={"check_same_thread": False} if url.startswith("sqlite") else {})
+    database.engine = engine
+    SessionLocal.configure(bind=engine)
+    return engine
+
+
+def create_entities(names: List[str]) -> List[str]:
+    db = SessionLocal()
+    try:
+        entities = [Entity(name=name, type=EntityType.COMPANY, website=f"https://{name.lower().replace(' ', '')}.example.com")
+                    for name in names]
+        db.add_all(entities)
+        db.commit()
+        return [entity.id for entity in entities]
+    finally:
+        db.close()
+
+
+def stage_totals() -> Dict[str, Dict[str, float]]:
+    """Cumulative (seconds, count) per analysis stage label."""
+    totals: Dict[str, Dict[str, float]] = {}
+    for metric in ANALYSIS_STAGE_DURATION.collect():
+        for sample in metric.samples:
+            if sample.name.endswith(("_sum", "_count")):
+                label = sample.labels["stage"] + (f"/{sample.labels['source']}" if sample.labels["source"] else "")
+                totals.setdefault(label, {"seconds": 0.0, "count": 0.0})
+                totals[label]["seconds" if sample.name.endswith("_sum") else "count"] = sample.value
+    return totals
+
+
+# ============== Sections ==============
+
+async def bench_scrape(args) -> Dict[str, Any]:
+    from app.services.scraper import scrape_entity_data
+
+    per_source: Dict[str, List[float]] = {}
+    documents = 0
+    start = time.perf_counter()
+    for name in entity_names(args.scrape_entities, seed=1):
+        data = await scrape_entity_data(name)
+        documents += len(data.get("patents", [])) + len(data.get("papers", []))
+        for source, status in data.get("source_status", {}).items():
+            per_source.setdefault(source, []).append(status.get("elapsed", 0.0))
+    elapsed = time.perf_counter() - start
+    return {
+        "entities": args.scrape_entities,
+        "seconds_per_entity": round(elapsed / args.scrape_entities, 3),
+        "documents_per_entity": round(documents / args.scrape_entities, 1),
+        "source_seconds": {source: round(statistics.mean(times), 3) for source, times in per_source.items()},
+    }
+
+
+async def bench_ai(args) -> Dict[str, Any]:
+    from app.services.ai_service import get_ai_service
+
+    ai_service = get_ai_service()
+    rng = random.Random(2)
+    words = "quantum neural robot satellite encryption graphene sensor drone network protein".split()
+    texts = [" ".join(rng.choice(words) for _ in range(40)) + f" {i}" for i in range(args.texts)]
+
+    # Load the model before timing
+    await ai_service.aembed_batch(texts[:1])
+    start = time.perf_counter()
+    for i in range(0, len(texts), args.batch_size):
+        await ai_service.aembed_batch(texts[i:i + args.batch_size])
+    embed_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for text in texts:
+        ai_service.extract_technologies(text)
+    extract_seconds = time.perf_counter() - start
+
+    result = {
+        "embedding_backend": settings.EMBEDDING_BACKEND,
+        "embedding_workers": settings.EMBEDDING_WORKERS,
+        "texts": len(texts),
+        "embed_texts_per_second": round(len(texts) / embed_seconds, 1),
+        "extract_texts_per_second": round(len(texts) / extract_seconds, 1),
+    }
+    if args.llm:
+        prompts = [f"Summarize the research focus of {name}." for name in entity_names(3, seed=3)]
+        ai_service.generate_text(prompts[0], max_tokens=8)
+        start = time.perf_counter()
+        for prompt in prompts:
+            ai_service.generate_text(prompt, max_tokens=64)
+        result["llm_seconds_per_generation"] = round((time.perf_counter() - start) / len(prompts), 3)
+    return result
+
+
+async def bench_pipeline(args) -> Dict[str, Any]:
+    from app.services.analysis_service import trigger_entity_analysis
+
+    entity_ids = create_entities(entity_names(args.entities, seed=4))
+    semaphore = asyncio.Semaphore(args.concurrency)
+    durations: List[float] = []
+
+    async def analyze(entity_id: str):
+        async with semaphore:
+            start = time.perf_counter()
+            await trigger_entity_analysis(entity_id)
+            durations.append(time.perf_counter() - start)
+
+    before = stage_totals()
+    start = time.perf_counter()
+    await asyncio.gather(*(analyze(entity_id) for entity_id in entity_ids))
+    elapsed = time.perf_counter() - start
+    after = stage_totals()
+
+    stages = {}
+    for label, totals in after.items():
+        seconds = totals["seconds"] - before.get(label, {}).get("seconds", 0.0)
+        count = totals["count"] - before.get(label, {}).get("count", 0.0)
+        if count:
+            stages[label] = {"mean_seconds": round(seconds / count, 4), "total_seconds": round(seconds, 3)}
+
+    db = SessionLocal()
+    try:
+        statuses = [status for (status,) in db.query(Entity.status).filter(Entity.id.in_(entity_ids))]
+        patents = db.query(func.count(distinct(EntityPatent.patent_id))).filter(
+            EntityPatent.entity_id.in_(entity_ids)
+        ).scalar()
+        papers = db.query(func.count(distinct(EntityPaper.paper_id))).filter(
+            EntityPaper.entity_id.in_(entity_ids)
+        ).scalar()
+    finally:
+        db.close()
+
+    return {
+        "entities": args.entities,
+        "concurrency": args.concurrency,
+        "seconds": round(elapsed, 2),
+        "entities_per_minute": round(args.entities / elapsed * 60, 2),
+        "entity_seconds": percentiles(durations),
+        "completed": statuses.count("complete"),
+        "patents": patents,
+        "papers": papers,
+        "stages": stages,
+    }
+
+
+async def bench_batch(args) -> Dict[str, Any]:
+    from app.services.batch_analysis import start_batch
+
+    entity_ids = create_entities(entity_names(args.entities, seed=6))
+    start = time.perf_counter()
+    batch = start_batch(entity_ids)
+    await batch.task
+    elapsed = time.perf_counter() - start
+
+    db = SessionLocal()
+    try:
+        status = batch.status(db)
+    finally:
+        db.close()
+    embedder = batch.embedder
+    return {
+        "entities": args.entities,
+        "concurrency": settings.BATCH_ANALYSIS_CONCURRENCY,
+        "seconds": round(elapsed, 2),
+        "entities_per_minute": round(args.entities / elapsed * 60, 2),
+        "completed": status["counts"].get("complete", 0),
+        "embedded_documents": embedder.documents,
+        "embedding_batches": embedder.batches,
+        "mean_embedding_batch": round(embedder.documents / embedder.batches, 1) if embedder.batches else 0.0,
+    }
+
+
+def _write_rates(url: str, rows: int, batch_size: int) -> Dict[str, Any]:
+    engine = create_engine(url)
+    try:
+        if inspect(engine).has_table(Entity.__tablename__):
+            return {"skipped": "database is not empty"}
+        Base.metadata.create_all(engine)
+        Session = sessionmaker(bind=engine)
+
+        def patent(prefix: str, i: int) -> Dict[str, Any]:
+            return {
+                "id": str(uuid.uuid4()),
+                "patent_number": f"{prefix}{i}",
+                "title": f"Patent {i} on quantum sensing",
+                "abstract": "A method and apparatus. " * 20,
+                "inventors": ["Inventor A", "Inventor B"],
+                "embedding": [0.01] * settings.EMBEDDING_DIM,
+            }
+
+        results = {}
+        start = time.perf_counter()
+        for offset in range(0, rows, batch_size):
+            db = Session()
+            db.add_all(Patent(**patent("ORM", i)) for i in range(offset, min(rows, offset + batch_size)))
+            db.commit()
+            db.close()
+        results["orm_rows_per_second"] = round(rows / (time.perf_counter() - start), 1)
+
+        start = time.perf_counter()
+        for offset in range(0, rows, batch_size):
+            with engine.begin() as conn:
+                conn.execute(insert(Patent), [patent("CORE", i) for i in range(offset, min(rows, offset + batch_size))])
+        results["core_rows_per_second"] = round(rows / (time.perf_counter() - start), 1)
+
+        start = time.perf_counter()
+        for i in range(min(rows, 500)):
+            with engine.begin() as conn:
+                conn.execute(insert(Patent), [patent("ONE", i)])
+        results["single_row_commits_per_second"] = round(min(rows, 500) / (time.perf_counter() - start), 1)
+        return results
+    finally:
+        if not url.startswith("sqlite"):
+            Base.metadata.drop_all(engine)
+        engine.dispose()
+
+
+async def bench_db(args, tmp: str) -> Dict[str, Any]:
+    results = {"sqlite": await asyncio.to_thread(
+        _write_rates, f"sqlite:///{os.path.join(tmp, 'writes.db')}", args.rows, args.batch_size,
+    )}
+    if args.postgres_url:
+        results["postgres"] = await asyncio.to_thread(_write_rates, args.postgres_url, args.rows, args.batch_size)
+    return results
+
+
+def api_tasks(entity_ids: List[str]) -> List[tuple]:
+    """(weight, name, request builder) in the mix a dashboard user produces."""
+    prefix = settings.API_V1_STR
+
+    def entity() -> str:
+        return random.choice(entity_ids)
+
+    return [
+        (10, "list entities", lambda: f"{prefix}/entities/?page=1&per_page=20"),
+        (8, "get entity", lambda: f"{prefix}/entities/{entity()}"),
+        (5, "entity patents", lambda: f"{prefix}/entities/{entity()}/patents?limit=50"),
+        (5, "entity papers", lambda: f"{prefix}/entities/{entity()}/papers?limit=50"),
+        (3, "entity timeline", lambda: f"{prefix}/entities/{entity()}/timeline"),
+        (3, "search", lambda: f"{prefix}/search/?q={random.choice(['quantum', 'neural', 'drone', 'graphene'])}"),
+        (2, "dashboard stats", lambda: f"{prefix}/entities/stats"),
+        (2, "technology domains", lambda: f"{prefix}/technologies/domains"),
+        (1, "heatmap", lambda: f"{prefix}/technologies/heatmap"),
+    ]
+
+
+async def bench_api(args) -> Dict[str, Any]:
+    if args.base_url:
+        client = httpx.AsyncClient(base_url=args.base_url, timeout=30)
+        async with client:
+            response = await client.get(f"{settings.API_V1_STR}/entities/?per_page=100")
+            entity_ids = [item["id"] for item in response.json()["items"]]
+    else:
+        from app.main import app
+        db = SessionLocal()
+        try:
+            entity_ids = [entity_id for (entity_id,) in db.query(Entity.id).limit(100)]
+        finally:
+            db.close()
+        if not entity_ids:
+            entity_ids = create_entities(entity_names(20, seed=5))
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=30)
+
+    tasks = api_tasks(entity_ids)
+    weights = [weight for weight, _, _ in tasks]
+    latencies: Dict[str, List[float]] = {name: [] for _, name, _ in tasks}
+    errors: Dict[str, int] = {name: 0 for _, name, _ in tasks}
+    deadline = time.perf_counter() + args.duration
+
+    async def user(seed: int):
+        rng = random.Random(seed)
+        while time.perf_counter() < deadline:
+            _, name, build = rng.choices(tasks, weights)[0]
+            start = time.perf_counter()
+            try:
+                response = await client.get(build())
+                if response.status_code >= 400:
+                    errors[name] += 1
+            except httpx.HTTPError:
+                errors[name] += 1
+            latencies[name].append(time.perf_counter() - start)
+            await asyncio.sleep(rng.uniform(args.wait_min, args.wait_max))
+
+    async with client:
+        start = time.perf_counter()
+        await asyncio.gather(*(user(i) for i in range(args.users)))
+        elapsed = time.perf_counter() - start
+
+    everything = [latency for samples in latencies.values() for latency in samples]
+    return {
+        "target": args.base_url or "in-process",
+        "users": args.users,
+        "seconds": round(elapsed, 1),
+        "requests": len(everything),
+        "requests_per_second": round(len(everything) / elapsed, 1),
+        "errors": sum(errors.values()),
+        "latency": percentiles(everything),
+        "routes": {
+            name: {**percentiles(samples), "requests": len(samples), "errors": errors[name]}
+            for name, samples in latencies.items() if samples
+        },
+    }
+
+
+# ============== Runner ==============
+
+def run_metadata(args) -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "timestamp": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "arguments": {key: value for key, value in vars(args).items() if key != "postgres_url"},
+    }
+
+
+async def run(args, tmp: str) -> Dict[str, Any]:
+    results: Dict[str, Any] = {"meta": run_metadata(args), "sections": {}}
+    server = StubSourceServer(latency_scale=args.latency_scale)
+    await server.start()
+    server.configure_settings(rate_limit=args.rate_limit)
+    resettable = reset_peak_rss()
+
+    sections: Dict[str, Callable] = {
+        "scrape": lambda: bench_scrape(args),
+        "ai": lambda: bench_ai(args),
+        "pipeline": lambda: bench_pipeline(args),
+        "batch": lambda: bench_batch(args),
+        "db": lambda: bench_db(args, tmp),
+        "api": lambda: bench_api(args),
+    }
+    try:
+        for section in args.sections:
+            print(f"== {section} ==", file=sys.stderr)
+            if resettable:
+                reset_peak_rss()
+            start = time.perf_counter()
+            result = await sections[section]()
+            result["wall_seconds"] = round(time.perf_counter() - start, 2)
+            result["peak_rss_mb"] = peak_rss_mb()
+            results["sections"][section] = result
+            print(json.dumps(result, indent=2), file=sys.stderr)
+    finally:
+        await scraper.close()
+        await server.stop()
+    results["meta"]["stub_requests"] = server.requests
+    results["meta"]["peak_rss_per_section"] = resettable
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sections", nargs="+", choices=SECTIONS, default=list(SECTIONS))
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--embedding", choices=("fastembed", "stub"), default=settings.EMBEDDING_BACKEND,
+                        help="embedding backend (stub avoids loading a model)")
+    parser.add_argument("--embedding-workers", type=int, default=settings.EMBEDDING_WORKERS)
+    parser.add_argument("--latency-scale", type=float, default=0.1, help="multiplier for stub source latency")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="per-domain scrape delay in seconds")
+    parser.add_argument("--scrape-entities", type=int, default=5)
+    parser.add_argument("--texts", type=int, default=2000, help="texts embedded in the ai section")
+    parser.add_argument("--batch-size", type=int, default=64, help="embedding and write batch size")
+    parser.add_argument("--llm", action="store_true", help="also time LLM generation (loads the model)")
+    parser.add_argument("--entities", type=int, default=20, help="entities analyzed in the pipeline section")
+    parser.add_argument("--concurrency", type=int, default=4, help="concurrent analyses")
+    parser.add_argument("--rows", type=int, default=5000, help="rows written per method in the db section")
+    parser.add_argument("--postgres-url", help="empty Postgres database for the db section")
+    parser.add_argument("--base-url", help="benchmark a running server instead of the app in-process")
+    parser.add_argument("--users", type=int, default=20, help="simulated API users")
+    parser.add_argument("--duration", type=float, default=20.0, help="API load seconds")
+    parser.add_argument("--wait-min", type=float, default=0.05, help="min seconds between a user's requests")
+    parser.add_argument("--wait-max", type=float, default=0.5, help="max seconds between a user's requests")
+    args = parser.parse_args()
+
+    settings.EMBEDDING_BACKEND = args.embedding
+    settings.EMBEDDING_WORKERS = args.embedding_workers
+
+    with tempfile.TemporaryDirectory() as tmp:
+        settings.CHECKPOINT_DB_PATH = os.path.join(tmp, "checkpoints.db")
+        use_database(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        with redirect_stdout(sys.stderr):
+            database.init_db()
+        results = asyncio.run(run(args, tmp))
+        database.engine.dispose()
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
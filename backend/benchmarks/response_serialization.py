@@ -0,0 +1,155 @@
+"""
+Benchmark: per-row cost of serializing entity list pages.
+
+Compares the previous path (full ORM rows copied field by field into
+EntityResponse models, then validated and re-serialized against the
+response model as FastAPI does, and encoded with the stdlib json encoder)
+with the current one (EntityResponse columns projected in SQL, rows as
+plain dicts, encoded with orjson).
+
+Runs against a throwaway SQLite database.
+
+Usage (from backend/):
+    python -m benchmarks.response_serialization --rows 1000
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import orjson
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.core.database import Base
+from app.core.responses import ORJSONResponse, response_columns, row_dicts
+from app.models.models import Entity
+from app.models.schemas import EntityListResponse, EntityResponse
+
+TYPES = ["startup", "research_lab", "institution", "company"]
+STATUSES = ["pending", "analyzing", "complete", "error"]
+AREAS = ["Quantum Computing", "Machine Learning", "Cryptography", "Robotics", "Aerospace"]
+
+PAGE_ADAPTER = TypeAdapter(EntityListResponse)
+COLUMNS = response_columns(Entity, EntityResponse)
+
+
+def seed(engine, rows: int):
+    """Insert `rows` entities with realistic field contents."""
+    rng = random.Random(0)
+    base = datetime(2020, 1, 1)
+    with engine.begin() as conn:
+        conn.execute(Entity.__table__.insert(), [{
+            "id": str(uuid.uuid4()),
+            "name": f"Entity {i}",
+            "type": rng.choice(TYPES),
+            "status": rng.choice(STATUSES),
+            "website": f"https://entity{i}.example.com",
+            "description": "Develops defence-relevant technology. " * 5,
+            "focus_areas": rng.sample(AREAS, 3),
+            "analysis_progress": rng.randint(0, 100),
+            "patent_count": rng.randint(0, 500),
+            "paper_count": rng.randint(0, 2000),
+            "personnel_count": rng.randint(0, 300),
+            "created_at": base + timedelta(minutes=i),
+            "updated_at": base + timedelta(minutes=i, seconds=30),
+        } for i in range(rows)])
+
+
+def previous_path(Session, rows: int):
+    """Full ORM rows -> EntityResponse field by field -> response validation -> json."""
+    db = Session()
+    try:
+        fetch_start = time.perf_counter()
+        entities = db.query(Entity).order_by(Entity.updated_at.desc()).limit(rows).all()
+        build_start = time.perf_counter()
+        page = EntityListResponse(
+            items=[EntityResponse(
+                id=str(e.id),
+                name=e.name,
+                type=e.type,
+                status=e.status,
+                website=e.website,
+                description=e.description,
+                focus_areas=e.focus_areas,
+                analysis_progress=e.analysis_progress or 0,
+                patent_count=e.patent_count or 0,
+                paper_count=e.paper_count or 0,
+                personnel_count=e.personnel_count or 0,
+                created_at=e.created_at,
+                updated_at=e.updated_at,
+            ) for e in entities],
+            total=rows,
+            page=1,
+            per_page=rows,
+        )
+        # FastAPI validates the returned model against response_model again
+        # before dumping it to JSON-compatible Python objects
+        content = PAGE_ADAPTER.dump_python(PAGE_ADAPTER.validate_python(page, from_attributes=True), mode="json")
+        encode_start = time.perf_counter()
+        body = JSONResponse(content).body
+        end = time.perf_counter()
+        return (build_start - fetch_start, encode_start - build_start, end - encode_start), body
+    finally:
+        db.close()
+
+
+def projected_path(Session, rows: int):
+    """EntityResponse columns -> row dicts -> orjson."""
+    db = Session()
+    try:
+        fetch_start = time.perf_counter()
+        result = db.query(*COLUMNS).order_by(Entity.updated_at.desc()).limit(rows).all()
+        build_start = time.perf_counter()
+        content = {"items": row_dicts(result), "total": rows, "page": 1, "per_page": rows}
+        encode_start = time.perf_counter()
+        body = ORJSONResponse(content).body
+        end = time.perf_counter()
+        return (build_start - fetch_start, encode_start - build_start, end - encode_start), body
+    finally:
+        db.close()
+
+
+def measure(fn, Session, rows: int, repeat: int):
+    """Median fetch/build/encode seconds over `repeat` runs, after one warm-up."""
+    fn(Session, rows)
+    samples = [fn(Session, rows)[0] for _ in range(repeat)]
+    return [statistics.median(stage) for stage in zip(*samples)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rows", type=int, default=1000, help="rows per page")
+    parser.add_argument("--repeat", type=int, default=20, help="timed runs per path")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        Base.metadata.create_all(engine)
+        Session = sessionmaker(bind=engine)
+        seed(engine, args.rows)
+
+        # Both paths must produce the same document
+        previous = previous_path(Session, args.rows)[1]
+        projected = projected_path(Session, args.rows)[1]
+        assert orjson.loads(previous) == orjson.loads(projected)
+
+        print(f"== entity list page, {args.rows} rows (median of {args.repeat}) ==")
+        print(f"  {'':28}{'fetch':>10}{'build':>10}{'encode':>10}{'total':>10}   us/row")
+        for name, fn in (("previous (models + json)", previous_path), ("projected (dicts + orjson)", projected_path)):
+            stages = measure(fn, Session, args.rows, args.repeat)
+            total = sum(stages)
+            cells = "".join(f"{s * 1000:8.2f}ms" for s in (*stages, total))
+            print(f"  {name:28}{cells}   {total / args.rows * 1e6:6.1f}")
+
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
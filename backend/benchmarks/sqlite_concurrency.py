@@ -0,0 +1,181 @@
+"""
+Stress test: concurrent readers and writers on SQLite.
+
+Runs the same mixed workload against two setups:
+
+    previous  rollback journal, default pysqlite busy timeout, every writer
+              committing its own transaction
+    wal       the current SQLite mode: WAL and tuned pragmas, with writes
+              serialised and batched by the single writer
+              (app.core.write_queue)
+
+Reader threads run the entity list, entity page and patent page queries;
+writer threads insert patents and update entity progress, as concurrent
+analyses do. Reports throughput, latency percentiles and errors
+("database is locked") for each.
+
+Usage (from backend/):
+    python -m benchmarks.sqlite_concurrency --readers 8 --writers 8 --duration 10
+"""
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import Dict, List
+
+from sqlalchemy import create_engine, func, insert, update
+
+from app.core import database
+from app.core.config import settings
+from app.core.database import Base, SessionLocal, sqlite_engine
+from app.core.write_queue import run_write_sync, write_queue
+from app.models.models import Entity, EntityPatent, Patent
+
+ENTITIES = 50
+
+
+def seed(engine) -> List[str]:
+    ids = [str(uuid.uuid4()) for _ in range(ENTITIES)]
+    with engine.begin() as conn:
+        conn.execute(insert(Entity), [{"id": entity_id, "name": f"Entity {i}", "type": "company"} for i, entity_id in enumerate(ids)])
+    return ids
+
+
+def read(entity_ids: List[str], rng: random.Random):
+    db = SessionLocal()
+    try:
+        choice = rng.random()
+        if choice < 0.4:
+            db.query(Entity.id, Entity.name, Entity.status).order_by(Entity.updated_at.desc()).limit(20).all()
+            db.query(func.count(Entity.id)).scalar()
+        elif choice < 0.7:
+            db.query(Entity).filter(Entity.id == rng.choice(entity_ids)).first()
+        else:
+            db.query(Patent.id, Patent.title).join(EntityPatent, EntityPatent.patent_id == Patent.id).filter(
+                EntityPatent.entity_id == rng.choice(entity_ids)
+            ).order_by(Patent.id).limit(50).all()
+    finally:
+        db.close()
+
+
+def insert_patents(db, entity_id: str, count: int):
+    ids = [str(uuid.uuid4()) for _ in range(count)]
+    db.execute(insert(Patent), [{
+        "id": patent_id,
+        "patent_number": uuid.uuid4().hex[:12],
+        "title": "Patent on quantum sensing",
+        "abstract": "A method and apparatus. " * 20,
+        "inventors": ["Inventor A"],
+    } for patent_id in ids])
+    db.execute(insert(EntityPatent), [{"entity_id": entity_id, "patent_id": patent_id} for patent_id in ids])
+
+
+def set_progress(db, entity_id: str, progress: int):
+    db.execute(update(Entity).where(Entity.id == entity_id).values(analysis_progress=progress))
+
+
+def write(entity_ids: List[str], rng: random.Random):
+    entity_id = rng.choice(entity_ids)
+    if rng.random() < 0.5:
+        run_write_sync(insert_patents, entity_id, 20)
+    else:
+        run_write_sync(set_progress, entity_id, rng.randint(0, 100))
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+    return {
+        f"p{int(q * 100)}_ms": round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 2)
+        for q in (0.5, 0.95, 0.99)
+    }
+
+
+def run_workload(entity_ids: List[str], readers: int, writers: int, duration: float) -> Dict[str, Dict]:
+    deadline = time.perf_counter() + duration
+    latencies: Dict[str, List[float]] = {"read": [], "write": []}
+    errors: Dict[str, Counter] = {"read": Counter(), "write": Counter()}
+    lock = threading.Lock()
+
+    def worker(kind: str, seed: int):
+        rng = random.Random(seed)
+        operation = read if kind == "read" else write
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                operation(entity_ids, rng)
+                error = None
+            except Exception as e:
+                error = str(e).split("\n")[0][:60]
+            elapsed = time.perf_counter() - start
+            with lock:
+                if error:
+                    errors[kind][error] += 1
+                else:
+                    latencies[kind].append(elapsed)
+
+    threads = [threading.Thread(target=worker, args=("read", i)) for i in range(readers)]
+    threads += [threading.Thread(target=worker, args=("write", 1000 + i)) for i in range(writers)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    return {
+        kind: {
+            "per_second": round(len(latencies[kind]) / elapsed, 1),
+            **percentiles(latencies[kind]),
+            "errors": dict(errors[kind]),
+        }
+        for kind in ("read", "write")
+    }
+
+
+def run_setup(name: str, tmp: str, args) -> Dict[str, Dict]:
+    url = f"sqlite:///{os.path.join(tmp, f'{name}.db')}"
+    if name == "previous":
+        settings.SQLITE_SINGLE_WRITER = False
+        engine = create_engine(url, connect_args={"check_same_thread": False})
+    else:
+        settings.SQLITE_SINGLE_WRITER = True
+        engine = sqlite_engine(url)
+    database.engine = engine
+    SessionLocal.configure(bind=engine)
+    Base.metadata.create_all(engine)
+    entity_ids = seed(engine)
+    try:
+        return run_workload(entity_ids, args.readers, args.writers, args.duration)
+    finally:
+        write_queue.stop()
+        engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--readers", type=int, default=8, help="reader threads")
+    parser.add_argument("--writers", type=int, default=8, help="writer threads")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per setup")
+    parser.add_argument("--setups", nargs="+", choices=("previous", "wal"), default=["previous", "wal"])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in args.setups:
+            results = run_setup(name, tmp, args)
+            print(f"== {name}: {args.readers} readers, {args.writers} writers, {args.duration:g}s ==")
+            for kind, result in results.items():
+                latency = "  ".join(f"{key} {value:>8.2f}" for key, value in result.items() if key.endswith("_ms"))
+                failures = sum(result["errors"].values())
+                print(f"  {kind:6} {result['per_second']:>9.1f}/s  {latency}  errors {failures}")
+                for error, count in result["errors"].items():
+                    print(f"           {count:>6} x {error}")
+
+
+if __name__ == "__main__":
+    main()
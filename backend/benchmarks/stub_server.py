@@ -0,0 +1,155 @@
+"""
+Local stand-in for the five scraping sources.
+
+Serves the recorded responses in benchmarks/fixtures from an aiohttp server,
+one port per source so per-host connection limits and rate limiting behave
+as they do against the real hosts. Fixture placeholders make every query
+return its own documents:
+
+    {{query}}  the search text (escaped for the fixture's format)
+    {{key}}    a short hash of the search text, used in IDs, DOIs and
+               patent numbers so entities never share documents
+
+Each response is delayed by the source's latency (scaled by
+`latency_scale`) to model the real services' response times.
+
+Usage (from backend/):
+    python -m benchmarks.stub_server --latency-scale 1.0
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+from html import escape as html_escape
+from typing import Dict, Optional, Tuple
+
+from aiohttp import web
+
+from app.core.config import settings
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+# source -> (fixture file, content type, query parameter, settings attribute, URL path)
+SOURCES = {
+    "patents": ("google_patents.html", "text/html", "q", "GOOGLE_PATENTS_URL", ""),
+    "arxiv": ("arxiv.xml", "application/atom+xml", "search_query", "ARXIV_API_URL", "/api/query"),
+    "semantic_scholar": ("semantic_scholar.json", "application/json", "query", "SEMANTIC_SCHOLAR_API_URL", "/graph/v1"),
+    "dblp": ("dblp.json", "application/json", "q", "DBLP_API_URL", "/search/publ/api"),
+    "crossref": ("crossref.json", "application/json", "query", "CROSSREF_API_URL", "/works"),
+}
+
+# Typical response times of the real services (seconds)
+DEFAULT_LATENCY = {
+    "patents": 1.2,
+    "arxiv": 0.8,
+    "semantic_scholar": 0.6,
+    "dblp": 0.3,
+    "crossref": 0.9,
+}
+
+
+def _escape(value: str, content_type: str) -> str:
+    if content_type == "application/json":
+        return json.dumps(value)[1:-1]
+    return html_escape(value)
+
+
+def render_fixture(template: str, content_type: str, query: str) -> str:
+    """Fill a fixture's placeholders for one search."""
+    key = hashlib.sha1(query.encode()).hexdigest()[:10]
+    return template.replace("{{query}}", _escape(query, content_type)).replace("{{key}}", key)
+
+
+class StubSourceServer:
+    """Serves every source's fixture on its own local port."""
+
+    def __init__(self, latency_scale: float = 1.0, jitter: float = 0.2, host: str = "127.0.0.1"):
+        self.latency_scale = latency_scale
+        self.jitter = jitter
+        self.host = host
+        self.requests: Dict[str, int] = {source: 0 for source in SOURCES}
+        self.urls: Dict[str, str] = {}
+        self._runners = []
+        self._templates = {}
+        for source, (filename, *_rest) in SOURCES.items():
+            with open(os.path.join(FIXTURES, filename), encoding="utf-8") as f:
+                self._templates[source] = f.read()
+
+    def _handler(self, source: str):
+        _, content_type, param, _, _ = SOURCES[source]
+        rng = random.Random(source)
+
+        async def handle(request: web.Request) -> web.Response:
+            self.requests[source] += 1
+            delay = DEFAULT_LATENCY[source] * self.latency_scale
+            if delay > 0:
+                await asyncio.sleep(delay * (1 + rng.uniform(-self.jitter, self.jitter)))
+            query = request.query.get(param, "")
+            if source == "arxiv" and query.startswith("all:"):
+                query = query[len("all:"):]
+            body = render_fixture(self._templates[source], content_type, query)
+            return web.Response(text=body, content_type=content_type)
+
+        return handle
+
+    async def start(self) -> Dict[str, str]:
+        """Start one site per source; returns the base URL of each."""
+        for source, (_, _, _, _, path) in SOURCES.items():
+            app = web.Application()
+            # Each source has its own port, so any path answers with its fixture
+            app.router.add_get("/{tail:.*}", self._handler(source))
+            runner = web.AppRunner(app, access_log=None)
+            await runner.setup()
+            site = web.TCPSite(runner, self.host, 0)
+            await site.start()
+            port = runner.addresses[0][1]
+            self._runners.append(runner)
+            self.urls[source] = f"http://{self.host}:{port}{path}"
+        return self.urls
+
+    async def stop(self):
+        for runner in self._runners:
+            await runner.cleanup()
+        self._runners = []
+
+    def configure_settings(self, rate_limit: Optional[float] = None) -> Dict[str, Tuple[str, object]]:
+        """
+        Point the scrapers at this server. Returns the previous values so
+        callers can restore them.
+        """
+        previous = {}
+        for source, (_, _, _, attribute, _) in SOURCES.items():
+            previous[attribute] = getattr(settings, attribute)
+            setattr(settings, attribute, self.urls[source])
+        if rate_limit is not None:
+            previous["SCRAPE_RATE_LIMIT_SECONDS"] = settings.SCRAPE_RATE_LIMIT_SECONDS
+            settings.SCRAPE_RATE_LIMIT_SECONDS = rate_limit
+        return previous
+
+
+async def _serve(latency_scale: float):
+    server = StubSourceServer(latency_scale=latency_scale)
+    urls = await server.start()
+    print("Stub sources (set these in the environment to point the app at them):")
+    for source, (_, _, _, attribute, _) in SOURCES.items():
+        print(f"  {attribute}={urls[source]}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--latency-scale", type=float, default=1.0, help="multiplier for source response times")
+    args = parser.parse_args()
+    try:
+        asyncio.run(_serve(args.latency_scale))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()